@@ -0,0 +1,291 @@
+"""Statistics on the rules for balancing, worked out from a stream of events from each game as it is played.
+
+Events come from replaying game logs, e.g. those written by simulate.py --log, or from games played here
+and now. Either way they are generated one game at a time and folded into running totals, so memory use
+stays the same however many games or events go through:
+
+    python simulate.py --games 100000 --log games.sqlog
+    python analytics.py --logs games.sqlog
+    python analytics.py --games 10000 --policies greedy random
+"""
+import argparse
+import itertools
+import mmap
+import time
+from collections import Counter, namedtuple
+import gamelog
+import rules
+from cards import KINDS, KNIGHT, POTION, STRAWBERRY
+from simulate import POLICIES, MAX_TURNS
+
+GAME_START, WAKE, ROSE_BONUS, STEAL, DRAGON_BLOCK, SLEEP, WAND_BLOCK, STRAWBERRY_SHIELD, JESTER, RESHUFFLE, \
+    GAME_END = range(11)
+# turn is the number of turns finished before the event and value depends on the kind of event:
+# GAME_START the number of players, WAKE the queen, STEAL, SLEEP and the blocks the targeted player,
+# STRAWBERRY_SHIELD the player holding the strawberry queen, JESTER the player chosen or None when the
+# card turned over wasn't a number, RESHUFFLE the cards shuffled back in and GAME_END the winner or None
+Event = namedtuple('Event', ['kind', 'turn', 'player', 'value'])
+# turns per row of the reshuffle table
+RESHUFFLE_BUCKET = 10
+
+
+class TracedState(rules.GameState):
+    """A GameState that notes what the rules did in events as it goes, the game itself plays the same."""
+
+    __slots__ = ('events',)
+
+    def __init__(self, player_names, rng=None):
+        super().__init__(player_names, rng)
+        self.events = []
+
+    def event(self, kind, player, value=None):
+        self.events.append(Event(kind, self.turns, player, value))
+
+    def reshuffle(self):
+        shuffled = len(self.deck.discards)
+        super().reshuffle()
+        self.event(RESHUFFLE, self.player_turn, shuffled)
+
+    def wake_queen(self, player_index, slot=None):
+        queen = super().wake_queen(player_index, slot)
+        self.event(WAKE, player_index, queen)
+        return queen
+
+    def rose_bonus(self, player_index, queen):
+        bonus = super().rose_bonus(player_index, queen)
+        if bonus:
+            self.event(ROSE_BONUS, player_index)
+        return bonus
+
+    def steal_queen(self, player_index, target):
+        dragon = super().steal_queen(player_index, target)
+        self.event(STEAL if dragon is None else DRAGON_BLOCK, player_index, target[0])
+        return dragon
+
+    def put_queen_to_sleep(self, player_index, target):
+        wand = super().put_queen_to_sleep(player_index, target)
+        self.event(SLEEP if wand is None else WAND_BLOCK, player_index, target[0])
+        return wand
+
+    def jester(self, player_index):
+        revealed, chosen_player = super().jester(player_index)
+        self.event(JESTER, player_index, chosen_player)
+        return revealed, chosen_player
+
+    def perform_action(self, card, target=None, bonus=None):
+        # the strawberry queen only shielded the play if she was all there was to attack, so it went without a target
+        if KINDS[card] in (KNIGHT, POTION) and target is None and not self.awake_queens(exclude_player=self.player_turn):
+            for player_index, player in enumerate(self.players):
+                if player_index != self.player_turn and STRAWBERRY in player.queens:
+                    self.event(STRAWBERRY_SHIELD, self.player_turn, player_index)
+        super().perform_action(card, target, bonus)
+
+    def take_events(self):
+        events = self.events
+        self.events = []
+        return events
+
+
+def replay_events(log):
+    """The events of one game from its GameLog."""
+    state = TracedState(log.player_names, log.seed)
+    state.deal()
+    yield Event(GAME_START, 0, None, len(state.players))
+    for move in log.moves():
+        state.play(*move)
+        yield from state.take_events()
+    yield Event(GAME_END, state.turns, None, state.winner)
+
+
+def log_events(paths):
+    """The events of every game in the log archives at paths, which are memory-mapped rather than read in."""
+    for path in paths:
+        with open(path, 'rb') as log_file, mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for log in gamelog.read_logs(data):
+                try:
+                    yield from replay_events(log)
+                finally:
+                    # the log's records are a view of the map, which can't close while one is left
+                    log.records.release()
+
+
+def live_events(policy_classes, seed, num_games, max_turns=MAX_TURNS):
+    """The events of num_games games played as simulate.py plays them, game for game from the same seed."""
+    for game_index in range(num_games):
+        game_seed = rules.game_seed(seed, game_index)
+        state = TracedState(['Player{}'.format(seat) for seat in range(len(policy_classes))], game_seed)
+        policy_rng = rules.stream_rng(game_seed, 'policies')
+        policies = [policy_class(rules.fork_rng(policy_rng)) for policy_class in policy_classes]
+        state.deal()
+        yield Event(GAME_START, 0, None, len(state.players))
+        try:
+            while not state.game_over and state.turns < max_turns:
+                state.play(*policies[state.player_turn].choose(state))
+                yield from state.take_events()
+        finally:
+            for policy in policies:
+                policy.close()
+        yield Event(GAME_END, state.turns, None, state.winner)
+
+
+class Analytics:
+    """Running totals of the events of any number of games, nothing is kept per game once it has ended.
+
+    Totals are kept separately for each number of players, as seat and jester odds depend on it.
+    """
+
+    def __init__(self):
+        self.events = 0
+        self.games = Counter()
+        self.draws = Counter()
+        self.turns = Counter()
+        # (players, seat) to games won
+        self.seat_wins = Counter()
+        # (players, event kind) to how many times it happened
+        self.counts = Counter()
+        # (players, seats on from the jester's player) to how often the jester chose that seat, None for no number
+        self.jester_seats = Counter()
+        # (players, who) to (games, wins) for players with the rose bonus or the strawberry queen at the end
+        self.queen_games = Counter()
+        self.queen_wins = Counter()
+        # (players, turn bucket) to reshuffles, and the turn of each game's first reshuffle
+        self.reshuffle_turns = Counter()
+        self.first_reshuffle_turns = Counter()
+        self.games_reshuffled = Counter()
+        # the game being read, reset at each GAME_START
+        self.num_players = None
+        self.rose_players = set()
+        self.strawberry_player = None
+        self.reshuffled = False
+
+    def add(self, event):
+        self.events += 1
+        kind = event.kind
+        num_players = self.num_players
+        if kind == GAME_START:
+            self.num_players = event.value
+            self.rose_players = set()
+            self.strawberry_player = None
+            self.reshuffled = False
+            return
+
+        self.counts[num_players, kind] += 1
+        if kind == WAKE:
+            if event.value == STRAWBERRY:
+                self.strawberry_player = event.player
+        elif kind == ROSE_BONUS:
+            self.rose_players.add(event.player)
+        elif kind == JESTER:
+            seat = None if event.value is None else (event.value - event.player) % num_players
+            self.jester_seats[num_players, seat] += 1
+        elif kind == RESHUFFLE:
+            self.reshuffle_turns[num_players, event.turn // RESHUFFLE_BUCKET] += 1
+            if not self.reshuffled:
+                self.reshuffled = True
+                self.games_reshuffled[num_players] += 1
+                self.first_reshuffle_turns[num_players] += event.turn
+        elif kind == GAME_END:
+            self.end_game(num_players, event.turn, event.value)
+
+    def end_game(self, num_players, turns, winner):
+        self.games[num_players] += 1
+        self.turns[num_players] += turns
+        if winner is None:
+            self.draws[num_players] += 1
+        else:
+            self.seat_wins[num_players, winner] += 1
+        # the strawberry queen can't be taken or put back to sleep, so whoever woke her still has her
+        for who, players in (('rose', self.rose_players), ('strawberry', {self.strawberry_player} - {None})):
+            for player_index in players:
+                self.queen_games[num_players, who] += 1
+                self.queen_wins[num_players, who] += player_index == winner
+
+    def run(self, events):
+        for event in events:
+            self.add(event)
+        return self
+
+    def report(self):
+        sections = []
+        for num_players in sorted(self.games):
+            sections.append(self.report_players(num_players))
+        return '\n\n'.join(sections)
+
+    def report_players(self, num_players):
+        games = self.games[num_players]
+        count = Counter({kind: self.counts[num_players, kind] for kind in range(GAME_END + 1)})
+        lines = ['{} players: {} games, {:.1f} turns on average, {:.2%} drawn'.format(
+            num_players, games, self.turns[num_players] / games, self.draws[num_players] / games)]
+
+        lines.append('')
+        lines.append('{:<28} {:>10}'.format('Starting seat', 'Win %'))
+        for seat in range(num_players):
+            lines.append('{:<28} {:>10.2%}'.format(seat, self.seat_wins[num_players, seat] / games))
+
+        lines.append('')
+        lines.append('{:<28} {:>10} {:>10} {:>10}'.format('Attack', 'Played', 'Blocked', 'Block %'))
+        for name, done, blocked in (('Knight (dragon)', STEAL, DRAGON_BLOCK), ('Potion (wand)', SLEEP, WAND_BLOCK)):
+            played = count[done] + count[blocked]
+            lines.append('{:<28} {:>10} {:>10} {:>10.2%}'.format(
+                name, played, count[blocked], count[blocked] / played if played else 0))
+
+        lines.append('')
+        lines.append('{:<28} {:>10} {:>10} {:>10}'.format('Queen', 'Players', 'Win %', 'vs fair'))
+        for who, label in (('rose', 'Had a rose bonus'), ('strawberry', 'Holds strawberry')):
+            players = self.queen_games[num_players, who]
+            win_rate = self.queen_wins[num_players, who] / players if players else 0
+            lines.append('{:<28} {:>10} {:>10.2%} {:>+10.2%}'.format(label, players, win_rate,
+                                                                  win_rate - 1 / num_players))
+        lines.append('{:<28} {:>10}  {:.2f} per game'.format('Rose bonuses', count[ROSE_BONUS],
+                                                              count[ROSE_BONUS] / games))
+        lines.append('{:<28} {:>10}  {:.2f} per game'.format('Attacks shielded', count[STRAWBERRY_SHIELD],
+                                                              count[STRAWBERRY_SHIELD] / games))
+
+        lines.append('')
+        jesters = count[JESTER]
+        lines.append('{:<28} {:>10} {:>10}'.format('Jester lands on', 'Times', '%'))
+        for seat in itertools.chain(range(num_players), [None]):
+            label = 'no number' if seat is None else 'self' if seat == 0 else '{} seats on'.format(seat)
+            times = self.jester_seats[num_players, seat]
+            lines.append('{:<28} {:>10} {:>10.2%}'.format(label, times, times / jesters if jesters else 0))
+
+        lines.append('')
+        reshuffled = self.games_reshuffled[num_players]
+        lines.append('Reshuffles {:.2f} per game, {:.1%} of games reshuffle, the first after {:.1f} turns'.format(
+            count[RESHUFFLE] / games, reshuffled / games,
+            self.first_reshuffle_turns[num_players] / reshuffled if reshuffled else 0))
+        lines.append('{:<28} {:>10} {:>10}'.format('Turns', 'Reshuffles', '%'))
+        buckets = sorted(bucket for players, bucket in self.reshuffle_turns if players == num_players)
+        for bucket in buckets:
+            times = self.reshuffle_turns[num_players, bucket]
+            lines.append('{:<28} {:>10} {:>10.2%}'.format('{}-{}'.format(
+                bucket * RESHUFFLE_BUCKET, (bucket + 1) * RESHUFFLE_BUCKET - 1), times, times / count[RESHUFFLE]))
+        return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Work out statistics on the rules from game logs or new games')
+    parser.add_argument('--logs', nargs='+', default=None, help='log archives to read instead of playing games')
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--policies', nargs='+', default=['random', 'random', 'random', 'random'],
+                        choices=sorted(POLICIES), help='one policy per seat')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.logs:
+        events = log_events(args.logs)
+    else:
+        seed = rules.new_seed() if args.seed is None else args.seed
+        print('Seed {}'.format(seed))
+        events = live_events([POLICIES[name] for name in args.policies], seed, args.games)
+
+    start_time = time.perf_counter()
+    analytics = Analytics().run(events)
+    elapsed = time.perf_counter() - start_time
+    print(analytics.report())
+    print()
+    print('{} events in {:.1f}s, {:.0f} events per second'.format(analytics.events, elapsed, analytics.events / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import os
+from collections import OrderedDict
+import pygame
+import atlas
+
+_shared_caches = {}
+_shared_text_cache = None
+
+
+class AssetCache:
+    """Decodes and scales each card image once and hands out the same Surface after that.
+
+    Images are sliced out of the atlas built for their size by atlas.py when there is one, and only decoded
+    from their own JPEG when there isn't.
+    """
+
+    def __init__(self, resource_dir):
+        self.resource_dir = resource_dir
+        self.surfaces = {}
+        # card size to its Atlas, or None when none has been built for that size
+        self.atlases = {}
+        self.hits = 0
+        self.misses = 0
+
+    def card_file(self, card_type, is_queen):
+        if is_queen:
+            card_file = os.path.join(self.resource_dir, 'queen-{}.jpg'.format(card_type))
+        else:
+            card_file = os.path.join(self.resource_dir, 'card-{}.jpg'.format(card_type))
+
+        if not os.path.isfile(card_file):
+            card_file = os.path.join(self.resource_dir, 'card-1.jpg')
+        return card_file
+
+    def get(self, card_type, is_queen, size):
+        key = (card_type, is_queen, size)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        size_atlas = self.atlas(size)
+        if size_atlas is not None and (card_type, is_queen) in size_atlas:
+            surface = size_atlas.get(card_type, is_queen)
+        else:
+            surface = pygame.image.load(self.card_file(card_type, is_queen))
+            surface = pygame.transform.scale(surface, size)
+            if pygame.display.get_surface() is not None:
+                # match the display's pixel format so blits don't convert every frame
+                surface = surface.convert()
+        self.surfaces[key] = surface
+        return surface
+
+    def atlas(self, size):
+        if size not in self.atlases:
+            path = atlas.atlas_file(self.resource_dir, size)
+            self.atlases[size] = atlas.Atlas(path) if os.path.isfile(path) else None
+        return self.atlases[size]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'surfaces': len(self.surfaces)}
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+
+def shared_cache(resource_dir):
+    cache = _shared_caches.get(resource_dir)
+    if cache is None:
+        cache = AssetCache(resource_dir)
+        _shared_caches[resource_dir] = cache
+    return cache
+
+
+class TextCache:
+    """Renders each piece of text once and hands out the same Surface after that.
+
+    Text is keyed by (text, size, colour, rotation) and the least recently used surfaces are dropped once
+    there are more than max_size of them, so typing names in doesn't keep every partial name forever.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pygame.font.Font(None, size)
+        return font
+
+    def get(self, text, size, colour, rotation=0):
+        key = (text, size, colour, rotation)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = self.font(size).render(text, True, colour)
+        if rotation:
+            surface = pygame.transform.rotate(surface, rotation)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'surfaces': len(self.surfaces)}
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+
+def shared_text_cache():
+    global _shared_text_cache
+    if _shared_text_cache is None:
+        _shared_text_cache = TextCache()
+    return _shared_text_cache
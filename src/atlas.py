@@ -0,0 +1,118 @@
+"""Packs every card and queen image into one pre-scaled atlas file per card size.
+
+Decoding and scaling a JPEG the first time each card is shown stalls the frame it is shown in. Build the
+atlases once for the screen sizes the game runs at and AssetCache slices the images out of them instead:
+
+    python atlas.py --sizes 1200x1200 1920x1080
+"""
+import argparse
+import mmap
+import os
+import struct
+import pygame
+import layout
+
+MAGIC = b'SQAT'
+VERSION = 1
+# the magic number, format version, the size of every image in the atlas and how many there are
+HEADER = struct.Struct('<4sBHHH')
+# each image's index entry: whether it is a queen and the length of its name, followed by the name
+ENTRY = struct.Struct('<?B')
+FILE_PREFIXES = {'card-': False, 'queen-': True}
+DEFAULT_SIZES = [(1200, 1200)]
+
+
+def atlas_file(resource_dir, size):
+    return os.path.join(resource_dir, 'atlas-{}x{}.sqa'.format(*size))
+
+
+def resource_images(resource_dir):
+    """The (name, is_queen) of every image in resource_dir with the path to its file."""
+    images = []
+    for file_name in sorted(os.listdir(resource_dir)):
+        name, extension = os.path.splitext(file_name)
+        for prefix, is_queen in FILE_PREFIXES.items():
+            if extension == '.jpg' and name.startswith(prefix):
+                images.append(((name[len(prefix):], is_queen), os.path.join(resource_dir, file_name)))
+    return images
+
+
+def build(resource_dir, size):
+    """Write the atlas of every image in resource_dir scaled to size and return its path.
+
+    The images are stacked in a strip one above the other as raw RGB rows, so image n is the rectangle
+    (0, n * height, width, height) of the strip and starts n * width * height * 3 bytes into the pixels.
+    """
+    images = resource_images(resource_dir)
+    parts = [HEADER.pack(MAGIC, VERSION, size[0], size[1], len(images))]
+    for (name, is_queen), path in images:
+        name_bytes = name.encode('utf-8')
+        parts.append(ENTRY.pack(is_queen, len(name_bytes)) + name_bytes)
+    for key, path in images:
+        # scaled exactly as AssetCache scales them, so the atlas draws the same pixels as the JPEGs
+        surface = pygame.transform.scale(pygame.image.load(path), size)
+        parts.append(pygame.image.tobytes(surface, 'RGB'))
+
+    path = atlas_file(resource_dir, size)
+    with open(path, 'wb') as output_file:
+        output_file.write(b''.join(parts))
+    return path
+
+
+class Atlas:
+    """A built atlas file, memory-mapped so opening it reads nothing and each image is sliced out on demand."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as atlas_file:
+            self.data = mmap.mmap(atlas_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, width, height, count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a version {} atlas: {}'.format(VERSION, path))
+
+        self.size = (width, height)
+        self.image_bytes = width * height * 3
+        self.offsets = {}
+        offset = HEADER.size
+        names = []
+        for index in range(count):
+            is_queen, name_length = ENTRY.unpack_from(self.data, offset)
+            offset += ENTRY.size
+            names.append((bytes(self.data[offset:offset + name_length]).decode('utf-8'), is_queen))
+            offset += name_length
+        for index, key in enumerate(names):
+            self.offsets[key] = offset + index * self.image_bytes
+
+    def __contains__(self, key):
+        return key in self.offsets
+
+    def get(self, name, is_queen):
+        offset = self.offsets[(name, is_queen)]
+        surface = pygame.image.frombuffer(self.data[offset:offset + self.image_bytes], self.size, 'RGB')
+        if pygame.display.get_surface() is not None:
+            return surface.convert()
+        # frombuffer shares the bytes it was given, copy so the surface owns its pixels
+        return surface.copy()
+
+    def close(self):
+        self.data.close()
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the card image atlases for the given screen sizes')
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES, type=parse_size,
+                        help='screen sizes as WIDTHxHEIGHT, one atlas is built for the card size of each')
+    parser.add_argument('--resources', default=os.path.join('..', 'resources'))
+    args = parser.parse_args()
+
+    for screen_size in args.sizes:
+        path = build(args.resources, layout.card_size(screen_size))
+        print('{} {} bytes'.format(path, os.path.getsize(path)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+"""Plays thousands of games in lockstep as NumPy arrays, for balance studies that need millions of turns.
+
+Every game in a batch is a row of the same arrays: the hands, the deck and discards, who owns each queen
+and whose turn it is. step() plays one turn of every game still running at once, with masks picking out
+the games that played a king, a jester, a knight or a potion, so the cost per turn is a few array
+operations shared by the whole batch rather than a Python call per card.
+
+The games follow the same rules as GameState and the policies choose the way RandomPolicy and GreedyPolicy
+do, but from NumPy's generator, so a batch gives the same statistics as simulate.py rather than the same
+games. A queen's slot on the table doesn't change the game, so queens are only tracked by their owner.
+
+    python batch.py --games 100000 --policies greedy random
+"""
+import argparse
+import itertools
+import time
+import numpy as np
+from cards import KING, KNIGHT, POTION, WAND, DRAGON, JESTER, NUMBER, KINDS, VALUES, FULL_DECK, QUEENS, ROSE, \
+    STRAWBERRY
+from rules import CARDS_PER_PLAYER, QUEENS_TO_WIN
+from simulate import GameResult, Summary, MAX_TURNS
+
+KIND_TABLE = np.array(KINDS, dtype=np.int8)
+VALUE_TABLE = np.array(VALUES, dtype=np.int8)
+DECK = np.array(FULL_DECK, dtype=np.int8)
+DECK_SIZE = len(FULL_DECK)
+NUM_QUEENS = len(QUEENS)
+ASLEEP = -1
+# every set of hand indexes a play could use, in the same order as rules.legal_plays() lists them, so the
+# first five are the single cards
+PLAYS = np.array([[card_index in card_indexes for card_index in range(CARDS_PER_PLAYER)]
+                  for size in range(1, CARDS_PER_PLAYER + 1)
+                  for card_indexes in itertools.combinations(range(CARDS_PER_PLAYER), size)])
+PLAY_SIZES = PLAYS.sum(1)
+# the order GreedyPolicy falls back on when it has no queen to take and no numbers to throw away
+GREEDY_FALLBACK = (JESTER, KNIGHT, POTION, WAND, DRAGON)
+# a hand's plays only depend on the values of its cards, 0 to 10, so a hand is looked up by those in base 11
+HAND_VALUES = 11
+HAND_PLACES = HAND_VALUES ** np.arange(CARDS_PER_PLAYER)
+
+# the valid plays of every possible hand, built the first time a batch is played
+_play_tables = None
+
+
+def random_choice(rng, mask):
+    """The index of a random True in each row of mask, and 0 for rows with none."""
+    keys = rng.random(mask.shape)
+    keys[~mask] = -1
+    return keys.argmax(1)
+
+
+def first_card(hand_kinds, kind):
+    """Whether each hand holds a card of kind, and the hand index of the first one."""
+    matches = hand_kinds == kind
+    return matches.any(1), matches.argmax(1)
+
+
+def valid_plays(values):
+    """Which of PLAYS are valid for hands with these card values, and which of those only use number cards."""
+    values = values[:, None, :]
+    largest = np.where(PLAYS, values, 0).max(2)
+    smallest = np.where(PLAYS, values, 127).min(2)
+    total = (values * PLAYS).sum(2, dtype=np.int16)
+    numbers = (smallest > 0) & ((smallest == largest) | (largest * 2 == total))
+    return (PLAY_SIZES == 1) | numbers, numbers
+
+
+def play_tables():
+    """For every hand: how many valid plays it has, their indexes in PLAYS, and its longest number play or -1."""
+    global _play_tables
+    if _play_tables is None:
+        values = np.array(list(itertools.product(range(HAND_VALUES), repeat=CARDS_PER_PLAYER)), dtype=np.int8)
+        # product() counts up from the last card, HAND_PLACES from the first
+        values = values[:, ::-1]
+        valid, numbers = valid_plays(values)
+        # the valid plays packed to the front of each row, in PLAYS order
+        play_lists = np.argsort(~valid, axis=1, kind='stable').astype(np.int8)
+        # the first of the longest, as max(plays, key=len) picks it from legal_plays()
+        longest = np.where(numbers.any(1), (PLAY_SIZES * numbers).argmax(1), -1).astype(np.int8)
+        _play_tables = (valid.sum(1).astype(np.int8), play_lists, longest)
+    return _play_tables
+
+
+def hand_keys(hands):
+    return VALUE_TABLE[hands].astype(np.int32) @ HAND_PLACES
+
+
+def random_plays(rng, hands, has_target):
+    play_counts, play_lists, longest = play_tables()
+    keys = hand_keys(hands)
+    picks = (rng.random(len(hands)) * play_counts[keys]).astype(np.intp)
+    return play_lists[keys, picks]
+
+
+def greedy_plays(rng, hands, has_target):
+    play_counts, play_lists, longest = play_tables()
+    hand_kinds = KIND_TABLE[hands]
+    plays = longest[hand_keys(hands)].astype(np.intp)
+    chosen = plays >= 0
+    for kind in reversed(GREEDY_FALLBACK):
+        found, card_index = first_card(hand_kinds, kind)
+        fallback = found & ~chosen
+        plays[fallback] = card_index[fallback]
+
+    # a queen to wake or take beats everything else, kings first
+    for kind, needs_target in ((POTION, True), (KNIGHT, True), (KING, False)):
+        found, card_index = first_card(hand_kinds, kind)
+        if needs_target:
+            found &= has_target
+        plays[found] = card_index[found]
+    return plays
+
+
+POLICIES = {'random': random_plays, 'greedy': greedy_plays}
+
+
+class BatchGames:
+    def __init__(self, num_games, policies, seed=None):
+        self.num_games = num_games
+        self.num_players = len(policies)
+        self.policies = [POLICIES[name] for name in policies]
+        self.rng = np.random.default_rng(seed)
+        self.hands = np.zeros((num_games, self.num_players, CARDS_PER_PLAYER), dtype=np.int8)
+        # the top of each game's deck and discards is the last of its cards
+        self.deck = np.zeros((num_games, DECK_SIZE), dtype=np.int8)
+        self.deck_size = np.zeros(num_games, dtype=np.int16)
+        self.discards = np.zeros((num_games, DECK_SIZE), dtype=np.int8)
+        self.discard_size = np.zeros(num_games, dtype=np.int16)
+        # the seat each queen belongs to, or ASLEEP
+        self.queen_owner = np.full((num_games, NUM_QUEENS), ASLEEP, dtype=np.int8)
+        self.player_turn = np.zeros(num_games, dtype=np.int8)
+        self.game_over = np.zeros(num_games, dtype=bool)
+        self.winner = np.full(num_games, -1, dtype=np.int8)
+        # running totals, as in GameState
+        self.turns = np.zeros(num_games, dtype=np.int32)
+        self.queens_woken = np.zeros(num_games, dtype=np.int32)
+        self.cards_drawn = np.zeros(num_games, dtype=np.int32)
+        self.reshuffles = np.zeros(num_games, dtype=np.int32)
+
+    def deal(self):
+        self.deck[:] = DECK[self.rng.random((self.num_games, DECK_SIZE)).argsort(1)]
+        # dealt round the table one card at a time from the top of the deck
+        dealt = CARDS_PER_PLAYER * self.num_players
+        self.hands[:] = self.deck[:, :DECK_SIZE - dealt - 1:-1].reshape(
+            self.num_games, CARDS_PER_PLAYER, self.num_players).transpose(0, 2, 1)
+        self.deck_size[:] = DECK_SIZE - dealt
+
+    def reshuffle(self, games):
+        # only done once a deck is empty, so the shuffled discards become the whole deck
+        keys = self.rng.random((len(games), DECK_SIZE))
+        keys[np.arange(DECK_SIZE) >= self.discard_size[games][:, None]] = 2
+        self.deck[games] = np.take_along_axis(self.discards[games], keys.argsort(1), 1)
+        self.deck_size[games] = self.discard_size[games]
+        self.discard_size[games] = 0
+        self.reshuffles[games] += 1
+
+    def top_cards(self, games):
+        empty = games[self.deck_size[games] == 0]
+        if len(empty):
+            self.reshuffle(empty)
+        return self.deck[games, self.deck_size[games] - 1]
+
+    def replace_cards(self, games, players, card_indexes):
+        """Discard one card from the hand of each game's player and draw another in its place."""
+        self.discards[games, self.discard_size[games]] = self.hands[games, players, card_indexes]
+        self.discard_size[games] += 1
+        self.hands[games, players, card_indexes] = self.top_cards(games)
+        self.deck_size[games] -= 1
+        self.cards_drawn[games] += 1
+
+    def wake_queens(self, games, players):
+        queens = random_choice(self.rng, self.queen_owner[games] == ASLEEP)
+        self.queen_owner[games, queens] = players
+        self.queens_woken[games] += 1
+        return queens
+
+    def queen_counts(self, games):
+        # one bincount over the whole batch, with a bin per game for each seat and one for the sleeping queens
+        bins = self.queen_owner[games] + 1 + (self.num_players + 1) * np.arange(len(games))[:, None]
+        counts = np.bincount(bins.ravel(), minlength=len(games) * (self.num_players + 1))
+        return counts.reshape(len(games), self.num_players + 1)[:, 1:]
+
+    def play_kings(self, games, players):
+        queens = self.wake_queens(games, players)
+        # the rose queen wakes another one too
+        rose = queens == ROSE
+        if rose.any():
+            games, players = games[rose], players[rose]
+            bonus = ((self.queen_counts(games)[np.arange(len(games)), players] < QUEENS_TO_WIN) &
+                     (self.queen_owner[games] == ASLEEP).any(1))
+            self.wake_queens(games[bonus], players[bonus])
+
+    def play_jesters(self, games, players):
+        revealed = self.top_cards(games)
+        # a number counts round the table from the player and whoever it stops at wakes a queen
+        counted = KIND_TABLE[revealed] == NUMBER
+        chosen = (players[counted] + VALUE_TABLE[revealed[counted]] - 1) % self.num_players
+        self.wake_queens(games[counted], chosen)
+
+    def play_targeted(self, games, players, targetable, defence):
+        """Knights and potions: a random target queen moves unless its owner has the defence card to block it."""
+        targets = random_choice(self.rng, targetable)
+        owners = self.queen_owner[games, targets]
+        defended, card_index = first_card(KIND_TABLE[self.hands[games, owners]], defence)
+        if defended.any():
+            self.replace_cards(games[defended], owners[defended], card_index[defended])
+        taken = ~defended
+        self.queen_owner[games[taken], targets[taken]] = players[taken] if defence == DRAGON else ASLEEP
+
+    def step(self):
+        """Play one turn of every game that isn't over, returning how many games played."""
+        games = np.flatnonzero(~self.game_over)
+        if not len(games):
+            return 0
+        players = self.player_turn[games].astype(np.intp)
+        hands = self.hands[games, players]
+        owners = self.queen_owner[games]
+        # what a knight or potion could go after: another player's queen that isn't the strawberry queen
+        targetable = (owners != ASLEEP) & (owners != players[:, None])
+        targetable[:, STRAWBERRY] = False
+        has_target = targetable.any(1)
+
+        plays = np.zeros(len(games), dtype=np.intp)
+        for seat, policy in enumerate(self.policies):
+            seated = players == seat
+            if seated.any():
+                plays[seated] = policy(self.rng, hands[seated], has_target[seated])
+        played = PLAYS[plays]
+        kinds = KIND_TABLE[hands[np.arange(len(games)), played.argmax(1)]]
+
+        kings = kinds == KING
+        if kings.any():
+            self.play_kings(games[kings], players[kings])
+        jesters = kinds == JESTER
+        if jesters.any():
+            self.play_jesters(games[jesters], players[jesters])
+        for kind, defence in ((KNIGHT, DRAGON), (POTION, WAND)):
+            acting = (kinds == kind) & has_target
+            if acting.any():
+                self.play_targeted(games[acting], players[acting], targetable[acting], defence)
+
+        for card_index in range(CARDS_PER_PLAYER):
+            replaced = played[:, card_index]
+            if replaced.any():
+                self.replace_cards(games[replaced], players[replaced], card_index)
+        self.finalise_turns(games, players)
+        return len(games)
+
+    def finalise_turns(self, games, players):
+        self.turns[games] += 1
+        counts = self.queen_counts(games)
+        won = (counts >= QUEENS_TO_WIN).any(1)
+        # once every queen is awake the player with the most queens wins
+        all_awake = ~(self.queen_owner[games] == ASLEEP).any(1)
+        over = won | all_awake
+        self.winner[games[won]] = (counts[won] >= QUEENS_TO_WIN).argmax(1)
+        self.winner[games[all_awake & ~won]] = counts[all_awake & ~won].argmax(1)
+        self.game_over[games[over]] = True
+        self.player_turn[games] = (players + 1) % self.num_players
+
+    def run(self, max_turns=MAX_TURNS):
+        """Deal and play every game until it is over or max_turns have been played, returning the turns played."""
+        self.deal()
+        turns = 0
+        for turn in range(max_turns):
+            played = self.step()
+            if not played:
+                break
+            turns += played
+        return turns
+
+    def results(self):
+        return [GameResult(None, None if winner < 0 else int(winner), int(turns), int(queens_woken),
+                           int(cards_drawn), int(reshuffles))
+                for winner, turns, queens_woken, cards_drawn, reshuffles in
+                zip(self.winner, self.turns, self.queens_woken, self.cards_drawn, self.reshuffles)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play batches of Sleeping Queens games between bots in lockstep')
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--policies', nargs='+', default=['random', 'random', 'random', 'random'],
+                        choices=sorted(POLICIES), help='one policy per seat')
+    parser.add_argument('--batch-size', type=int, default=100000, help='games stepped together')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    seed_sequence = np.random.SeedSequence(args.seed)
+    print('Seed {}'.format(seed_sequence.entropy))
+    summary = Summary(len(args.policies))
+    start_time = time.perf_counter()
+    turns = 0
+    for first_game in range(0, args.games, args.batch_size):
+        games = BatchGames(min(args.batch_size, args.games - first_game), args.policies, seed_sequence.spawn(1)[0])
+        turns += games.run()
+        for result in games.results():
+            summary.add(result)
+
+    elapsed = time.perf_counter() - start_time
+    print(summary.report())
+    print('{:.0f} games per second, {:.0f} turns per second'.format(summary.games / elapsed, turns / elapsed))
+
+
+if __name__ == '__main__':
+    main()
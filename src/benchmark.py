@@ -0,0 +1,225 @@
+"""Times the hot paths of the rules, the rendering and the simulator.
+
+Runs headless on SDL's dummy video driver, so the numbers can be taken on any Linux box. Save a run with
+--output and check a later run against it with --baseline, anything slower by more than --tolerance is
+reported as a regression and the exit status is 1:
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --baseline baseline.json
+"""
+import os
+# SDL reads this when the display is opened, so it has to be set before any surfaces exist
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import timeit
+import pygame
+import assets
+import cards
+import gamelog
+import queens
+import rules
+import simulate
+import snapshot
+import tables
+from cards import FULL_DECK
+from frames import Timeline
+from policies import RandomPolicy, GreedyPolicy
+
+PLAYER_NAMES = ['Player0', 'Player1', 'Player2', 'Player3']
+# one card move at 60 frames a second
+MOVE_FRAMES = 30
+HANDS = 1000
+GAMES = 20
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register a setup function returning the callable to time and how many operations each call does."""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def new_board(screen):
+    board = queens.Board(screen, PLAYER_NAMES, timeline=Timeline(), rng=0)
+    board.initialise_all()
+    return board
+
+
+def random_hands(seed):
+    rng = random.Random(seed)
+    return [rng.sample(FULL_DECK, rng.randint(1, rules.CARDS_PER_PLAYER)) for hand in range(HANDS)]
+
+
+@benchmark('board.initialise_board')
+def bench_initialise_board(screen):
+    return new_board(screen).initialise_board, 1
+
+
+@benchmark('board.show_player_cards')
+def bench_show_player_cards(screen):
+    return new_board(screen).show_player_cards, 1
+
+
+@benchmark('board.move_card_to_destination')
+def bench_move_card(screen):
+    board = new_board(screen)
+
+    def move_card():
+        board.move_card_to_destination(board.card_back_image, board.screen_center, board.playable_card_positions[0])
+        for frame in range(MOVE_FRAMES):
+            board.timeline.advance(board.move_time / MOVE_FRAMES)
+
+    return move_card, 1
+
+
+@benchmark('board.deal_initial_cards')
+def bench_deal(screen):
+    def deal():
+        board = queens.Board(screen, PLAYER_NAMES, timeline=Timeline(), rng=0)
+        board.initialise_players()
+        board.initialise_card_positions()
+        board.deal_initial_cards()
+
+    return deal, 1
+
+
+@benchmark('assets.load_all')
+def bench_load_all(screen):
+    # every image a game can show, from an empty cache, as at the start of a game
+    board = new_board(screen)
+    images = [(cards.card_name(card), False) for card in range(len(cards.CARD_NAMES))]
+    images += [(cards.card_name(queen, True), True) for queen in cards.QUEENS]
+
+    def load_all():
+        cache = assets.AssetCache(board.resource_dir)
+        for name, is_queen in images:
+            cache.get(name, is_queen, board.card_size)
+
+    return load_all, len(images)
+
+
+@benchmark('rules.is_valid_play')
+def bench_valid_play(screen):
+    hands = random_hands(0)
+
+    def valid_plays():
+        for hand in hands:
+            rules.is_valid_play(hand)
+
+    return valid_plays, HANDS
+
+
+@benchmark('rules.legal_plays')
+def bench_legal_plays(screen):
+    hands = random_hands(1)
+
+    def legal_plays():
+        for hand in hands:
+            rules.legal_plays(hand)
+
+    return legal_plays, HANDS
+
+
+@benchmark('state.copy')
+def bench_copy(screen):
+    return simulate.play_game([GreedyPolicy] * 4, 0, max_turns=20).copy, 1
+
+
+@benchmark('snapshot.round_trip')
+def bench_snapshot(screen):
+    state = simulate.play_game([GreedyPolicy] * 4, 0, max_turns=20)
+    return lambda: snapshot.loads(snapshot.dumps(state)), 1
+
+
+@benchmark('gamelog.replay')
+def bench_replay(screen):
+    log = gamelog.GameLog(gamelog.dumps(simulate.play_game([GreedyPolicy] * 4, 0)))
+    return lambda: gamelog.Replayer(log).final_state(), 1
+
+
+@benchmark('simulate.random_game')
+def bench_random_games(screen):
+    return lambda: [simulate.play_game([RandomPolicy] * 4, seed) for seed in range(GAMES)], GAMES
+
+
+@benchmark('simulate.greedy_game')
+def bench_greedy_games(screen):
+    return lambda: [simulate.play_game([GreedyPolicy] * 4, seed) for seed in range(GAMES)], GAMES
+
+
+@benchmark('tables.random_game')
+def bench_table_games(screen):
+    def play_tables():
+        manager = tables.TableManager()
+        for seed in range(GAMES):
+            manager.add_table([RandomPolicy] * 4, seed)
+        manager.run()
+    return play_tables, GAMES
+
+
+def run(names, repeat):
+    pygame.init()
+    screen = pygame.display.set_mode((queens.SCREEN_WIDTH, queens.SCREEN_HEIGHT))
+    results = {}
+    for name in names:
+        func, operations = BENCHMARKS[name](screen)
+        timer = timeit.Timer(func)
+        number = timer.autorange()[0]
+        # microseconds per operation for each repeat
+        times = [elapsed / number / operations * 1e6 for elapsed in timer.repeat(repeat, number)]
+        results[name] = {'best_us': min(times), 'median_us': statistics.median(times), 'calls': number}
+        print('{:<36} {:>12.2f} us  (median {:.2f})'.format(name, min(times), statistics.median(times)))
+    pygame.quit()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print how each benchmark moved against the baseline and return the names that got slower."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = result['best_us'] / baseline[name]['best_us'] - 1
+        regressed = change > tolerance
+        if regressed:
+            regressions.append(name)
+        print('{:<36} {:>12.2f} -> {:>10.2f} us {:>+8.1%}{}'.format(
+            name, baseline[name]['best_us'], result['best_us'], change, '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the rules, rendering and simulation hot paths')
+    parser.add_argument('--only', nargs='+', default=sorted(BENCHMARKS), choices=sorted(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs of each benchmark, the best is compared')
+    parser.add_argument('--output', default=None, help='write the results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='JSON results from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='fraction slower that counts as a regression')
+    args = parser.parse_args()
+
+    results = run(args.only, args.repeat)
+    if args.output:
+        report = {'python': platform.python_version(), 'pygame': pygame.version.ver,
+                  'machine': platform.machine(), 'video_driver': os.environ['SDL_VIDEODRIVER'], 'results': results}
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        print()
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""Cards and queens in the game model are small ints.
+
+A card's code indexes the tables below for its name, kind and number value, so the rules never have to
+look at a string to find out what a card does. The names are only needed to find the card's picture.
+"""
+
+# card kinds
+NUMBER, KING, KNIGHT, POTION, WAND, DRAGON, JESTER = range(7)
+
+KING_NAMES = ['cookie', 'fire', 'hat', 'tie-dye', 'turtle', 'puzzle', 'pasta', 'tool', 'bubble-gum', 'chess']
+
+CARD_NAMES = ([str(value) for value in range(1, 11)] + ['king-{}'.format(king) for king in KING_NAMES] +
+              ['knight', 'potion', 'wand', 'dragon', 'jester'])
+KINDS = [NUMBER] * 10 + [KING] * len(KING_NAMES) + [KNIGHT, POTION, WAND, DRAGON, JESTER]
+# the face value of every card, with 0 for the ones that aren't numbers
+VALUES = list(range(1, 11)) + [0] * (len(CARD_NAMES) - 10)
+CODES = {card_name: code for code, card_name in enumerate(CARD_NAMES)}
+
+QUEEN_NAMES = ['heart', 'rose', 'peacock', 'ice-cream', 'dog', 'cat', 'strawberry', 'sunflower',
+               'rainbow', 'pancake', 'cake', 'ladybird', 'starfish', 'book', 'butterfly', 'moon']
+QUEENS = list(range(len(QUEEN_NAMES)))
+ROSE = QUEEN_NAMES.index('rose')
+STRAWBERRY = QUEEN_NAMES.index('strawberry')
+
+# four of each number, one of each king and the action cards
+FULL_DECK = ([code for code in range(10) for copy in range(4)] + [CODES['king-' + king] for king in KING_NAMES] +
+             [CODES['potion']] * 4 + [CODES['wand']] * 3 + [CODES['knight']] * 4 + [CODES['dragon']] * 3 +
+             [CODES['jester']] * 4)
+
+
+def card_name(card, is_queen=False):
+    return QUEEN_NAMES[card] if is_queen else CARD_NAMES[card]
@@ -0,0 +1,363 @@
+"""Clients for server.py: a pygame window for one seat and scripted players for testing on localhost.
+
+Play one seat of a table in a window, with the other seats filled by whoever else joins the same table:
+
+    python client.py --connect 127.0.0.1:8765 --table friday --name Alice
+
+Or load a server started here on a free port with scripted players, one connection per seat:
+
+    python client.py --tables 200 --players 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import pygame
+import assets
+import cards
+import layout
+import protocol
+import rules
+from queens import Card, SCREEN_WIDTH, SCREEN_HEIGHT
+from server import GameServer
+from pygame.locals import QUIT, MOUSEBUTTONUP
+
+BG_COLOUR = (100, 100, 100)
+PLAYER_COLOUR = (200, 200, 200)
+SEAT_COLOUR = (255, 255, 255)
+HIGHLIGHT_COLOUR = (22, 106, 22)
+RED = (222, 0, 0)
+
+
+class GameClient:
+    """One seat's connection to a server and everything that seat can see of the game."""
+
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.seat = None
+        self.player_names = []
+        self.view = None
+        self.error = None
+        self.updates = 0
+        self.bytes_received = 0
+        # the view only holds the move count modulo 256
+        self.moves_seen = 0
+
+    async def connect(self, host, port, table, name):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(protocol.encode_join(table, name))
+
+    async def receive(self):
+        """Wait for the next message from the server and apply it, returning its type."""
+        kind, payload = await protocol.read_message(self.reader)
+        self.bytes_received += protocol.FRAME.size + len(payload)
+        if kind == protocol.WELCOME:
+            self.seat, self.player_names = protocol.decode_welcome(payload)
+            self.view = protocol.blank_view(len(self.player_names))
+        elif kind == protocol.UPDATE:
+            moves = self.view[protocol.VIEW_MOVES]
+            protocol.apply_delta(self.view, payload)
+            self.updates += 1
+            if self.updates > 1 and self.view[protocol.VIEW_MOVES] != moves:
+                self.moves_seen += 1
+            self.error = None
+        elif kind == protocol.ERROR:
+            self.error = payload.decode('utf-8')
+        return kind
+
+    def play(self, card_indexes, target=None, bonus=None):
+        self.writer.write(protocol.encode_play(card_indexes, target, bonus))
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    @property
+    def started(self):
+        # the blank view means nothing, the first update after the welcome fills it in
+        return self.updates > 0
+
+    @property
+    def num_players(self):
+        return len(self.player_names)
+
+    @property
+    def player_turn(self):
+        return self.view[protocol.VIEW_TURN]
+
+    @property
+    def my_turn(self):
+        return self.started and not self.game_over and self.player_turn == self.seat
+
+    @property
+    def game_over(self):
+        return self.started and bool(self.view[protocol.VIEW_GAME_OVER])
+
+    @property
+    def winner(self):
+        winner = self.view[protocol.VIEW_WINNER]
+        return None if winner == protocol.NONE else winner
+
+    @property
+    def moves(self):
+        return self.view[protocol.VIEW_MOVES]
+
+    @property
+    def hand(self):
+        return list(self.view[protocol.VIEW_HAND:protocol.VIEW_SLOTS])
+
+    def sleeping_slots(self):
+        return [slot for slot, asleep in enumerate(self.view[protocol.VIEW_SLOTS:protocol.VIEW_QUEENS]) if asleep]
+
+    def queens(self, player_index):
+        offset = protocol.VIEW_QUEENS + rules.QUEENS_TO_WIN * player_index
+        return [queen for queen in self.view[offset:offset + rules.QUEENS_TO_WIN] if queen != protocol.NONE]
+
+    def awake_queens(self):
+        """The (player index, queen index) pairs this seat could take with a knight or potion."""
+        return [(player_index, queen_index) for player_index in range(self.num_players) if player_index != self.seat
+                for queen_index, queen in enumerate(self.queens(player_index)) if queen != cards.STRAWBERRY]
+
+
+def choose_move(client, rng):
+    """A random valid play from the client's hand and a target for it, as RandomPolicy would choose."""
+    hand = client.hand
+    card_indexes = rng.choice(rules.legal_plays(hand))
+    kind = cards.KINDS[hand[card_indexes[0]]]
+    target = None
+    if kind in (cards.KING, cards.JESTER):
+        target = rng.choice(client.sleeping_slots())
+    elif kind in (cards.KNIGHT, cards.POTION) and client.awake_queens():
+        target = rng.choice(client.awake_queens())
+    return card_indexes, target
+
+
+async def scripted_player(host, port, table, name, rng):
+    """Join a table and play random moves until the game is over, returning the client."""
+    client = GameClient()
+    await client.connect(host, port, table, name)
+    played_at = None
+    while not client.game_over:
+        kind = await client.receive()
+        if kind == protocol.ERROR:
+            # try something else
+            played_at = None
+        if client.my_turn and client.moves != played_at:
+            client.play(*choose_move(client, rng))
+            played_at = client.moves
+    await client.close()
+    return client
+
+
+async def load_test(num_tables, num_players, seed, address=None):
+    """Play num_tables games at once with scripted players, against a server started here unless given one."""
+    server = None
+    if address is None:
+        game_server = GameServer(num_players, seed)
+        server = await game_server.serve('127.0.0.1', 0)
+        address = server.sockets[0].getsockname()[:2]
+
+    rng = random.Random(seed)
+    start_time = time.perf_counter()
+    players = [scripted_player(address[0], address[1], 'table{}'.format(table_index),
+                               'Player{}'.format(seat), rules.fork_rng(rng))
+               for table_index in range(num_tables) for seat in range(num_players)]
+    clients = await asyncio.gather(*players)
+    elapsed = time.perf_counter() - start_time
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+
+    # every seat sees every move, so one seat's count is the whole game's
+    moves = sum(client.moves_seen for client in clients[::num_players])
+    updates = sum(client.updates for client in clients)
+    received = sum(client.bytes_received for client in clients)
+    print('{} tables of {} played {} moves in {:.2f}s, {:.0f} moves per second'.format(
+        num_tables, num_players, moves, elapsed, moves / elapsed))
+    print('{} updates sent, {:.1f} bytes each'.format(updates, received / updates))
+    return clients
+
+
+class TableWindow:
+    """Draws one seat's view of a table and turns its clicks into moves, the other hands are only ever backs."""
+
+    def __init__(self, screen, client):
+        self.screen = screen
+        self.client = client
+        self.layout = layout.table_layout(screen.get_size(), client.num_players)
+        self.assets = assets.shared_cache(os.path.join('..', 'resources'))
+        self.text = assets.shared_text_cache()
+        self.selection = []
+        # the kind of card waiting for a queen to be clicked, if any
+        self.choosing = None
+        # a king's queen, held back while the player picks the queen to take too if she turns out to be the rose
+        self.wake_slot = None
+        self.disconnected = False
+
+    def image(self, card, is_queen=False):
+        return self.assets.get(cards.card_name(card, is_queen), is_queen, self.layout.card_size)
+
+    def back(self, is_queen=False):
+        return self.assets.get('back', is_queen, self.layout.card_size)
+
+    def draw_card(self, position, image, colour=BG_COLOUR):
+        Card(self.layout.card_size).draw_card(self.screen, position, image, colour)
+
+    def draw_label(self, text, position, colour, rotation=0):
+        label = self.text.get(text, 50, colour, rotation)
+        rect = label.get_rect()
+        rect.center = position
+        self.screen.blit(label, rect)
+
+    def draw(self):
+        client = self.client
+        self.screen.fill(BG_COLOUR)
+        for player_index, name in enumerate(client.player_names):
+            colour = SEAT_COLOUR if player_index == client.seat else PLAYER_COLOUR
+            if player_index == client.player_turn and not client.game_over:
+                colour = RED
+            rotation = (player_index + 1) * 90 if player_index % 2 == 0 else 0
+            self.draw_label(name, self.layout.player_positions[player_index], colour, rotation)
+            for card_index in range(rules.CARDS_PER_PLAYER):
+                position = self.layout.hand_positions[card_index * client.num_players + player_index]
+                if player_index == client.seat:
+                    colour = HIGHLIGHT_COLOUR if card_index in self.selection else BG_COLOUR
+                    self.draw_card(position, self.image(client.hand[card_index]), colour)
+                else:
+                    self.draw_card(position, self.back())
+            for queen_index, queen in enumerate(client.queens(player_index)):
+                self.draw_card(self.layout.player_queen_positions[player_index][queen_index], self.image(queen, True))
+        for slot in client.sleeping_slots():
+            colour = HIGHLIGHT_COLOUR if slot == self.wake_slot else BG_COLOUR
+            self.draw_card(self.layout.queen_slot_positions[slot], self.back(True), colour)
+        self.draw_card(self.layout.screen_center, self.back())
+
+        message = client.error
+        if self.disconnected:
+            message = 'Lost the connection to the server'
+        elif client.game_over:
+            message = '{} - Winner'.format(client.player_names[client.winner])
+        elif self.wake_slot is not None:
+            message = 'Choose a queen to take too if that is the rose'
+        elif self.choosing is not None:
+            message = 'Choose a queen'
+        if message:
+            self.draw_label(message, (self.layout.screen_center[0], self.layout.screen_center[1] // 4), RED)
+        pygame.display.flip()
+
+    def click(self, pos):
+        target = self.layout.hit_grid.find(pos)
+        client = self.client
+        if self.disconnected or not client.my_turn or target is None:
+            return
+        hand = client.hand
+        if self.choosing is not None:
+            self.choose_queen(target)
+        elif target[0] == layout.HAND_CARD and target[1] == client.seat:
+            if target[2] in self.selection:
+                self.selection.remove(target[2])
+            else:
+                self.selection.append(target[2])
+        elif target == (layout.DRAW_PILE,) and rules.is_valid_play([hand[card_index] for card_index in self.selection]):
+            kind = cards.KINDS[hand[self.selection[0]]]
+            if kind in (cards.KING, cards.JESTER) or (kind in (cards.KNIGHT, cards.POTION) and client.awake_queens()):
+                self.choosing = kind
+            else:
+                self.send()
+
+    def may_wake_rose(self):
+        # sleeping queens are face down, so all the seat can tell is whether the rose could still be one of them
+        client = self.client
+        return (len(client.sleeping_slots()) > 1 and len(client.queens(client.seat)) + 1 < rules.QUEENS_TO_WIN and
+                all(cards.ROSE not in client.queens(player_index) for player_index in range(client.num_players)))
+
+    def choose_queen(self, target):
+        if self.choosing in (cards.KING, cards.JESTER):
+            if target[0] != layout.QUEEN_SLOT or target[1] not in self.client.sleeping_slots():
+                return
+            if self.wake_slot is not None:
+                if target[1] != self.wake_slot:
+                    self.send(self.wake_slot, target[1])
+            elif self.choosing == cards.KING and self.may_wake_rose():
+                self.wake_slot = target[1]
+            else:
+                self.send(target[1])
+        elif target[0] == layout.PLAYER_QUEEN and target[1:] in self.client.awake_queens():
+            self.send(target[1:])
+
+    def send(self, target=None, bonus=None):
+        self.client.play(self.selection, target, bonus)
+        self.selection = []
+        self.choosing = None
+        self.wake_slot = None
+
+
+async def play_window(host, port, table, name):
+    pygame.init()
+    pygame.display.set_caption('Sleeping Queens - {}'.format(table))
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    client = GameClient()
+    await client.connect(host, port, table, name)
+    print('Waiting for the table to fill')
+    try:
+        while not client.started:
+            await client.receive()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        print('Lost the connection to the server')
+        return
+
+    window = TableWindow(screen, client)
+    receiving = asyncio.ensure_future(client.receive())
+    window.draw()
+    while True:
+        redraw = False
+        for event in pygame.event.get():
+            if event.type == QUIT:
+                if receiving is not None:
+                    receiving.cancel()
+                await client.close()
+                return
+            elif event.type == MOUSEBUTTONUP:
+                window.click(event.pos)
+                redraw = True
+        if receiving is not None and receiving.done():
+            try:
+                receiving.result()
+                receiving = asyncio.ensure_future(client.receive())
+            except (asyncio.IncompleteReadError, ConnectionError):
+                # the window stays open on the last view of the table, saying the server has gone
+                window.disconnected = True
+                receiving = None
+            redraw = True
+        if redraw:
+            window.draw()
+        await asyncio.sleep(1 / 60)
+
+
+def parse_address(text):
+    host, port = text.rsplit(':', 1)
+    return host, int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play at a Sleeping Queens server, or load one with scripted players')
+    parser.add_argument('--connect', type=parse_address, default=None, help='HOST:PORT of a running server.py')
+    parser.add_argument('--table', default=None, help='play this table in a window instead of running scripted players')
+    parser.add_argument('--name', default='Player')
+    parser.add_argument('--tables', type=int, default=100, help='tables played at once by scripted players')
+    parser.add_argument('--players', type=int, default=4, choices=range(2, 5), help='players at each table')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.table:
+        host, port = args.connect or ('127.0.0.1', 8765)
+        asyncio.run(play_window(host, port, args.table, args.name))
+        pygame.quit()
+    else:
+        asyncio.run(load_test(args.tables, args.players, args.seed, args.connect))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,431 @@
+"""Solves endgames exactly when every card is known, as after a replay or in a simulation.
+
+With every hand, the order of the deck and the game's random generator known there is nothing left to
+chance, even a reshuffle comes out the same every time, so the solver is a plain minimax search with
+alpha-beta. With more than two players it is paranoid: the player to solve for against everyone else.
+Positions are Zobrist hashed into a transposition table of bounded size, which replaces entries by depth
+or by least recent use, and the search deepens a turn at a time until it proves a win or a loss:
+
+    python simulate.py --games 100 --policies greedy random --log games.sqlog
+    python endgame.py --logs games.sqlog --queens-left 1 --time-limit 1
+"""
+import argparse
+import csv
+import random
+import statistics
+import time
+import weakref
+from collections import OrderedDict, namedtuple
+import gamelog
+import rules
+from cards import FULL_DECK, KINDS, VALUES, NUMBER, KING, JESTER, KNIGHT, POTION, ROSE, QUEENS
+
+# scores are from the point of view of the player solved for, a win in fewer turns scores higher
+WIN = 1000
+UNKNOWN = 0
+EXACT, LOWER, UPPER = range(3)
+REPLACEMENTS = ('depth', 'lru')
+DEFAULT_ENTRIES = 1 << 18
+DEFAULT_DEPTH = 40
+# the most cards a turn can draw: a whole hand played and a defence card replaced
+MAX_DRAWS = rules.CARDS_PER_PLAYER + 1
+
+# all kings are the same card as far as the game goes, as are the number cards of the same value
+CARD_CLASSES = [VALUES[card] if KINDS[card] == NUMBER else 10 + KINDS[card] for card in range(len(KINDS))]
+NUM_CLASSES = max(CARD_CLASSES) + 1
+# only a king, a jester or a knight can end the game, anything else just changes the cards
+DECIDING_CLASSES = {10 + KING, 10 + JESTER, 10 + KNIGHT}
+MAX_PLAYERS = 4
+EMPTY_SLOT = len(QUEENS)
+
+_zobrist_rng = random.Random(0x5157)
+
+
+def _zobrist_keys(*shape):
+    if len(shape) == 1:
+        return [_zobrist_rng.getrandbits(64) for index in range(shape[0])]
+    return [_zobrist_keys(*shape[1:]) for index in range(shape[0])]
+
+
+# a random 64 bit key for each thing that can be somewhere, a position's hash is all of its keys xored
+HAND_KEYS = _zobrist_keys(MAX_PLAYERS, rules.CARDS_PER_PLAYER, NUM_CLASSES)
+DECK_KEYS = _zobrist_keys(len(FULL_DECK), NUM_CLASSES)
+DISCARD_KEYS = _zobrist_keys(len(FULL_DECK), NUM_CLASSES)
+SLEEPING_KEYS = _zobrist_keys(len(QUEENS), len(QUEENS) + 1)
+QUEEN_KEYS = _zobrist_keys(MAX_PLAYERS, rules.QUEENS_TO_WIN, len(QUEENS))
+TURN_KEYS = _zobrist_keys(MAX_PLAYERS)
+# scores are for the player solved for, so the same position solved for another player is another entry
+SOLVED_FOR_KEYS = _zobrist_keys(MAX_PLAYERS)
+
+# wins is whether the player solved for can force a win, None when that wasn't proved within the limits
+Solution = namedtuple('Solution', ['wins', 'turns', 'move', 'depth', 'nodes', 'seconds'])
+
+
+def position_hash(state, rng_key=0):
+    """The Zobrist hash of everything about a position that the rest of the game depends on.
+
+    Hands are hashed as sorted card classes, since where a card sits in a hand changes nothing. rng_key
+    stands for the state of the game's generator, which decides how any reshuffle to come turns out.
+    """
+    key = TURN_KEYS[state.player_turn] ^ rng_key
+    for player_index, player in enumerate(state.players):
+        hand_keys = HAND_KEYS[player_index]
+        for position, card_class in enumerate(sorted(CARD_CLASSES[card] for card in player.cards)):
+            key ^= hand_keys[position][card_class]
+        queen_keys = QUEEN_KEYS[player_index]
+        for position, queen in enumerate(player.queens):
+            key ^= queen_keys[position][queen]
+    for position, card in enumerate(state.deck.cards):
+        key ^= DECK_KEYS[position][CARD_CLASSES[card]]
+    for position, card in enumerate(state.deck.discards):
+        key ^= DISCARD_KEYS[position][CARD_CLASSES[card]]
+    for slot, queen in enumerate(state.sleeping_queens):
+        key ^= SLEEPING_KEYS[slot][EMPTY_SLOT if queen is None else queen]
+    return key
+
+
+def endgame_moves(state):
+    """Every distinct move for the current player as (key, play() arguments).
+
+    Plays of the same card classes lead to the same position, so only one of them is tried. The key
+    names the move whatever order the hand is in, so a move from the transposition table can be found again.
+    """
+    player_index = state.player_turn
+    cards = state.current_player.cards
+    sleeping_slots = state.sleeping_slots()
+    moves = []
+    seen = set()
+    for card_indexes in rules.legal_plays(cards):
+        played = tuple(sorted(CARD_CLASSES[cards[card_index]] for card_index in card_indexes))
+        kind = KINDS[cards[card_indexes[0]]]
+        if kind == KING:
+            targets = []
+            for slot in sleeping_slots:
+                # waking the rose queen wakes another, unless it is the last or she is the winning queen
+                if (state.sleeping_queens[slot] == ROSE and len(sleeping_slots) > 1 and
+                        len(state.players[player_index].queens) + 1 < rules.QUEENS_TO_WIN):
+                    targets.extend((slot, bonus) for bonus in sleeping_slots if bonus != slot)
+                else:
+                    targets.append((slot, None))
+        elif kind == JESTER:
+            targets = [(slot, None) for slot in sleeping_slots]
+        elif kind in (KNIGHT, POTION):
+            targets = [(target, None) for target in state.awake_queens(exclude_player=player_index)] or [(None, None)]
+        else:
+            targets = [(None, None)]
+        for target, bonus in targets:
+            key = (played, target, bonus)
+            if key not in seen:
+                seen.add(key)
+                moves.append((key, (card_indexes, target, bonus)))
+    return moves
+
+
+def queens_gained(state, key):
+    # try the moves most likely to decide the game first, they make for the quickest cutoffs
+    played, target, bonus = key
+    if bonus is not None:
+        return 3
+    return 2 if target is not None else -len(played)
+
+
+class TranspositionTable:
+    """Search results by position hash, holding at most max_entries of them.
+
+    'depth' keeps a fixed array of entries indexed by hash and only lets a new result replace one searched
+    at least as deep, so the expensive results near the root survive. 'lru' drops the least recently used.
+    """
+
+    def __init__(self, max_entries=DEFAULT_ENTRIES, replacement='depth'):
+        if replacement not in REPLACEMENTS:
+            raise ValueError('Unknown replacement {}, expected one of {}'.format(replacement, ', '.join(REPLACEMENTS)))
+        if max_entries < 1:
+            raise ValueError('A transposition table needs room for at least one entry, not {}'.format(max_entries))
+        self.replacement = replacement
+        self.max_entries = max_entries
+        if replacement == 'depth':
+            # a power of two so the slot is just the low bits of the hash
+            self.size = 1 << (max_entries.bit_length() - 1)
+            self.slots = [None] * self.size
+        else:
+            self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.replaced = 0
+
+    def get(self, key):
+        """The (depth, flag, score, move key) stored for the position, or None."""
+        if self.replacement == 'depth':
+            entry = self.slots[key & (self.size - 1)]
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry[1:]
+        else:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        if self.replacement == 'depth':
+            slot = key & (self.size - 1)
+            entry = self.slots[slot]
+            if entry is None or entry[0] == key or depth >= entry[1]:
+                if entry is not None and entry[0] != key:
+                    self.replaced += 1
+                self.slots[slot] = (key, depth, flag, score, move)
+        else:
+            self.entries[key] = (depth, flag, score, move)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.replaced += 1
+
+    def __len__(self):
+        if self.replacement == 'depth':
+            return sum(entry is not None for entry in self.slots)
+        return len(self.entries)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'replaced': self.replaced, 'entries': len(self)}
+
+
+class EndgameSolver:
+    """Works out who wins a position with best play and the move that gets there.
+
+    The table is kept between solves, so solving the positions of one game in order reuses earlier work.
+    """
+
+    def __init__(self, table=None, max_depth=DEFAULT_DEPTH, time_limit=None):
+        self.table = TranspositionTable() if table is None else table
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.nodes = 0
+        self.player = None
+        self.deadline = None
+        self.rng_keys = weakref.WeakKeyDictionary()
+
+    def solve(self, state, player=None):
+        """Solve for player, by default the player to move. With more than two players, a player who can't
+        force a win is one the others can stop between them.
+        """
+        self.player = state.player_turn if player is None else player
+        if state.game_over:
+            return Solution(state.winner == self.player, 0, None, 0, 0, 0.0)
+        start_time = time.perf_counter()
+        # searched on a copy with its own generator, so nothing the caller does to theirs goes unnoticed
+        state = state.copy(history=False)
+        self.deadline = None if self.time_limit is None else start_time + self.time_limit
+        self.nodes = 0
+        score = UNKNOWN
+        depth = 0
+        move = None
+        while score == UNKNOWN and depth < self.max_depth and not self.out_of_time():
+            depth += 1
+            score = self.search(state, depth, -WIN, WIN, 0)
+            if self.out_of_time():
+                # a search cut short proves nothing
+                score = UNKNOWN
+                break
+            entry = self.table.get(self.position_hash(state))
+            if entry is not None:
+                move = self.find_move(state, entry[3])
+
+        wins = None if score == UNKNOWN else score > 0
+        turns = None if score == UNKNOWN else WIN - abs(score)
+        return Solution(wins, turns, move, depth, self.nodes, time.perf_counter() - start_time)
+
+    def position_hash(self, state):
+        # a search only ever changes a generator in the move that copied it, so its hash is worked out once
+        rng_key = self.rng_keys.get(state.rng)
+        if rng_key is None:
+            rng_key = self.rng_keys[state.rng] = hash(state.rng.getstate()) & 0xffffffffffffffff
+        return position_hash(state, rng_key) ^ SOLVED_FOR_KEYS[self.player]
+
+    def find_move(self, state, move_key):
+        for key, args in endgame_moves(state):
+            if key == move_key:
+                return args
+        return None
+
+    def out_of_time(self):
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
+    def score(self, state, ply):
+        return WIN - ply if state.winner == self.player else -(WIN - ply)
+
+    def search(self, state, depth, alpha, beta, ply):
+        self.nodes += 1
+        if state.game_over:
+            return self.score(state, ply)
+        if depth == 0:
+            return UNKNOWN
+        # nothing from here can win sooner than next turn or lose later than it, so once a quicker win has
+        # been found elsewhere the window is empty and the position needn't be searched at all
+        alpha = max(alpha, -(WIN - ply - 1))
+        beta = min(beta, WIN - ply - 1)
+        if alpha >= beta:
+            return alpha
+
+        key = self.position_hash(state)
+        entry = self.table.get(key)
+        best_key = None
+        if entry is not None:
+            entry_depth, flag, entry_score, best_key = entry
+            # a proven win or loss holds however deep the search, the table keeps them relative to the position
+            if entry_depth >= depth or (flag == EXACT and entry_score != UNKNOWN):
+                entry_score = self.from_table(entry_score, ply)
+                if flag == EXACT:
+                    return entry_score
+                elif flag == LOWER:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+
+        moves = endgame_moves(state)
+        moves.sort(key=lambda move: (move[0] != best_key, -queens_gained(state, move[0])))
+        maximising = state.player_turn == self.player
+        original_alpha, original_beta = alpha, beta
+        best = -WIN - 1 if maximising else WIN + 1
+        best_key = None
+        # the generator is only drawn from at a reshuffle, so until one could happen the copies can share it
+        rng = state.rng if len(state.deck) > MAX_DRAWS else None
+        for move_key, args in moves:
+            if depth == 1 and move_key[0][0] not in DECIDING_CLASSES:
+                # on the last turn searched a move that can't end the game scores what the search would have
+                self.nodes += 1
+                score = UNKNOWN
+            else:
+                child = state.copy(rng, history=False)
+                child.play(*args)
+                score = self.search(child, depth - 1, alpha, beta, ply + 1)
+            if maximising and score > best:
+                best, best_key = score, move_key
+                alpha = max(alpha, score)
+            elif not maximising and score < best:
+                best, best_key = score, move_key
+                beta = min(beta, score)
+            if alpha >= beta or self.out_of_time():
+                break
+
+        if best <= original_alpha:
+            flag = UPPER
+        elif best >= original_beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if not self.out_of_time():
+            self.table.store(key, depth, flag, self.to_table(best, ply), best_key)
+        return best
+
+    @staticmethod
+    def to_table(score, ply):
+        # wins and losses are stored as turns from the position, not from the root
+        if score > 0:
+            return score + ply
+        elif score < 0:
+            return score - ply
+        return score
+
+    @staticmethod
+    def from_table(score, ply):
+        if score > 0:
+            return score - ply
+        elif score < 0:
+            return score + ply
+        return score
+
+
+def queens_left(state):
+    """How many more queens it would take to end the game: either someone reaching QUEENS_TO_WIN or the last
+    queen being woken."""
+    most_queens = max(len(player.queens) for player in state.players)
+    return min(rules.QUEENS_TO_WIN - most_queens, len(state.sleeping_slots()))
+
+
+def solve_log(solver, log, endgame_queens, writer=None):
+    """Solve every position of a logged game from the first within endgame_queens queens of the end.
+
+    Returns the solutions and, for each position where the player to move could force a win, whether the
+    move they played kept it, where that could be proved.
+    """
+    replayer = gamelog.Replayer(log)
+    state = replayer.seek(0)
+    move_number = 0
+    while move_number < len(log) and queens_left(state) > endgame_queens:
+        state.play(*log.move(move_number))
+        move_number += 1
+
+    solutions = []
+    kept = []
+    for move_number in range(move_number, len(log)):
+        solution = solver.solve(state)
+        solutions.append(solution)
+        player = state.player_turn
+        played = log.move(move_number)
+        state.play(*played)
+        if solution.wins:
+            after = solver.solve(state, player).wins
+            if after is not None:
+                kept.append(after)
+        if writer:
+            writer.writerow([log.seed, move_number, player, solution.wins, solution.turns, solution.move, played,
+                             '{:.4f}'.format(solution.seconds)])
+    return solutions, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve the endgames of logged games exactly and check the moves played')
+    parser.add_argument('--logs', nargs='+', required=True, help='log archives, e.g. from simulate.py --log')
+    parser.add_argument('--queens-left', type=int, default=1,
+                        help='solve from when the game could end with this many more queens woken or taken')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help='most turns to search ahead')
+    parser.add_argument('--time-limit', type=float, default=1.0,
+                        help='seconds to give each position before leaving it unsolved, 0 for no limit')
+    parser.add_argument('--entries', type=int, default=DEFAULT_ENTRIES, help='transposition table entries')
+    parser.add_argument('--replacement', default='depth', choices=REPLACEMENTS)
+    parser.add_argument('--labels', default=None, help='CSV file to write each position\'s solution to')
+    args = parser.parse_args()
+
+    solver = EndgameSolver(TranspositionTable(args.entries, args.replacement), args.depth, args.time_limit or None)
+    labels_file = open(args.labels, 'w', newline='') if args.labels else None
+    writer = None
+    if labels_file:
+        writer = csv.writer(labels_file)
+        writer.writerow(['seed', 'move', 'player', 'wins', 'turns', 'best_move', 'played', 'seconds'])
+
+    solutions = []
+    kept = []
+    for path in args.logs:
+        with open(path, 'rb') as log_file:
+            data = log_file.read()
+        for log in gamelog.read_logs(data):
+            log_solutions, log_kept = solve_log(solver, log, args.queens_left, writer)
+            solutions.extend(log_solutions)
+            kept.extend(log_kept)
+    if labels_file:
+        labels_file.close()
+
+    if not solutions:
+        print('No positions within {} queens of the end'.format(args.queens_left))
+        return
+    seconds = sorted(solution.seconds for solution in solutions)
+    proved = [solution for solution in solutions if solution.wins is not None]
+    print('{} positions, {:.1%} solved'.format(len(solutions), len(proved) / len(solutions)))
+    print('Seconds per position: median {:.4f}, p90 {:.4f}, max {:.4f}'.format(
+        statistics.median(seconds), seconds[int(0.9 * (len(seconds) - 1))], seconds[-1]))
+    print('{:.1%} of solved positions are won by the player to move'.format(
+        sum(solution.wins for solution in proved) / len(proved) if proved else 0))
+    if kept:
+        print('The move played kept a forced win {} times out of {} ({:.1%})'.format(
+            sum(kept), len(kept), sum(kept) / len(kept)))
+    print('Transposition table {}'.format(solver.table.stats()))
+
+
+if __name__ == '__main__':
+    main()
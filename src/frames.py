@@ -0,0 +1,138 @@
+from collections import deque
+import pygame
+from pygame.locals import NOEVENT
+
+TARGET_FPS = 60
+
+
+class FrameClock:
+    """Paces every loop in the game to a target frame rate without spinning on the event queue.
+
+    next_frame() sleeps until an event arrives or the next frame is due, so a table waiting for a click
+    uses next to no CPU. While animating it ticks at a steady frame time instead. A target of 0 runs
+    uncapped.
+    """
+
+    def __init__(self, fps=TARGET_FPS):
+        self.fps = fps
+        self.clock = pygame.time.Clock()
+        self.frame_deadline = 0
+
+    def frame_ms(self):
+        return int(1000 / self.fps) if self.fps else 0
+
+    def next_frame(self, animating=False):
+        if animating:
+            self.tick()
+            return pygame.event.get()
+
+        now = pygame.time.get_ticks()
+        timeout = self.frame_deadline - now
+        events = []
+        if timeout > 0:
+            event = pygame.event.wait(timeout)
+            if event.type != NOEVENT:
+                events.append(event)
+        events.extend(pygame.event.get())
+
+        now = pygame.time.get_ticks()
+        if now >= self.frame_deadline:
+            self.frame_deadline = now + self.frame_ms()
+        return events
+
+    def tick(self):
+        return self.clock.tick(self.fps)
+
+
+class Tween:
+    """One step of an animation that lasts duration seconds.
+
+    on_start runs when the tween reaches the front of its timeline, on_frame is called every frame with the
+    progress from 0 to 1 and on_done runs once it has finished.
+    """
+
+    def __init__(self, duration, on_start=None, on_frame=None, on_done=None):
+        self.duration = duration
+        self.on_start = on_start
+        self.on_frame = on_frame
+        self.on_done = on_done
+        self.started = False
+        self.frames = 0
+
+    def start(self):
+        self.started = True
+        if self.on_start:
+            self.on_start()
+
+    def frame(self, progress):
+        self.frames += 1
+        if self.on_frame:
+            self.on_frame(progress)
+
+    def finish(self):
+        if self.on_done:
+            self.on_done()
+
+
+class Timeline:
+    """Plays queued tweens one after another, advanced once per frame by the main loop.
+
+    speed scales how fast time passes for the animations, skip() finishes everything that is queued and
+    instant plays every tween in zero time, which is what automated runs want.
+    """
+
+    def __init__(self, speed=1.0, instant=False):
+        self.queue = deque()
+        self.speed = speed
+        self.instant = instant
+        self.elapsed = 0.0
+        self.last_ticks = None
+
+    def busy(self):
+        return bool(self.queue)
+
+    def add(self, tween):
+        if not self.queue:
+            self.last_ticks = pygame.time.get_ticks()
+        self.queue.append(tween)
+
+    def skip(self):
+        self.advance(float('inf'))
+
+    def update(self):
+        now = pygame.time.get_ticks()
+        if self.last_ticks is None:
+            self.last_ticks = now
+        seconds = (now - self.last_ticks) / 1000 * self.speed
+        self.last_ticks = now
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        self.elapsed += seconds
+        while self.queue:
+            tween = self.queue[0]
+            if not tween.started:
+                tween.start()
+
+            duration = 0 if self.instant else tween.duration
+            if self.elapsed < duration:
+                tween.frame(self.elapsed / duration)
+                return
+
+            tween.frame(1.0)
+            self.queue.popleft()
+            self.elapsed -= duration
+            # finishing a tween can queue up the next one
+            tween.finish()
+
+        self.elapsed = 0.0
+        self.last_ticks = None
+
+
+class HeadlessTimeline(Timeline):
+    """The timeline of a board nobody is watching, nothing is drawn and each tween is done as soon as it is added."""
+
+    def add(self, tween):
+        # only the bookkeeping a tween does once it has finished matters, e.g. a dealt card taking its place
+        if tween.on_done:
+            tween.on_done()
@@ -0,0 +1,219 @@
+import struct
+import rules
+
+MAGIC = b'SQLG'
+VERSION = 1
+# the magic number, format version, seed as a 128 bit number and the number of players, then each player's name
+# as a length byte followed by its utf-8 bytes
+HEADER = struct.Struct('<4sB16sB')
+# one move: the hand indexes in play order packed 3 bits each (stored plus one, so 0 ends the list), the two
+# bytes of the target and the rose bonus slot
+RECORD = struct.Struct('<HBBB')
+NONE = 255
+# a record with no cards closes a log, so logs can be written one after another into an archive
+END_OF_LOG = RECORD.pack(0, NONE, NONE, NONE)
+SNAPSHOT_INTERVAL = 16
+
+
+def encode_header(seed, player_names):
+    if seed is None:
+        raise ValueError('Only games started from a seed can be logged')
+
+    parts = [HEADER.pack(MAGIC, VERSION, seed.to_bytes(16, 'little'), len(player_names))]
+    for name in player_names:
+        name_bytes = name.encode('utf-8')
+        parts.append(bytes([len(name_bytes)]) + name_bytes)
+    return b''.join(parts)
+
+
+def pack_indexes(card_indexes):
+    packed_indexes = 0
+    for position, card_index in enumerate(card_indexes):
+        packed_indexes |= (card_index + 1) << (3 * position)
+    return packed_indexes
+
+
+def unpack_indexes(packed_indexes):
+    card_indexes = []
+    while packed_indexes:
+        card_indexes.append((packed_indexes & 7) - 1)
+        packed_indexes >>= 3
+    return card_indexes
+
+
+def encode_target(target):
+    # a sleeping queen slot or a (player index, queen index) pair as two bytes
+    if target is None:
+        return NONE, NONE
+    elif isinstance(target, tuple):
+        return target
+    return target, NONE
+
+
+def decode_target(target_player, target_queen):
+    if target_player == NONE:
+        return None
+    elif target_queen == NONE:
+        return target_player
+    return target_player, target_queen
+
+
+def encode_move(move):
+    target_player, target_queen = encode_target(move.target)
+    bonus = NONE if move.bonus is None else move.bonus
+    return RECORD.pack(pack_indexes(move.card_indexes), target_player, target_queen, bonus)
+
+
+def decode_move(packed_indexes, target_player, target_queen, bonus):
+    """Turn the fields of a record back into the arguments for GameState.play()."""
+    return (unpack_indexes(packed_indexes), decode_target(target_player, target_queen),
+            None if bonus == NONE else bonus)
+
+
+def dumps(state):
+    """The complete log of a game so far, closed so more logs can follow it."""
+    parts = [encode_header(state.seed, [player.name for player in state.players])]
+    parts.extend(encode_move(move) for move in state.history)
+    parts.append(END_OF_LOG)
+    return b''.join(parts)
+
+
+class GameLogWriter:
+    """Appends a game's moves to an open binary file as they are played, closing the log when the game ends.
+
+    close() ends the log of a game that was quit part way through too, so the next game appended to the same
+    archive isn't read as more of this one's moves.
+    """
+
+    def __init__(self, file, state):
+        self.file = file
+        self.moves_written = 0
+        self.finished = False
+        file.write(encode_header(state.seed, [player.name for player in state.players]))
+
+    def write_moves(self, state):
+        if self.finished:
+            return
+
+        self.file.write(b''.join(encode_move(move) for move in state.history[self.moves_written:]))
+        self.moves_written = len(state.history)
+        if state.game_over:
+            self.finish()
+        self.file.flush()
+
+    def finish(self):
+        if not self.finished:
+            self.file.write(END_OF_LOG)
+            self.finished = True
+
+    def close(self):
+        try:
+            self.finish()
+        finally:
+            self.file.close()
+
+
+class GameLog:
+    """One game read back from a log: the seed, player names and the undecoded move records.
+
+    A log that was never closed, e.g. cut off by a crash, reads up to its last whole record.
+    """
+
+    def __init__(self, data, offset=0):
+        data = memoryview(data)
+        magic, version, seed, num_players = HEADER.unpack_from(data, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a version {} game log'.format(VERSION))
+
+        self.seed = int.from_bytes(seed, 'little')
+        offset += HEADER.size
+        self.player_names = []
+        for player in range(num_players):
+            name_length = data[offset]
+            self.player_names.append(bytes(data[offset + 1:offset + 1 + name_length]).decode('utf-8'))
+            offset += 1 + name_length
+
+        records_start = offset
+        while offset + RECORD.size <= len(data) and data[offset:offset + RECORD.size] != END_OF_LOG:
+            offset += RECORD.size
+        self.records = data[records_start:offset]
+        self.records_end = offset
+        self.complete = offset + RECORD.size <= len(data)
+        # how many bytes of data this log takes up, so the next one in an archive starts straight after it
+        self.size = offset + RECORD.size if self.complete else len(data)
+
+    def __len__(self):
+        return len(self.records) // RECORD.size
+
+    def move(self, move_number):
+        return decode_move(*RECORD.unpack_from(self.records, move_number * RECORD.size))
+
+    def moves(self):
+        for record in RECORD.iter_unpack(self.records):
+            yield decode_move(*record)
+
+
+def read_logs(data):
+    """Yield every GameLog in an archive of logs written one after another."""
+    offset = 0
+    while offset < len(data):
+        log = GameLog(data, offset)
+        offset = log.size
+        yield log
+
+
+def open_archive(path):
+    """Open the archive at path to append logs to, first closing off a log a killed game left unfinished.
+
+    Without its end of log record the next game's header would be read as more of its moves, so anything
+    after its last whole record is cut off and the record written there.
+    """
+    file = open(path, 'a+b')
+    file.seek(0)
+    data = file.read()
+    offset = 0
+    while offset < len(data):
+        try:
+            log = GameLog(data, offset)
+        except (struct.error, IndexError):
+            # killed while writing a header, there is no game to keep
+            file.truncate(offset)
+            break
+        if not log.complete:
+            file.truncate(log.records_end)
+            file.write(END_OF_LOG)
+            break
+        offset = log.size
+    return file
+
+
+class Replayer:
+    """Rebuilds the game state after any move of a log.
+
+    The cards all come from the seed, so replaying is just playing the recorded hand indexes again. A copy of
+    the state is kept every snapshot_interval moves, so seeking only replays the moves after the nearest one.
+    """
+
+    def __init__(self, log, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.log = log
+        self.snapshot_interval = snapshot_interval
+        state = rules.GameState(log.player_names, log.seed)
+        state.deal()
+        # the state after 0, snapshot_interval, 2 * snapshot_interval... moves
+        self.snapshots = [state]
+
+    def seek(self, move_number):
+        """Return a new GameState as it was after the first move_number moves of the log."""
+        if not 0 <= move_number <= len(self.log):
+            raise IndexError('The log has {} moves'.format(len(self.log)))
+
+        snapshot = min(move_number // self.snapshot_interval, len(self.snapshots) - 1)
+        state = self.snapshots[snapshot].copy()
+        for played in range(snapshot * self.snapshot_interval, move_number):
+            state.play(*self.log.move(played))
+            if played + 1 == len(self.snapshots) * self.snapshot_interval:
+                self.snapshots.append(state.copy())
+        return state
+
+    def final_state(self):
+        return self.seek(len(self.log))
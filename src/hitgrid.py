@@ -0,0 +1,31 @@
+import pygame
+
+
+class HitGrid:
+    """Finds which of a set of rectangles a point is in by only looking at the grid cell under the point.
+
+    Each rectangle is filed under every cell it overlaps, so with cells about the size of a card a lookup
+    checks one or two rectangles however many are on the table. Where rectangles overlap the one added last
+    wins, as it would be drawn on top.
+    """
+
+    def __init__(self, cell_width, cell_height):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.cells = {}
+
+    def add(self, key, rect):
+        rect = pygame.Rect(rect)
+        for cell_x in range(rect.left // self.cell_width, (rect.right - 1) // self.cell_width + 1):
+            for cell_y in range(rect.top // self.cell_height, (rect.bottom - 1) // self.cell_height + 1):
+                self.cells.setdefault((cell_x, cell_y), []).append((rect, key))
+
+    def find(self, pos):
+        """Return the key of the rectangle at pos, or None."""
+        for rect, key in reversed(self.cells.get((pos[0] // self.cell_width, pos[1] // self.cell_height), ())):
+            if rect.collidepoint(pos):
+                return key
+        return None
+
+    def clear(self):
+        self.cells = {}
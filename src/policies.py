@@ -0,0 +1,67 @@
+import random
+import rules
+from cards import KING, KNIGHT, POTION, WAND, DRAGON, JESTER, KINDS
+
+
+class Policy:
+    """Chooses the moves for one seat when nobody is clicking for it.
+
+    choose() is given the game state on that player's turn and returns the arguments for GameState.play():
+    the hand indexes to play, the target and the rose bonus slot.
+    """
+
+    def __init__(self, rng=None):
+        self.rng = rng or random
+
+    def choose(self, state):
+        raise NotImplementedError
+
+    def close(self):
+        """Release anything the policy holds on to between turns, such as worker processes."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def choose_target(self, state, card):
+        kind = KINDS[card]
+        if kind in (KING, JESTER):
+            return self.rng.choice(state.sleeping_slots())
+        elif kind in (KNIGHT, POTION):
+            targets = state.awake_queens(exclude_player=state.player_turn)
+            if targets:
+                return self.rng.choice(targets)
+        return None
+
+
+class RandomPolicy(Policy):
+    def choose(self, state):
+        cards = state.current_player.cards
+        card_indexes = self.rng.choice(rules.legal_plays(cards))
+        return card_indexes, self.choose_target(state, cards[card_indexes[0]]), None
+
+
+class GreedyPolicy(Policy):
+    """Wakes or takes a queen whenever it can, otherwise throws away as many number cards as possible."""
+
+    def choose(self, state):
+        cards = state.current_player.cards
+        for kind in (KING, KNIGHT, POTION):
+            for card_index, hand_card in enumerate(cards):
+                if KINDS[hand_card] == kind:
+                    target = self.choose_target(state, hand_card)
+                    if target is not None:
+                        return (card_index,), target, None
+
+        number_plays = [card_indexes for card_indexes in rules.legal_plays(cards)
+                        if rules.is_number_card(cards[card_indexes[0]])]
+        if number_plays:
+            return max(number_plays, key=len), None, None
+
+        # keep dragons and wands back for defence as long as possible
+        for kind in (JESTER, KNIGHT, POTION, WAND, DRAGON):
+            for card_index, hand_card in enumerate(cards):
+                if KINDS[hand_card] == kind:
+                    return (card_index,), self.choose_target(state, hand_card), None
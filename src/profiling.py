@@ -0,0 +1,184 @@
+import csv
+import json
+import time
+from collections import Counter, deque
+from functools import wraps
+import pygame
+from pygame.locals import KEYDOWN, MOUSEBUTTONUP, K_F3
+
+# the Board methods timed as phases of a frame
+BOARD_PHASES = ('do_player_turn', 'handle_click', 'draw_table', 'initialise_board', 'show_player_cards')
+PERCENTILES = (50, 90, 99)
+OVERLAY_KEY = K_F3
+OVERLAY_WIDTH = 340
+# the right hand edge of each number column in the overlay
+OVERLAY_COLUMNS = (220, 280, 335)
+OVERLAY_COLOUR = (255, 255, 255)
+
+
+def percentile(ordered, percent):
+    return ordered[round(percent / 100 * (len(ordered) - 1))]
+
+
+class FrameProfiler:
+    """Opt-in timings of each phase of a frame and counts of the hottest calls.
+
+    attach() wraps the Board's phases, the display flip and update, image loads and the card class's draw_card, and
+    detach() puts them all back, so a board without a profiler runs exactly the code it always did. The
+    last window samples of each phase are kept and every trace_interval frames their percentiles are added
+    to a trace that export() writes as CSV or JSON. OVERLAY_KEY shows them on the table.
+    """
+
+    def __init__(self, window=600, trace_interval=60):
+        self.samples = {}
+        self.window = window
+        self.trace_interval = trace_interval
+        self.counters = Counter()
+        self.interval_counters = Counter()
+        self.trace = []
+        self.frames = 0
+        self.last_frame = None
+        self.start_time = time.perf_counter()
+        self.show_overlay = False
+        self.font = None
+        self.board = None
+        self.display_update = None
+        self.patched = []
+
+    def add(self, phase, seconds):
+        samples = self.samples.get(phase)
+        if samples is None:
+            samples = self.samples[phase] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def count(self, name):
+        self.counters[name] += 1
+        self.interval_counters[name] += 1
+
+    def timed(self, phase, func, counted=False):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if counted:
+                self.count(phase)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - start)
+        return wrapper
+
+    def patch(self, owner, name, replacement):
+        self.patched.append((owner, name, owner.__dict__.get(name)))
+        setattr(owner, name, replacement)
+
+    def attach(self, board, card_class):
+        self.board = board
+        self.display_update = pygame.display.update
+        for phase in BOARD_PHASES[1:]:
+            self.patch(board, phase, self.timed(phase, getattr(board, phase)))
+        self.patch(board, 'do_player_turn', self.frame(board.do_player_turn))
+        self.patch(pygame.display, 'flip', self.timed('display_flip', pygame.display.flip))
+        self.patch(pygame.display, 'update', self.timed('display_update', pygame.display.update))
+        self.patch(pygame.image, 'load', self.timed('image_load', pygame.image.load, counted=True))
+
+        draw_card = card_class.draw_card
+
+        @wraps(draw_card)
+        def counted_draw_card(card, *args):
+            self.count('draw_card')
+            return draw_card(card, *args)
+        self.patch(card_class, 'draw_card', counted_draw_card)
+
+    def detach(self):
+        while self.patched:
+            owner, name, original = self.patched.pop()
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self.board = None
+
+    def frame(self, do_player_turn):
+        # the main loop calls do_player_turn once a frame, so the time between calls is the frame time
+        @wraps(do_player_turn)
+        def wrapper(events):
+            now = time.perf_counter()
+            if self.last_frame is not None:
+                self.add('frame', now - self.last_frame)
+            self.last_frame = now
+
+            for event in events:
+                if event.type == KEYDOWN and event.key == OVERLAY_KEY:
+                    self.show_overlay = not self.show_overlay
+                    self.board.needs_redraw = True
+
+            result = do_player_turn(events)
+            elapsed = time.perf_counter() - now
+            self.add('do_player_turn', elapsed)
+            if any(event.type in (MOUSEBUTTONUP, KEYDOWN) for event in events):
+                # from the input reaching the board until the frame it changed has been drawn
+                self.add('input_latency', elapsed)
+
+            self.frames += 1
+            if self.frames % self.trace_interval == 0:
+                self.add_trace()
+            if self.show_overlay:
+                self.draw_overlay()
+            return result
+        return wrapper
+
+    def summary(self):
+        """Percentiles in milliseconds of every phase over the current window."""
+        phases = {}
+        for phase, samples in self.samples.items():
+            ordered = sorted(samples)
+            phases[phase] = {'samples': len(ordered), 'max_ms': ordered[-1] * 1000}
+            for percent in PERCENTILES:
+                phases[phase]['p{}_ms'.format(percent)] = percentile(ordered, percent) * 1000
+        return phases
+
+    def add_trace(self):
+        elapsed = time.perf_counter() - self.start_time
+        for phase, stats in sorted(self.summary().items()):
+            self.trace.append(dict(stats, frame=self.frames, time=elapsed, name=phase))
+        for name, calls in sorted(self.interval_counters.items()):
+            self.trace.append({'frame': self.frames, 'time': elapsed, 'name': name, 'calls': calls})
+        self.interval_counters.clear()
+
+    def export(self, path):
+        """Write the trace to path, as JSON if it ends in .json and CSV otherwise."""
+        if path.endswith('.json'):
+            with open(path, 'w') as trace_file:
+                json.dump({'trace': self.trace, 'totals': self.counters}, trace_file, indent=1)
+            return
+
+        fields = ['frame', 'time', 'name', 'samples', 'calls', 'max_ms'] + ['p{}_ms'.format(p) for p in PERCENTILES]
+        with open(path, 'w', newline='') as trace_file:
+            writer = csv.DictWriter(trace_file, fields)
+            writer.writeheader()
+            writer.writerows(self.trace)
+
+    def draw_overlay(self):
+        if self.font is None:
+            self.font = pygame.font.Font(None, 22)
+
+        rows = [('phase (ms)', 'p50', 'p99', 'max')]
+        for phase, stats in sorted(self.summary().items()):
+            rows.append((phase, '{:.2f}'.format(stats['p50_ms']), '{:.2f}'.format(stats['p99_ms']),
+                         '{:.2f}'.format(stats['max_ms'])))
+        rows.extend((name, '', '', str(calls)) for name, calls in sorted(self.counters.items()))
+
+        line_height = self.font.get_linesize()
+        overlay = pygame.Surface((OVERLAY_WIDTH, line_height * len(rows) + 10))
+        overlay.fill((0, 0, 0))
+        for row_index, row in enumerate(rows):
+            y = 5 + row_index * line_height
+            overlay.blit(self.font.render(row[0], True, OVERLAY_COLOUR), (5, y))
+            for column, text in enumerate(row[1:]):
+                # numbers are right aligned in their columns
+                label = self.font.render(text, True, OVERLAY_COLOUR)
+                overlay.blit(label, (OVERLAY_COLUMNS[column] - label.get_width(), y))
+
+        self.board.screen.blit(overlay, (0, 0))
+        # the real update, so drawing the overlay isn't counted in the figures it shows
+        self.display_update(overlay.get_rect())
@@ -0,0 +1,137 @@
+"""The messages between server.py and its clients.
+
+Every message is a two byte length then a one byte type then the payload. A client joins a table by name
+and is sent its seat, then after every move an update of what it can see of the game: its own hand, whose
+turn it is, which queen slots are still full, every player's woken queens and the last cards played. The
+view is a short run of bytes with a fixed layout and an update only carries the bytes that changed since
+the last one, as (offset, value) pairs, so most turns cost a client a dozen bytes or so.
+"""
+import struct
+import gamelog
+from rules import CARDS_PER_PLAYER, QUEENS_TO_WIN, QUEENS, Move
+
+FRAME = struct.Struct('<HB')
+# client to server
+JOIN, PLAY = range(2)
+# server to client
+WELCOME, UPDATE, ERROR = range(2, 5)
+NONE = gamelog.NONE
+MAX_MESSAGE = 0xffff - 1
+
+# the fixed part of the view, the players' queens and the last play follow it
+VIEW_TURN, VIEW_GAME_OVER, VIEW_WINNER, VIEW_MOVES, VIEW_DECK, VIEW_LAST_PLAYER = range(6)
+VIEW_HAND = 6
+VIEW_SLOTS = VIEW_HAND + CARDS_PER_PLAYER
+VIEW_QUEENS = VIEW_SLOTS + len(QUEENS)
+
+
+def encode_message(kind, payload=b''):
+    if len(payload) > MAX_MESSAGE:
+        raise ValueError('Message of {} bytes is too long'.format(len(payload)))
+    return FRAME.pack(len(payload) + 1, kind) + payload
+
+
+async def read_message(reader):
+    """The next (type, payload) from a stream, raising asyncio.IncompleteReadError once it has closed."""
+    length, kind = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return kind, await reader.readexactly(length - 1)
+
+
+def encode_names(names):
+    parts = []
+    for name in names:
+        name_bytes = name.encode('utf-8')
+        parts.append(bytes([len(name_bytes)]) + name_bytes)
+    return b''.join(parts)
+
+
+def decode_names(data, count):
+    names = []
+    offset = 0
+    for name_index in range(count):
+        names.append(bytes(data[offset + 1:offset + 1 + data[offset]]).decode('utf-8'))
+        offset += 1 + data[offset]
+    return names, offset
+
+
+def encode_join(table, name):
+    return encode_message(JOIN, encode_names([table, name]))
+
+
+def decode_join(payload):
+    names, size = decode_names(payload, 2)
+    return names
+
+
+def encode_welcome(seat, names):
+    return encode_message(WELCOME, bytes([seat, len(names)]) + encode_names(names))
+
+
+def decode_welcome(payload):
+    names, size = decode_names(payload[2:], payload[1])
+    return payload[0], names
+
+
+def encode_play(card_indexes, target=None, bonus=None):
+    return encode_message(PLAY, gamelog.encode_move(Move(None, card_indexes, None, target, bonus)))
+
+
+def decode_play(payload):
+    """The arguments for GameState.play() from a PLAY payload."""
+    packed_indexes, target_player, target_queen, bonus = gamelog.RECORD.unpack(payload)
+    card_indexes, target, bonus = gamelog.decode_move(packed_indexes, target_player, target_queen, bonus)
+    # a zero field only ends the list, one with cards after it decodes as index -1
+    if not card_indexes or min(card_indexes) < 0:
+        raise ValueError('Not a valid move: bad card indexes')
+    return card_indexes, target, bonus
+
+
+def view_size(num_players):
+    # each player's woken queens, then the cards of the last play
+    return VIEW_QUEENS + QUEENS_TO_WIN * num_players + CARDS_PER_PLAYER
+
+
+def last_play_offset(num_players):
+    return VIEW_QUEENS + QUEENS_TO_WIN * num_players
+
+
+def blank_view(num_players):
+    # what both ends start from, so the first update carries the whole view
+    return bytearray([NONE]) * view_size(num_players)
+
+
+def encode_view(state, seat):
+    """What the player in seat can see of the game, laid out as described above."""
+    view = blank_view(len(state.players))
+    view[VIEW_TURN] = state.player_turn
+    view[VIEW_GAME_OVER] = state.game_over
+    view[VIEW_WINNER] = NONE if state.winner is None else state.winner
+    # only ever compared for a change, so a client can tell a move went in even if nothing it sees moved
+    view[VIEW_MOVES] = len(state.history) % 256
+    view[VIEW_DECK] = len(state.deck)
+    view[VIEW_HAND:VIEW_SLOTS] = state.players[seat].cards
+    # the sleeping queens are face down, so the slots only say whether there is a queen in them
+    view[VIEW_SLOTS:VIEW_QUEENS] = bytes(queen is not None for queen in state.sleeping_queens)
+    for player_index, player in enumerate(state.players):
+        offset = VIEW_QUEENS + QUEENS_TO_WIN * player_index
+        view[offset:offset + len(player.queens)] = player.queens
+    if state.history:
+        last_move = state.history[-1]
+        view[VIEW_LAST_PLAYER] = last_move.player
+        offset = last_play_offset(len(state.players))
+        view[offset:offset + len(last_move.cards)] = last_move.cards
+    return view
+
+
+def encode_delta(previous, view):
+    """The (offset, value) pairs of view that differ from previous."""
+    delta = bytearray()
+    for offset, (old, new) in enumerate(zip(previous, view)):
+        if old != new:
+            delta += bytes((offset, new))
+    return bytes(delta)
+
+
+def apply_delta(view, delta):
+    for offset in range(0, len(delta), 2):
+        view[delta[offset]] = delta[offset + 1]
@@ -1,23 +1,38 @@
+import argparse
 import os
-import re
 import time
 import pygame
-from random import shuffle, choice
-from pygame.locals import QUIT, KEYDOWN, K_BACKSPACE, K_RETURN, MOUSEBUTTONUP
+import rules
+import cards
+import assets
+import gamelog
+import snapshot
+import profiling
+import layout
+from mcts import MCTSPolicy
+from functools import partial
+from frames import FrameClock, Timeline, Tween, TARGET_FPS
+from layout import HAND_CARD, QUEEN_SLOT, PLAYER_QUEEN, DRAW_PILE
+from pygame.locals import QUIT, KEYDOWN, K_BACKSPACE, K_RETURN, K_SPACE, MOUSEBUTTONUP, VIDEORESIZE, RESIZABLE
 
 SCREEN_WIDTH = 1200
 SCREEN_HEIGHT = 1200
+SNAPSHOT_PATH = 'queens.snapshot'
 
 
 class Card:
-    def __init__(self):
+    """Where and how one card is drawn on the table, the card itself is just its code in card_type."""
+
+    __slots__ = ('center', 'x', 'y', 'card_type', 'image', 'width', 'height', 'highlight_colour', 'selected',
+                 'is_queen', 'queen_awake', 'moving')
+
+    def __init__(self, size=None):
         self.center = None
         self.x = None
         self.y = None
         self.card_type = None
         self.image = None
-        self.width = int(SCREEN_WIDTH / 16)
-        self.height = int(SCREEN_HEIGHT / 11)
+        self.width, self.height = size or layout.card_size((SCREEN_WIDTH, SCREEN_HEIGHT))
         self.highlight_colour = (22, 106, 22)
         self.selected = False
         self.is_queen = False
@@ -42,32 +57,15 @@ class Card:
         self.draw_card(screen, self.center, image, bg_colour)
         self.selected = False
 
-    def show_card(self, screen, image_file, bg_colour):
-        loaded_image = pygame.image.load(image_file)
-        loaded_image = pygame.transform.scale(loaded_image, (self.width, self.height))
-        self.draw_card(screen, self.center, loaded_image, bg_colour)
-        self.image = loaded_image
+    def show_card(self, screen, image, bg_colour):
+        self.draw_card(screen, self.center, image, bg_colour)
         self.selected = True
 
     def card_rect(self):
         return pygame.Rect(self.x, self.y, self.width, self.height)
 
-    def card_file(self, resource_dir):
-        if self.is_queen:
-            queen_file = os.path.join(resource_dir, 'queen-{}.jpg'.format(self.card_type))
-            return queen_file
-        else:
-            return os.path.join(resource_dir, 'card-{}.jpg'.format(self.card_type))
-
-    def is_clicked(self):
-        card_rect = self.card_rect()
-        return card_rect.collidepoint(pygame.mouse.get_pos())
-
     def is_number_card(self):
-        if re.search('^\d+$', self.card_type):
-            return True
-        else:
-            return False
+        return rules.is_number_card(self.card_type)
 
     def select(self, screen):
         self.draw_card(screen, self.center, self.image, self.highlight_colour)
@@ -86,59 +84,94 @@ class Player:
         self.name = name
 
 
+class CardMove(Tween):
+    def __init__(self, board, picture, source_coords, target_coords, on_done=None):
+        super().__init__(board.move_time, on_done=on_done)
+        self.board = board
+        self.card = Card(board.card_size)
+        self.picture = picture
+        self.source_coords = source_coords
+        self.target_coords = target_coords
+        self.background = None
+        self.previous_rect = None
+        self.start_time = None
+
+    def start(self):
+        super().start()
+        if self.board.dirty_rendering:
+            # draw the static board once and keep a copy to paint over the card's previous position
+            self.board.draw_static_board()
+            self.background = self.board.screen.copy()
+            pygame.display.update()
+        self.start_time = time.perf_counter()
+
+    def frame(self, progress):
+        super().frame(progress)
+        new_position = (round(self.source_coords[0] + progress * (self.target_coords[0] - self.source_coords[0])),
+                        round(self.source_coords[1] + progress * (self.target_coords[1] - self.source_coords[1])))
+        if self.background:
+            self.previous_rect = self.board.draw_moving_card(self.card, new_position, self.picture,
+                                                             self.background, self.previous_rect)
+        else:
+            self.board.draw_static_board()
+            self.card.draw_card(self.board.screen, new_position, self.picture, self.board.bg_colour)
+            pygame.display.update()
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.start_time
+        if elapsed:
+            self.board.animation_fps = self.frames / elapsed
+        super().finish()
+
+
 class Board:
-    def __init__(self, screen, players):
+    def __init__(self, screen, players, frame_clock=None, timeline=None, bots=None, rng=None):
         self.screen = screen
+        self.frame_clock = frame_clock or FrameClock()
+        # card moves, reveals and the winner's flashing are queued here and played out by the main loop
+        self.timeline = timeline or Timeline()
+        # how long a card takes to slide across the table, in seconds
+        self.move_time = 0.5
         self.animations = False
+        # only redraw the parts of the screen a moving card covers instead of the whole board every step
+        self.dirty_rendering = True
+        self.animation_fps = None
         self.bg_colour = (100, 100, 100)
         self.player_colour = (200, 200, 200)
         self.red = (222, 0, 0)
         self.resource_dir = os.path.join('..', 'resources')
         self.player_names = players
-        self.queens = ['heart', 'rose', 'peacock', 'ice-cream', 'dog', 'cat', 'strawberry', 'sunflower',
-                       'rainbow', 'pancake', 'cake', 'ladybird', 'starfish', 'book', 'butterfly', 'moon']
-        self.full_deck = ['1', '1', '1', '1', '2', '2', '2', '2', '3', '3', '3', '3', '4', '4', '4', '4',
-                          '5', '5', '5', '5', '6', '6', '6', '6', '7', '7', '7', '7', '8', '8', '8', '8',
-                          '9', '9', '9', '9', '10', '10', '10', '10', 'king-cookie', 'king-fire', 'king-hat',
-                          'king-tie-dye', 'king-turtle', 'king-puzzle', 'king-pasta', 'king-tool', 'king-bubble-gum',
-                          'king-chess', 'potion', 'potion', 'potion', 'potion', 'wand', 'wand', 'wand',
-                          'knight', 'knight', 'knight', 'knight', 'dragon', 'dragon', 'dragon',
-                          'jester', 'jester', 'jester', 'jester']
-        self.discard_pile = []
+        # all of the rules live in the game state, the board only draws it and turns clicks into moves
+        self.state = rules.GameState(players, rng)
         self.players = []
-        self.player_turn = 0
-        self.turn_over = False
-        self.game_over = False
-        self.cards_per_player = 5
+        # a pending choice of queen as (card type, player index), the turn ends once it has been made
+        self.choice = None
+        # the queens chosen so far this turn, recorded in the game's history when the turn ends
+        self.turn_targets = []
+        # a GameLogWriter that each finished turn is appended to
+        self.game_log = None
+        # where to save a snapshot after each turn so the game can be picked up again after a crash
+        self.snapshot_path = None
+        # seat index to the Policy that plays it, every other seat is clicked for
+        self.bots = bots or {}
+        self.needs_redraw = True
+        self.winner_shown = False
         self.queen_cards = []
         self.playable_cards = []
         self.current_selection = []
-        self.card_back = os.path.join(self.resource_dir, 'card-back.jpg')
-        self.queen_back = os.path.join(self.resource_dir, 'queen-back.jpg')
-        self.queen_back_image = pygame.image.load(self.queen_back)
-        temp_card = Card()
-        self.queen_back_image = pygame.transform.scale(self.queen_back_image, (temp_card.width, temp_card.height))
-        self.card_back_image = pygame.image.load(self.card_back)
-        self.card_back_image = pygame.transform.scale(self.card_back_image, (temp_card.width, temp_card.height))
+        self.assets = assets.shared_cache(self.resource_dir)
+        self.text = assets.shared_text_cache()
         self.center_stack = None
-        screen_border = 30
-        self.card_border = temp_card.height + 5
-        self.screen_center = screen.get_rect().center
-        screen_width = screen.get_width()
-        screen_height = screen.get_height()
-        self.player_positions = [(screen_border, self.screen_center[1]), (self.screen_center[0], screen_border),
-                                 (screen_width - screen_border, self.screen_center[1]),
-                                 (self.screen_center[0], screen_height - screen_border)]
-        self.playable_card_offsets = [(self.card_border, -2 * self.card_border),
-                                      (self.card_border, -1 * self.card_border),
-                                      (self.card_border, 0),
-                                      (self.card_border, self.card_border),
-                                      (self.card_border, self.card_border * 2)]
-        # playable card positions is a list of x,y coords which contain playable cards for the given players
-        # player queen positions is a list of x,y coords where the woken queens will be placed
-        self.playable_card_positions = []
-        self.player_queen_positions = []
-        self.sleeping_queen_positions = []
+        self.layout = None
+        self.initialise_card_positions()
+
+    @property
+    def player_turn(self):
+        return self.state.player_turn
+
+    @property
+    def game_over(self):
+        return self.state.game_over
 
     def initialise_all(self):
         self.initialise_players()
@@ -146,6 +179,48 @@ class Board:
         self.initialise_card_positions()
         self.deal_initial_cards()
         self.initialise_queens()
+        self.build_hit_grid()
+
+    def restore(self, data):
+        """Pick up a game from Board.snapshot() bytes, laying the table out again from the game state."""
+        self.state, turn = snapshot.read(data)
+        self.player_names = [player.name for player in self.state.players]
+        self.initialise_players()
+        self.initialise_card_positions()
+        for card_index, target_position in enumerate(self.playable_card_positions):
+            self.playable_cards.append(target_position)
+            self.add_hand_card(card_index, target_position)
+
+        self.initialise_queens()
+        for queen in self.queen_cards:
+            # the slots of queens that have been woken are empty
+            queen.queen_awake = queen.card_type is None
+        for player_index, player in enumerate(self.state.players):
+            for queen_index, queen_type in enumerate(player.queens):
+                queen = Card(self.card_size)
+                queen.card_type = queen_type
+                queen.is_queen = True
+                queen.queen_awake = True
+                queen.image = self.card_image(queen)
+                queen.pos_center(*self.player_queen_positions[player_index][queen_index])
+                self.players[player_index].queens.append(queen)
+        self.build_hit_grid()
+
+        if turn:
+            self.choice, card_indexes, self.turn_targets = turn
+            hand = self.players[self.player_turn].cards
+            self.current_selection = [hand[card_index] for card_index in card_indexes]
+            for card in self.current_selection:
+                card.selected = True
+        self.needs_redraw = True
+
+    def snapshot(self):
+        """The game and any turn in progress as bytes, with none of the layout, see restore()."""
+        turn = None
+        if self.choice or self.current_selection:
+            hand = self.players[self.player_turn].cards
+            turn = (self.choice, [hand.index(card) for card in self.current_selection], self.turn_targets)
+        return snapshot.dumps(self.state, turn=turn)
 
     def initialise_players(self):
         for player_index, player_name in enumerate(self.player_names):
@@ -153,27 +228,25 @@ class Board:
             self.players.append(player)
 
     def highlight_winner(self):
-        winner = self.players[self.player_turn]
+        winner = self.players[self.state.winner]
         winner_text = '{} - Winner'.format(winner.name)
         for i in range(15):
-            self.intialise_all_cards()
-            self.draw_player_name(winner_text, self.player_turn)
-            pygame.display.flip()
-            time.sleep(0.5)
-            self.intialise_all_cards()
-            self.draw_player_name(winner_text, self.player_turn, colour=self.red)
-            pygame.display.flip()
-            time.sleep(0.5)
+            for colour in (self.player_colour, self.red):
+                self.timeline.add(Tween(0.5, on_start=partial(self.draw_winner, winner_text, colour)))
+        self.winner_shown = True
+
+    def draw_winner(self, winner_text, colour):
+        self.intialise_all_cards()
+        self.draw_player_name(winner_text, self.state.winner, colour=colour)
+        pygame.display.flip()
 
     def draw_player_name(self, player_name, player_index, colour=None):
         if not colour:
             colour = self.player_colour
 
-        font = pygame.font.Font(None, 50)
-        label = font.render(player_name, True, colour)
-        if player_index % 2 == 0:
-            rotation = (player_index + 1) * 90
-            label = pygame.transform.rotate(label, rotation)
+        # the left and right players' names run up and down the sides of the table
+        rotation = (player_index + 1) * 90 if player_index % 2 == 0 else 0
+        label = self.text.get(player_name, 50, colour, rotation)
         rect = label.get_rect()
         rect.center = self.player_positions[player_index]
         self.screen.blit(label, rect)
@@ -192,40 +265,23 @@ class Board:
         self.intialise_player_queens()
 
     def initialise_card_positions(self):
-        queen_offset = self.card_border
-        for i in range(len(self.playable_card_offsets)):
-            for player_index, player_name in enumerate(self.player_names):
-                starting_position = self.player_positions[player_index]
-                if player_index == 0:
-                    # left
-                    target_position = (starting_position[0] + self.playable_card_offsets[i][0],
-                                       starting_position[1] + self.playable_card_offsets[i][1])
-                    queen_position = (target_position[0] + queen_offset, target_position[1])
-                elif player_index == 1:
-                    # top
-                    target_position = (starting_position[0] + self.playable_card_offsets[i][1],
-                                       starting_position[1] + self.playable_card_offsets[i][0])
-                    queen_position = (target_position[0], target_position[1] + queen_offset)
-                elif player_index == 2:
-                    # right
-                    target_position = (starting_position[0] - self.playable_card_offsets[i][0],
-                                       starting_position[1] - self.playable_card_offsets[i][1])
-                    queen_position = (target_position[0] - queen_offset, target_position[1])
-                else:
-                    # bottom
-                    target_position = (starting_position[0] - self.playable_card_offsets[i][1],
-                                       starting_position[1] - self.playable_card_offsets[i][0])
-                    queen_position = (target_position[0], target_position[1] - queen_offset)
-
-                self.playable_card_positions.append(target_position)
-                if len(self.player_queen_positions) <= player_index:
-                    self.player_queen_positions.append([])
-
-                self.player_queen_positions[player_index].append(queen_position)
+        # every board with the same screen size and number of players shares one layout, worked out once
+        self.layout = layout.table_layout(self.screen.get_size(), len(self.player_names))
+        self.card_size = self.layout.card_size
+        self.card_border = self.layout.card_border
+        self.screen_center = self.layout.screen_center
+        self.player_positions = self.layout.player_positions
+        # playable card positions is a list of x,y coords which contain playable cards for the given players
+        # player queen positions is a list of x,y coords where the woken queens will be placed
+        self.playable_card_positions = self.layout.hand_positions
+        self.player_queen_positions = self.layout.player_queen_positions
+        self.queen_slot_positions = self.layout.queen_slot_positions
+        self.queen_back_image = self.assets.get('back', True, self.card_size)
+        self.card_back_image = self.assets.get('back', False, self.card_size)
 
     def initialise_player_cards(self):
         for card_pos in self.playable_cards:
-            player_card = Card()
+            player_card = Card(self.card_size)
             player_card.draw_card(self.screen, card_pos, self.card_back_image, self.bg_colour)
 
     def intialise_player_queens(self):
@@ -235,60 +291,66 @@ class Board:
                     queen.draw_card(self.screen, queen.center, queen.image, self.bg_colour)
 
     def deal_initial_cards(self):
-        shuffle(self.full_deck)
-        num_cards = len(self.full_deck)
+        self.state.deal()
         for card_index, target_position in enumerate(self.playable_card_positions):
+            card = self.add_hand_card(card_index, target_position)
             if self.animations:
-                self.move_card_to_destination(self.card_back, self.screen_center, target_position)
-            self.playable_cards.append(target_position)
-            target_player = self.players[card_index % len(self.players)]
-            target_card = Card()
-            target_card.card_type = self.full_deck[card_index]
-            self.full_deck.pop()
-            target_card.pos_center(target_position[0], target_position[1])
-            target_player.cards.append(target_card)
-            self.initialise_board()
-
-        assert len(self.full_deck) == num_cards - len(self.players) * self.cards_per_player
+                # the card is left out of the static board until it lands
+                card.moving = True
+                self.move_card_to_destination(self.card_back_image, self.screen_center, target_position,
+                                              on_done=partial(self.card_dealt, card, target_position))
+            else:
+                self.playable_cards.append(target_position)
+
+    def card_dealt(self, card, position):
+        card.moving = False
+        self.playable_cards.append(position)
+
+    def add_hand_card(self, card_index, target_position):
+        # hands are dealt round the table one card at a time
+        player_index = card_index % len(self.players)
+        target_player = self.players[player_index]
+        target_card = Card(self.card_size)
+        target_card.card_type = self.state.players[player_index].cards[len(target_player.cards)]
+        target_card.pos_center(target_position[0], target_position[1])
+        target_player.cards.append(target_card)
+        return target_card
 
     def initialise_queens(self):
-        queen_vert_gap = int(float(self.screen.get_height()) / 9)
-        queen_horiz_gap = 70
         self.queen_cards = []
-        shuffle(self.queens)
-        queen_index = 0
-        for queen_row in range(4):
-            for queen_col in range(2):
-                for queen_side in [-1, 1]:
-                    queen_card = Card()
-
-                    queen_centre_y = self.screen_center[1] + (queen_row - 1.5) * queen_vert_gap
-                    queen_centre_x = self.screen_center[0] + ((queen_col + 1) * queen_card.height) * queen_side
-
-                    queen_card.draw_card(self.screen, (queen_centre_x, queen_centre_y), self.queen_back_image,
-                                         self.bg_colour)
-                    queen_card.card_type = self.queens[queen_index]
-                    queen_card.is_queen = True
-                    self.queen_cards.append(queen_card)
-                    queen_index += 1
-
-    def select_queen(self):
-        target_queen = None
-        for queen in self.queen_cards:
-            if queen.is_clicked():
-                target_queen = queen
-                break
-
-        if target_queen:
-            self.deselect_queens()
-            queen_name = self.queens[self.queen_cards.index(target_queen)]
-            chosen_queen = os.path.join(self.resource_dir, 'queen-{}.jpg'.format(queen_name))
-            queen_image = pygame.image.load(chosen_queen)
-            queen_image = pygame.transform.scale(queen_image, (target_queen.width, target_queen.height))
-            target_queen.draw_card(self.screen, target_queen.center, queen_image, self.bg_colour)
-            target_queen.select(self.screen)
-        else:
-            self.deselect_queens()
+        for queen_index, position in enumerate(self.queen_slot_positions):
+            queen_card = Card(self.card_size)
+            queen_card.draw_card(self.screen, position, self.queen_back_image, self.bg_colour)
+            queen_card.card_type = self.state.sleeping_queens[queen_index]
+            queen_card.is_queen = True
+            self.queen_cards.append(queen_card)
+
+    def build_hit_grid(self):
+        # the layout is fixed for the whole game, cards only ever move from one of these places to another
+        self.hit_grid = self.layout.hit_grid
+
+    def resize(self, screen):
+        """Lay the table out again for a new window size, picking up where every card is from the game."""
+        # cards still on their way would land in the old layout
+        self.timeline.skip()
+        self.screen = screen
+        self.initialise_card_positions()
+        self.build_hit_grid()
+        self.playable_cards = list(self.playable_card_positions[:len(self.playable_cards)])
+        for player_index, player in enumerate(self.players):
+            for card_index, card in enumerate(player.cards):
+                card.width, card.height = self.card_size
+                card.pos_center(*self.playable_card_positions[card_index * len(self.players) + player_index])
+            for queen_index, queen in enumerate(player.queens):
+                queen.width, queen.height = self.card_size
+                queen.image = self.card_image(queen)
+                queen.pos_center(*self.player_queen_positions[player_index][queen_index])
+        for slot, queen in enumerate(self.queen_cards):
+            # an empty slot still points at the queen that was woken from it, wherever she is now
+            if self.state.sleeping_queens[slot] is not None:
+                queen.width, queen.height = self.card_size
+                queen.pos_center(*self.queen_slot_positions[slot])
+        self.needs_redraw = True
 
     def deselect_queens(self):
         for queen in self.queen_cards:
@@ -302,57 +364,58 @@ class Board:
                 if not queen.queen_awake:
                     queen.select(self.screen)
         else:
-            for player in self.players:
-                if player != exclude_player:
-                    for queen in player.queens:
-                        if queen.card_type != 'strawberry':
-                            queen.select(self.screen)
+            for player_index, queen_index in self.state.awake_queens(exclude_player=exclude_player):
+                self.players[player_index].queens[queen_index].select(self.screen)
 
     def reorder_queens(self, source_player):
         player_index = self.players.index(source_player)
         for queen_index, queen in enumerate(source_player.queens):
-            if queen.center != self.player_queen_positions[player_index][queen_index]:
-                queen_destination = self.player_queen_positions[player_index][queen_index]
-                queen.center = queen_destination
-                queen.moving = True
-                self.move_card_to_destination(queen.card_file(self.resource_dir), queen.center,
-                                              queen_destination)
-                queen.moving = False
-
-    def move_card_to_destination(self, source_picture, source_coords, target_coords):
-        # create a new image at the source coords
-        temp_card = Card()
-
-        picture = pygame.image.load(source_picture)
-        picture = pygame.transform.scale(picture, (temp_card.width, temp_card.height))
-
-        temp_card.draw_card(self.screen, source_coords, picture, self.bg_colour)
-
-        # move it to the target
-        num_moves = 100
-        x_distance = source_coords[0] - target_coords[0]
-        y_distance = source_coords[1] - target_coords[1]
-        x_increment = float(x_distance) / float(num_moves)
-        y_increment = float(y_distance) / float(num_moves)
-
-        for i in range(num_moves + 1):
-            self.screen.fill(self.bg_colour)
-            new_position = (round(source_coords[0] - (i * x_increment)), round(source_coords[1] - (i * y_increment)))
-            self.initialise_board()
-            temp_card.draw_card(self.screen, new_position, picture, self.bg_colour)
-            pygame.display.update()
-            pygame.time.delay(1)
+            queen_destination = self.player_queen_positions[player_index][queen_index]
+            if queen.center != queen_destination:
+                self.move_queen(queen, queen_destination)
+
+    def card_image(self, card):
+        card_name = cards.card_name(card.card_type, card.is_queen)
+        return self.assets.get(card_name, card.is_queen, (card.width, card.height))
+
+    def move_card_to_destination(self, picture, source_coords, target_coords, on_done=None):
+        self.timeline.add(CardMove(self, picture, source_coords, target_coords, on_done=on_done))
+
+    def move_queen(self, queen, queen_destination):
+        # the queen is left out of the static board until it lands
+        queen.moving = True
+        source_coords = queen.center
+        queen.center = queen_destination
+        self.move_card_to_destination(self.card_image(queen), source_coords, queen_destination,
+                                      on_done=partial(setattr, queen, 'moving', False))
+
+    def reveal_card(self, picture, coords, duration):
+        self.timeline.add(Tween(duration, on_start=partial(self.draw_revealed_card, picture, coords)))
+
+    def draw_revealed_card(self, picture, coords):
+        Card(self.card_size).draw_card(self.screen, coords, picture, self.bg_colour)
+        pygame.display.flip()
+
+    def draw_moving_card(self, card, position, picture, background, previous_rect):
+        # the card's border is drawn 5 pixels outside the image
+        card_rect = picture.get_rect()
+        card_rect.center = position
+        card_rect.inflate_ip(10, 10)
+        dirty_rects = [card_rect]
+        if previous_rect:
+            self.screen.blit(background, previous_rect, previous_rect)
+            dirty_rects.append(previous_rect)
+
+        card.draw_card(self.screen, position, picture, self.bg_colour)
+        pygame.display.update(dirty_rects)
+        return card_rect
 
     def show_player_cards(self):
         current_player = self.players[self.player_turn]
         for card in current_player.cards:
-            target_card_file = card.card_file(self.resource_dir)
-            if not os.path.isfile(target_card_file):
-                target_card_file = os.path.join(self.resource_dir, 'card-1.jpg')
-
-            target_card = pygame.image.load(target_card_file)
-            target_card = pygame.transform.scale(target_card, (card.width, card.height))
-            card.draw_card(self.screen, card.center, target_card, self.bg_colour)
+            if card.moving:
+                continue
+            card.draw_card(self.screen, card.center, self.card_image(card), self.bg_colour)
             if card.selected:
                 card.select(self.screen)
 
@@ -361,58 +424,26 @@ class Board:
         for card in current_player.cards:
             card.hide_card(self.screen, self.card_back_image, self.bg_colour)
 
-    def select_player_card(self):
-        current_player = self.players[self.player_turn]
-        for card in current_player.cards:
-            if card.is_clicked():
-                if card.selected:
-                    card.deselect(self.screen, self.bg_colour)
-                    self.current_selection.remove(card)
-                    return True
-                else:
-                    card.select(self.screen)
-                    self.current_selection.append(card)
-                    return True
+    def select_player_card(self, target):
+        if not target or target[0] != HAND_CARD or target[1] != self.player_turn:
+            return False
 
-        return False
+        card = self.players[self.player_turn].cards[target[2]]
+        if card.selected:
+            card.deselect(self.screen, self.bg_colour)
+            self.current_selection.remove(card)
+        else:
+            card.select(self.screen)
+            self.current_selection.append(card)
+        return True
 
     def draw_center_card(self):
-        center_card = Card()
+        center_card = Card(self.card_size)
         center_card.draw_card(self.screen, self.screen_center, self.card_back_image, self.bg_colour)
         return center_card
 
-    def is_center_card_selected(self):
-        if self.center_stack.is_clicked():
-            return True
-        else:
-            return False
-
-    @staticmethod
-    def valid_sum(number_choices):
-        sorted_choices = [int(x) for x in sorted(number_choices)]
-        if sorted_choices[-1] == sum(sorted_choices[:-1]):
-            return True
-        else:
-            print(sorted_choices)
-            print('{} is not {}'.format(sorted_choices[-1], sum(sorted_choices[:-1])))
-            return False
-
     def valid_move(self):
-        if len(self.current_selection) == 1:
-            # any single card can be played
-            return True
-        else:
-            # multiple cards must all be numbers, and either all the same or a sum
-            all_numbers = True
-            valid_numbers = []
-            for card in self.current_selection:
-                if not card.is_number_card():
-                    all_numbers = False
-                    break
-
-                valid_numbers.append(card.card_type)
-
-            return all_numbers and (len(list(set(valid_numbers))) == 1 or self.valid_sum(valid_numbers))
+        return rules.is_valid_play([card.card_type for card in self.current_selection])
 
     def action_card_selected(self):
         for card in self.current_selection:
@@ -421,241 +452,269 @@ class Board:
 
         return False
 
-    def check_for_dragon(self, player):
-        return self.check_for_card('dragon', player.cards)
-
-    def check_for_wand(self, player):
-        return self.check_for_card('wand', player.cards)
+    def discard_defence_card(self, player, card_index):
+        defence_card = player.cards[card_index]
+        defence_image = self.card_image(defence_card)
+        self.reveal_card(defence_image, defence_card.center, 2)
+        self.move_card_to_destination(defence_image, defence_card.center, self.screen_center)
+
+    def sync_player_cards(self, player_index):
+        # the game state replaces played cards in place, so each hand slot keeps its position on the table
+        for card, card_type in zip(self.players[player_index].cards, self.state.players[player_index].cards):
+            if card.card_type != card_type:
+                card.card_type = card_type
+                card.selected = False
+
+    def wake_queen(self, player_index, queen):
+        current_player = self.players[player_index]
+        self.state.wake_queen(player_index, self.queen_cards.index(queen))
+
+        # show the queen then move it to the next open queen slot
+        queen_image = self.card_image(queen)
+        self.reveal_card(queen_image, queen.center, 0.5)
+        queen.image = queen_image
+        queen.queen_awake = True
+        self.move_queen(queen, self.player_queen_positions[player_index][len(current_player.queens)])
+        current_player.queens.append(queen)
+
+    def steal_queen(self, target):
+        player = self.players[target[0]]
+        queen = player.queens[target[1]]
+        dragon_index = self.state.find_defence(target[0], cards.DRAGON)
+        if dragon_index is not None:
+            self.discard_defence_card(player, dragon_index)
+        self.state.steal_queen(self.player_turn, target)
+        if dragon_index is not None:
+            self.sync_player_cards(target[0])
+        else:
+            current_player = self.players[self.player_turn]
+            queen_destination = self.player_queen_positions[self.player_turn][len(current_player.queens)]
+            current_player.queens.append(queen)
+            player.queens.remove(queen)
+            self.move_queen(queen, queen_destination)
+            self.reorder_queens(player)
+
+    def put_queen_to_sleep(self, target):
+        player = self.players[target[0]]
+        queen = player.queens[target[1]]
+        wand_index = self.state.find_defence(target[0], cards.WAND)
+        if wand_index is not None:
+            self.discard_defence_card(player, wand_index)
+        self.state.put_queen_to_sleep(self.player_turn, target)
+        if wand_index is not None:
+            self.sync_player_cards(target[0])
+        else:
+            # send the queen back to the empty slot it now sleeps in
+            slot = self.state.sleeping_queens.index(queen.card_type)
+            queen.queen_awake = False
+            player.queens.remove(queen)
+            self.queen_cards[slot] = queen
+            self.move_queen(queen, self.queen_slot_positions[slot])
+            self.reorder_queens(player)
 
-    def check_for_card(self, card_type, player_cards):
-        target_cards = []
-        for card in player_cards:
-            if card.card_type == card_type:
-                target_cards.append(card)
+    def perform_action(self):
+        kind = cards.KINDS[self.current_selection[0].card_type]
 
-        random_card = None
-        if target_cards:
-            random_card = choice(target_cards)
-            random_card.show_card(self.screen, random_card.card_file(self.resource_dir), self.bg_colour)
-            pygame.display.flip()
-            time.sleep(2)
+        if kind == cards.KING:
+            self.choice = (cards.KING, self.player_turn)
+        elif kind == cards.JESTER:
+            # draw the next card and see if it is a number card
+            self.reveal_jester_card()
+        elif kind in (cards.KNIGHT, cards.POTION):
+            if self.state.awake_queens(exclude_player=self.player_turn):
+                self.choice = (kind, self.player_turn)
 
-        return random_card
+        # dragons and wands don't do anything on their own
 
-    def any_queens_awake(self):
-        queens_awake = []
-        for player in self.players:
-            for queen in player.queens:
-                queens_awake.append(queen)
+    def choose_queen(self, target):
+        kind, player_index = self.choice
+        if not target:
+            return
 
-        return queens_awake
+        if kind in (cards.KING, cards.JESTER):
+            if target[0] == QUEEN_SLOT and self.state.sleeping_queens[target[1]] is not None:
+                self.make_choice(target[1])
+        elif target[0] == PLAYER_QUEEN:
+            target_player, queen_index = target[1:]
+            queens = self.state.players[target_player].queens
+            if (target_player != player_index and queen_index < len(queens) and
+                    queens[queen_index] != cards.STRAWBERRY):
+                self.make_choice((target_player, queen_index))
+
+    def make_choice(self, target):
+        kind, player_index = self.choice
+        self.choice = None
+        self.turn_targets.append(target)
+        if kind in (cards.KING, cards.JESTER):
+            if target is None:
+                target = self.state.sleeping_slots()[0]
+            queen = self.queen_cards[target]
+            self.wake_queen(player_index, queen)
+            if kind == cards.KING and self.state.rose_bonus(player_index, queen.card_type):
+                # rose queen lets you take another queen
+                self.choice = (cards.KING, player_index)
+        elif target is not None:
+            if kind == cards.KNIGHT:
+                self.steal_queen(target)
+            else:
+                self.put_queen_to_sleep(target)
 
-    def wake_queen(self, current_player):
-        self.select_queens()
-        pygame.display.flip()
-        while True:
-            for event in pygame.event.get():
-                if event.type == MOUSEBUTTONUP:
-                    for queen in self.queen_cards:
-                        if queen.is_clicked():
-                            # mark the queen location as available
-                            self.sleeping_queen_positions.append(queen.center)
-
-                            # show the queen then move it to the next open queen slot
-                            queen_file = queen.card_file(self.resource_dir)
-                            queen.show_card(self.screen, queen_file, self.bg_colour)
-                            queen.queen_awake = True
-                            time.sleep(0.5)
-                            player_index = self.players.index(current_player)
-                            queen_destination = self.player_queen_positions[player_index][len(current_player.queens)]
-                            self.move_card_to_destination(queen_file, queen.center, queen_destination)
-                            queen.center = queen_destination
-                            current_player.queens.append(queen)
-                            pygame.display.flip()
-
-                            return queen
+        if not self.choice:
+            self.end_turn()
 
-    def perform_action(self):
-        action_card = self.current_selection[0]
+    def play_bot_turn(self, policy):
+        card_indexes, target, bonus = policy.choose(self.state)
         current_player = self.players[self.player_turn]
+        self.current_selection = [current_player.cards[card_index] for card_index in card_indexes]
+        self.play_selection()
+        targets = [target, bonus]
+        while self.choice and self.choice[1] == self.player_turn:
+            self.make_choice(targets.pop(0) if targets else None)
+
+    def reveal_jester_card(self):
+        current_player_index = self.player_turn
+        revealed, chosen_index = self.state.jester(current_player_index)
+        if chosen_index is None:
+            return
 
-        if action_card.card_type.startswith('king'):
-            chosen_queen = self.wake_queen(current_player)
+        target_card = Card(self.card_size)
+        target_card.card_type = revealed
+        self.reveal_card(self.card_image(target_card), self.screen_center, 0)
+        for i in range(current_player_index, current_player_index + cards.VALUES[revealed]):
+            self.timeline.add(Tween(1, on_start=partial(self.draw_jester_count, i)))
 
-            if chosen_queen.card_type == 'rose' and len(current_player.queens) < 5:
-                self.initialise_board()
-                self.draw_center_card()
-                self.show_player_cards()
-                # rose queen lets you take another queen
-                self.wake_queen(current_player)
-        elif action_card.card_type == 'jester':
-            # draw the next card and see if it is a number card
-            self.replace_card(current_player, action_card, jester_card=True)
-        elif action_card.card_type == 'knight':
-            if self.any_queens_awake():
-                self.select_queens(asleep=False, exclude_player=current_player)
-                pygame.display.flip()
-                while True:
-                    for event in pygame.event.get():
-                        if event.type == MOUSEBUTTONUP:
-                            for player in self.players:
-                                for queen in player.queens:
-                                    if queen.is_clicked():
-                                        dragon_card = self.check_for_dragon(player)
-                                        if dragon_card:
-                                            self.move_card_to_destination(dragon_card.card_file(self.resource_dir),
-                                                                          dragon_card.center, self.screen_center)
-                                            self.replace_card(player, dragon_card)
-                                        else:
-                                            queen_file = queen.card_file(self.resource_dir)
-                                            queen_destination = self.player_queen_positions[self.player_turn][
-                                                len(current_player.queens)]
-                                            current_player.queens.append(queen)
-                                            player.queens.remove(queen)
-                                            old_pos = queen.center
-                                            queen.center = queen_destination
-                                            queen.moving = True
-
-                                            self.move_card_to_destination(queen_file, old_pos, queen_destination)
-                                            queen.moving = False
-                                            self.reorder_queens(player)
-                                            self.initialise_board()
-                                            pygame.display.flip()
-                                        return
-        elif action_card.card_type == 'dragon':
-            # dragons don't do anything on their own
-            pass
-        elif action_card.card_type == 'potion':
-            if self.any_queens_awake():
-                self.select_queens(asleep=False, exclude_player=current_player)
-                pygame.display.flip()
-                while True:
-                    for event in pygame.event.get():
-                        if event.type == MOUSEBUTTONUP:
-                            for player in self.players:
-                                for queen in player.queens:
-                                    if queen.is_clicked():
-                                        wand_card = self.check_for_wand(player)
-                                        if wand_card:
-                                            self.move_card_to_destination(wand_card.card_file(self.resource_dir),
-                                                                          wand_card.center, self.screen_center)
-                                            self.replace_card(player, wand_card)
-                                        else:
-                                            # show the queen then move it to the next open queen slot
-                                            queen_file = queen.card_file(self.resource_dir)
-                                            queen.queen_awake = False
-                                            queen_destination = self.sleeping_queen_positions[0]
-                                            player.queens.remove(queen)
-
-                                            self.move_card_to_destination(queen_file, queen.center, queen_destination)
-                                            queen.center = queen_destination
-
-                                            self.sleeping_queen_positions.remove(queen.center)
-
-                                            self.reorder_queens(player)
-                                            self.initialise_board()
-                                            pygame.display.flip()
-                                        return
-        elif action_card.card_type == 'wand':
-            # wands don't do anything on their own
-            pass
+        # the chosen player gets to choose a queen
+        self.choice = (cards.JESTER, chosen_index)
 
-    def replace_card(self, current_player, old_card, jester_card=False):
-        target_card = Card()
-        target_card.card_type = self.full_deck[-1]
-        target_card.center = self.screen_center
-
-        if jester_card:
-            # check whether the next card is a number card
-            if target_card.is_number_card():
-                target_card.show_card(self.screen, target_card.card_file(self.resource_dir), self.bg_colour)
-                pygame.display.flip()
-                current_player_index = self.players.index(current_player)
-                for i in range(current_player_index, current_player_index + int(target_card.card_type)):
-                    previous_player = self.players[(i - 1) % len(self.players)]
-                    chosen_player = self.players[i % len(self.players)]
-                    self.draw_player_name(previous_player.name, self.players.index(previous_player))
-                    self.draw_player_name(chosen_player.name, self.players.index(chosen_player), colour=self.red)
-                    time.sleep(1)
-                    pygame.display.flip()
-
-                # the chosen player gets to choose a queen
-                self.wake_queen(chosen_player)
-        else:
-            print('Replacing {} with {}'.format(old_card.card_type, target_card.card_type))
-            self.full_deck.pop()
-            self.discard_pile.append(old_card.card_type)
-            target_card.center = old_card.center
-            current_player.cards.remove(old_card)
-            current_player.cards.append(target_card)
+    def draw_jester_count(self, i):
+        previous_index = (i - 1) % len(self.players)
+        chosen_index = i % len(self.players)
+        self.draw_player_name(self.players[previous_index].name, previous_index)
+        self.draw_player_name(self.players[chosen_index].name, chosen_index, colour=self.red)
+        pygame.display.flip()
 
     def replace_cards(self):
-        current_player = self.players[self.player_turn]
-        num_cards = len(self.full_deck)
-        if len(self.current_selection) > num_cards:
-            print('Not enough cards left, reusing discard pile')
-            shuffle(self.discard_pile)
-            self.full_deck.extend(self.discard_pile)
-            num_cards = len(self.full_deck)
-
-        for i in range(len(self.current_selection)):
-            old_card = self.current_selection[i]
-            self.replace_card(current_player, old_card)
-
-        assert len(current_player.cards) == self.cards_per_player, len(current_player.cards)
-        assert len(self.full_deck) == num_cards - len(self.current_selection)
+        card_indexes = [self.players[self.player_turn].cards.index(card) for card in self.current_selection]
+        self.state.replace_cards(card_indexes)
+        self.sync_player_cards(self.player_turn)
         self.current_selection = []
 
     def finalise_turn(self):
         self.hide_player_cards()
         self.deselect_queens()
         self.current_selection = []
-        self.player_turn += 1
-        self.player_turn %= len(self.player_names)
-        self.turn_over = False
-
-        current_player = self.players[self.player_turn]
-        if len(current_player.queens) == 5:
-            self.game_over = True
-
-    def do_player_turn(self):
-        # check all the queens have been woken
-        if len(self.sleeping_queen_positions) == len(self.queen_cards):
-            print('All queens are awake, choosing a winner')
-            self.game_over = True
-            return
+        self.state.finalise_turn()
+
+    def end_turn(self):
+        hand = self.players[self.player_turn].cards
+        card_indexes = tuple(hand.index(card) for card in self.current_selection)
+        played = tuple(card.card_type for card in self.current_selection)
+        targets = self.turn_targets + [None, None]
+        self.state.history.append(rules.Move(self.player_turn, card_indexes, played, targets[0], targets[1]))
+        self.turn_targets = []
+        self.replace_cards()
+        self.finalise_turn()
+        if self.game_log:
+            self.game_log.write_moves(self.state)
+        if self.snapshot_path:
+            self.save_snapshot()
+
+    def save_snapshot(self):
+        # write to one side and swap it in, so a crash never leaves half a snapshot behind
+        temp_path = self.snapshot_path + '.tmp'
+        with open(temp_path, 'wb') as snapshot_file:
+            snapshot_file.write(self.snapshot())
+        os.replace(temp_path, self.snapshot_path)
+
+    def play_selection(self):
+        if self.action_card_selected():
+            self.perform_action()
+
+        if not self.choice:
+            self.end_turn()
+
+    def draw_sleeping_queens(self):
+        for queen in self.queen_cards:
+            if not queen.queen_awake and not queen.moving:
+                queen.selected = False
+                queen.draw_card(self.screen, queen.center, self.queen_back_image, self.bg_colour)
 
+    def draw_static_board(self):
+        # the whole table but the cards in motion, which is what animations are drawn over
+        self.initialise_board()
+        self.draw_sleeping_queens()
         self.center_stack = self.draw_center_card()
-        self.show_player_cards()
-        for event in pygame.event.get():
+        if not self.game_over and self.player_turn not in self.bots:
+            self.show_player_cards()
+
+    def draw_table(self):
+        self.draw_static_board()
+        if self.choice:
+            kind, player_index = self.choice
+            if kind in (cards.KING, cards.JESTER):
+                self.select_queens()
+            else:
+                self.select_queens(asleep=False, exclude_player=player_index)
+        pygame.display.flip()
+
+    def handle_click(self, pos):
+        # one lookup in the grid for the click's own position, whatever the mouse has done since
+        target = self.hit_grid.find(pos)
+        if self.choice:
+            self.choose_queen(target)
+        elif self.select_player_card(target):
+            pass
+        elif target == (DRAW_PILE,) and self.valid_move():
+            self.play_selection()
+
+    def play_bots(self):
+        if self.choice:
+            # a jester can hand the choice of queen to a bot on someone else's turn
+            if self.choice[1] in self.bots:
+                self.make_choice(None)
+                self.needs_redraw = True
+        elif self.player_turn in self.bots:
+            self.play_bot_turn(self.bots[self.player_turn])
+            self.needs_redraw = True
+
+    def do_player_turn(self, events):
+        for event in events:
             if event.type == QUIT:
                 self.hide_player_cards()
                 return 1
-            elif event.type == MOUSEBUTTONUP:
-                if self.select_player_card():
-                    pass
-                elif self.is_center_card_selected():
-                    if self.valid_move():
-                        if self.action_card_selected():
-                            self.perform_action()
-                        self.replace_cards()
-
-                        self.turn_over = True
-                    else:
-                        print('Not a valid move')
-                        for card in self.current_selection:
-                            print(card.card_type)
-
-            if self.turn_over:
-                self.finalise_turn()
+            elif event.type == KEYDOWN and event.key == K_SPACE:
+                self.timeline.skip()
+            elif event.type == VIDEORESIZE:
+                self.resize(pygame.display.get_surface())
+            elif event.type == MOUSEBUTTONUP and not self.timeline.busy() and not self.game_over:
+                self.handle_click(event.pos)
+                self.needs_redraw = True
+
+        if not self.timeline.busy() and not self.game_over:
+            self.play_bots()
+
+        if self.timeline.busy():
+            self.timeline.update()
+            if not self.timeline.busy():
+                self.needs_redraw = True
+
+        if self.needs_redraw and not self.timeline.busy():
+            self.draw_table()
+            self.needs_redraw = False
 
         return 0
 
 
-def enter_players():
+def enter_players(fps=TARGET_FPS, seed=None, log_path=None, snapshot_path=None, profile_path=None):
     pygame.init()
     pygame.display.set_caption("Sleeping Queens")
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), RESIZABLE)
+    if snapshot_path and os.path.isfile(snapshot_path):
+        # the game that was running when the last one stopped already has its players
+        with open(snapshot_path, 'rb') as snapshot_file:
+            players = [player.name for player in snapshot.loads(snapshot_file.read()).players]
+        start_game(screen, players, FrameClock(fps), seed, log_path, snapshot_path, profile_path)
+        return
     black = (0, 0, 0)
     white = (255, 255, 255)
     grey = (200, 200, 200)
@@ -665,14 +724,15 @@ def enter_players():
     max_players = 4
     current_player = 1
     players = []
-    font = pygame.font.Font(None, 50)
-    block = font.render('Choose your players', True, grey)
+    frame_clock = FrameClock(fps)
+    text = assets.shared_text_cache()
+    block = text.get('Choose your players', 50, grey)
     rect = block.get_rect()
     rect.center = (screen_center[0], screen_center[1] - (screen.get_height() / 3))
     screen.blit(block, rect)
     select_players = True
     while select_players:
-        for evt in pygame.event.get():
+        for evt in frame_clock.next_frame():
             if evt.type == KEYDOWN:
                 if evt.unicode.isalpha():
                     player_name += evt.unicode
@@ -693,13 +753,13 @@ def enter_players():
                 return
         for i in range(max_players):
             if len(players) > i:
-                block = font.render(players[i], True, white)
+                block = text.get(players[i], 50, white)
                 rect = block.get_rect()
                 rect.center = (screen_center[0] + (rect.width / 2) - 20, ((i - 1) * 50) + screen_center[1])
                 screen.blit(block, rect)
             else:
-                block = font.render(player_name, True, white)
-            label = font.render('Player{}:'.format(i), True, grey)
+                block = text.get(player_name, 50, white)
+            label = text.get('Player{}:'.format(i), 50, grey)
             label_rect = label.get_rect()
             label_rect.center = (100, screen_center[1] + ((i - 1) * 50))
             screen.blit(label, label_rect)
@@ -711,27 +771,69 @@ def enter_players():
             pygame.display.flip()
 
     if len(players) > 0:
-        start_game(screen, players)
-
-
-def start_game(screen, player_list):
-    board = Board(screen, player_list)
-    board.initialise_all()
-
-    while True:
-        for evt in pygame.event.get():
-            if evt.type == QUIT:
-                return
-
-        if board.do_player_turn():
-            return
-        elif board.game_over:
-            board.highlight_winner()
-            return
-
-        pygame.display.flip()
+        start_game(screen, players, frame_clock, seed, log_path, snapshot_path, profile_path)
+
+
+def start_game(screen, player_list, frame_clock=None, seed=None, log_path=None, snapshot_path=None,
+               profile_path=None):
+    frame_clock = frame_clock or FrameClock()
+    board = Board(screen, player_list, frame_clock, rng=seed)
+    profiler = None
+    if profile_path:
+        # time every frame, F3 shows the figures on the table
+        profiler = profiling.FrameProfiler()
+        profiler.attach(board, Card)
+    if snapshot_path and os.path.isfile(snapshot_path):
+        # carry on with the game that was running when the last one stopped
+        with open(snapshot_path, 'rb') as snapshot_file:
+            board.restore(snapshot_file.read())
+    else:
+        board.initialise_all()
+    board.snapshot_path = snapshot_path
+    print('Game seed {}'.format(board.state.seed))
+
+    # players whose names start with 'bot' are played by the computer
+    bot_rng = rules.stream_rng(board.state.seed, 'bots')
+    board.bots = {seat: MCTSPolicy(rules.fork_rng(bot_rng)) for seat, name in enumerate(board.player_names)
+                  if name.lower().startswith('bot')}
+    if log_path:
+        board.game_log = gamelog.GameLogWriter(gamelog.open_archive(log_path), board.state)
+
+    try:
+        while True:
+            if board.do_player_turn(frame_clock.next_frame(animating=board.timeline.busy())):
+                break
+            elif board.game_over and not board.timeline.busy():
+                if board.winner_shown:
+                    break
+                board.highlight_winner()
+    finally:
+        for bot in board.bots.values():
+            bot.close()
+        if board.game_log:
+            # a game that was quit or crashed part way through is closed too, a resumed game is logged again in full
+            board.game_log.close()
+    if board.game_over and snapshot_path and os.path.isfile(snapshot_path):
+        os.remove(snapshot_path)
+    if profiler:
+        profiler.detach()
+        profiler.export(profile_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play Sleeping Queens')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='deal the same game again from the seed printed when it started, e.g. from a bug report')
+    parser.add_argument('--log', default=None, help='archive to append the binary log of the game to')
+    parser.add_argument('--snapshot', default=SNAPSHOT_PATH,
+                        help='file the game is saved to after every turn and picked up from after a crash, '
+                             '"" to not save it')
+    parser.add_argument('--profile', default=None,
+                        help='time every frame, F3 shows the figures, and write the trace here as .json or .csv')
+    args = parser.parse_args()
+    enter_players(seed=args.seed, log_path=args.log, snapshot_path=args.snapshot, profile_path=args.profile)
+    pygame.quit()
 
 
 if __name__ == "__main__":
-    enter_players()
-    pygame.quit()
+    main()
@@ -0,0 +1,387 @@
+import random
+from collections import namedtuple
+from cards import (NUMBER, KING, KNIGHT, POTION, WAND, DRAGON, JESTER, KINDS, VALUES, QUEENS, ROSE, STRAWBERRY,
+                   FULL_DECK, CARD_NAMES)
+
+CARDS_PER_PLAYER = 5
+QUEENS_TO_WIN = 5
+
+
+# one turn of the game: the seat that played, the hand indexes and cards played and the chosen queens
+Move = namedtuple('Move', ['player', 'card_indexes', 'cards', 'target', 'bonus'])
+
+
+class InvalidMove(Exception):
+    pass
+
+
+def new_seed():
+    return random.SystemRandom().getrandbits(64)
+
+
+def fork_rng(rng):
+    """Start an independent stream from rng, e.g. one for each policy or worker process."""
+    return random.Random(rng.getrandbits(64))
+
+
+def stream_rng(seed, stream):
+    """A generator for something other than the game's own shuffles, such as the bots, seeded from the game's seed.
+
+    Only the game's shuffles may draw from its rng, so that replaying the moves from the seed deals the same cards.
+    """
+    return random.Random('{}/{}'.format(seed, stream))
+
+
+def game_seed(master_seed, game_index):
+    # distinct for every game in a run, and the same whichever worker or chunk ends up playing it
+    return (master_seed << 32) | game_index
+
+
+def is_number_card(card):
+    return KINDS[card] == NUMBER
+
+
+def is_king(card):
+    return KINDS[card] == KING
+
+
+def card_names(cards):
+    return [CARD_NAMES[card] for card in cards]
+
+
+def is_valid_number_play(values):
+    # multiple cards must all be numbers, and either all the same or the largest is the sum of the others
+    largest = max(values)
+    return min(values) > 0 and (min(values) == largest or largest * 2 == sum(values))
+
+
+def is_valid_play(cards):
+    if len(cards) == 1:
+        # any single card can be played
+        return True
+    elif not cards:
+        return False
+
+    return is_valid_number_play([VALUES[card] for card in cards])
+
+
+def find_plays(values):
+    plays = []
+    hand_size = len(values)
+    for mask in range(1, 1 << hand_size):
+        card_indexes = tuple(card_index for card_index in range(hand_size) if mask >> card_index & 1)
+        if len(card_indexes) == 1 or is_valid_number_play([values[card_index] for card_index in card_indexes]):
+            plays.append(card_indexes)
+
+    plays.sort(key=lambda card_indexes: (len(card_indexes), card_indexes))
+    return tuple(plays)
+
+
+# every valid play keyed by the card values of the hand, filled in the first time each hand is seen
+_plays_by_hand = {}
+
+
+def legal_plays(cards):
+    """Return the hand indexes of every valid play in a hand.
+
+    The plays only depend on the number values in the hand, so they are worked out once per distinct hand
+    and the same tuple is handed back from then on. Callers must not change it.
+    """
+    values = tuple(map(VALUES.__getitem__, cards))
+    plays = _plays_by_hand.get(values)
+    if plays is None:
+        plays = _plays_by_hand[values] = find_plays(values)
+    return plays
+
+
+class PlayerState:
+    __slots__ = ('name', 'cards', 'queens')
+
+    def __init__(self, name):
+        self.name = name
+        self.cards = []
+        self.queens = []
+
+
+class Deck:
+    """The draw pile and the discard pile as lists of card codes, the top of each pile is its end.
+
+    Drawing and discarding are a pop from cards or an append to discards, dealing every hand is one slice,
+    and the discards only go back into the deck when it has run out.
+    """
+
+    __slots__ = ('cards', 'discards')
+
+    def __init__(self, cards=FULL_DECK, discards=()):
+        self.cards = list(cards)
+        self.discards = list(discards)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def copy(self):
+        return Deck(self.cards, self.discards)
+
+    def shuffle(self, rng):
+        rng.shuffle(self.cards)
+
+    def reshuffle(self, rng):
+        # the shuffled discards go under whatever is left, which is nothing when the deck has run out
+        rng.shuffle(self.discards)
+        self.discards.extend(self.cards)
+        self.cards, self.discards = self.discards, []
+
+    def deal(self, count):
+        """Draw count cards at once, in the order popping them one at a time would have."""
+        dealt = self.cards[len(self.cards) - count:]
+        del self.cards[len(self.cards) - count:]
+        dealt.reverse()
+        return dealt
+
+
+class GameState:
+    """The rules of the game with no rendering attached.
+
+    Board drives the same methods from mouse clicks, anything else can call play() directly with the hand
+    indexes of the cards to play and, for action cards, the chosen target. Cards and queens are the int codes
+    from the cards module, so a copy is a handful of short lists of small ints.
+
+    rng is a seed or a random.Random, and every shuffle in the game is drawn from it so that a game can be
+    played again from its seed. Without one a new seed is picked.
+    """
+
+    __slots__ = ('players', 'deck', 'sleeping_queens', 'player_turn', 'game_over', 'winner', 'turns', 'queens_woken',
+                 'cards_drawn', 'reshuffles', 'history', 'seed', 'rng')
+
+    def __init__(self, player_names, rng=None):
+        if isinstance(rng, random.Random):
+            self.seed = None
+            self.rng = rng
+        else:
+            self.seed = new_seed() if rng is None else rng
+            self.rng = random.Random(self.seed)
+        self.players = [PlayerState(name) for name in player_names]
+        self.deck = Deck()
+        # one entry per queen slot in the middle of the table, None once that queen has been woken
+        self.sleeping_queens = list(QUEENS)
+        self.player_turn = 0
+        self.game_over = False
+        self.winner = None
+        # running totals for simulations
+        self.turns = 0
+        self.queens_woken = 0
+        self.cards_drawn = 0
+        self.reshuffles = 0
+        self.history = []
+
+    def deal(self):
+        self.deck.shuffle(self.rng)
+        self.rng.shuffle(self.sleeping_queens)
+        # the cards go round the table one at a time, so each player's hand is every nth card dealt
+        dealt = self.deck.deal(CARDS_PER_PLAYER * len(self.players))
+        for player_index, player in enumerate(self.players):
+            player.cards.extend(dealt[player_index::len(self.players)])
+
+    def copy(self, rng=None, history=True):
+        """Copy the state, drawing from rng from now on or else from a copy of this game's generator.
+
+        With history False the copy starts with no moves, for searches that only look ahead.
+        """
+        state = GameState.__new__(GameState)
+        for attribute in GameState.__slots__:
+            setattr(state, attribute, getattr(self, attribute))
+        if rng is None:
+            rng = random.Random()
+            rng.setstate(self.rng.getstate())
+        state.rng = rng
+        state.players = []
+        for player in self.players:
+            player_copy = PlayerState(player.name)
+            player_copy.cards = list(player.cards)
+            player_copy.queens = list(player.queens)
+            state.players.append(player_copy)
+        state.deck = self.deck.copy()
+        state.sleeping_queens = list(self.sleeping_queens)
+        state.history = list(self.history) if history else []
+        return state
+
+    @property
+    def current_player(self):
+        return self.players[self.player_turn]
+
+    def sleeping_slots(self):
+        return [slot for slot, queen in enumerate(self.sleeping_queens) if queen is not None]
+
+    def awake_queens(self, exclude_player=None):
+        """Return the (player index, queen index) pairs that a knight or potion could target."""
+        targets = []
+        for player_index, player in enumerate(self.players):
+            if player_index == exclude_player:
+                continue
+            for queen_index, queen in enumerate(player.queens):
+                if queen != STRAWBERRY:
+                    targets.append((player_index, queen_index))
+
+        return targets
+
+    def top_card(self):
+        if not self.deck.cards:
+            self.reshuffle()
+        return self.deck.cards[-1]
+
+    def reshuffle(self):
+        self.deck.reshuffle(self.rng)
+        self.reshuffles += 1
+
+    def draw_card(self):
+        if not self.deck.cards:
+            self.reshuffle()
+        self.cards_drawn += 1
+        return self.deck.cards.pop()
+
+    def replace_card(self, player_index, card_index):
+        player = self.players[player_index]
+        self.deck.discards.append(player.cards[card_index])
+        new_card = self.draw_card()
+        player.cards[card_index] = new_card
+        return new_card
+
+    def replace_cards(self, card_indexes):
+        for card_index in card_indexes:
+            self.replace_card(self.player_turn, card_index)
+
+    def wake_queen(self, player_index, slot=None):
+        if slot is None:
+            slot = self.sleeping_slots()[0]
+        elif not 0 <= slot < len(self.sleeping_queens):
+            raise InvalidMove('There is no queen slot {}'.format(slot))
+
+        queen = self.sleeping_queens[slot]
+        if queen is None:
+            raise InvalidMove('Queen slot {} is empty'.format(slot))
+
+        self.sleeping_queens[slot] = None
+        self.players[player_index].queens.append(queen)
+        self.queens_woken += 1
+        return queen
+
+    def rose_bonus(self, player_index, queen):
+        # the rose queen lets you take another queen
+        return (queen == ROSE and len(self.players[player_index].queens) < QUEENS_TO_WIN and
+                bool(self.sleeping_slots()))
+
+    def find_defence(self, player_index, kind):
+        for card_index, card in enumerate(self.players[player_index].cards):
+            if KINDS[card] == kind:
+                return card_index
+        return None
+
+    def check_target(self, player_index, target):
+        target_player, queen_index = target
+        if target_player == player_index or not 0 <= target_player < len(self.players):
+            raise InvalidMove('Player {} cannot target player {}'.format(player_index, target_player))
+        if not 0 <= queen_index < len(self.players[target_player].queens):
+            raise InvalidMove('Player {} has no queen {}'.format(target_player, queen_index))
+        if self.players[target_player].queens[queen_index] == STRAWBERRY:
+            raise InvalidMove('The strawberry queen cannot be taken')
+
+    def steal_queen(self, player_index, target):
+        """Knight: returns the hand index of the dragon that blocked it, or None if the queen was taken."""
+        self.check_target(player_index, target)
+        target_player, queen_index = target
+        dragon = self.find_defence(target_player, DRAGON)
+        if dragon is not None:
+            self.replace_card(target_player, dragon)
+            return dragon
+
+        queen = self.players[target_player].queens.pop(queen_index)
+        self.players[player_index].queens.append(queen)
+        return None
+
+    def put_queen_to_sleep(self, player_index, target):
+        """Potion: returns the hand index of the wand that blocked it, or None if the queen went back to sleep."""
+        self.check_target(player_index, target)
+        target_player, queen_index = target
+        wand = self.find_defence(target_player, WAND)
+        if wand is not None:
+            self.replace_card(target_player, wand)
+            return wand
+
+        queen = self.players[target_player].queens.pop(queen_index)
+        self.sleeping_queens[self.sleeping_queens.index(None)] = queen
+        return None
+
+    def jester(self, player_index):
+        """Turn over the top card, a number counts round the table from the current player.
+
+        Returns the revealed card and the index of the player who gets to wake a queen, if any.
+        """
+        revealed = self.top_card()
+        if not is_number_card(revealed):
+            return revealed, None
+
+        chosen_player = (player_index + VALUES[revealed] - 1) % len(self.players)
+        return revealed, chosen_player
+
+    def perform_action(self, card, target=None, bonus=None):
+        player_index = self.player_turn
+        kind = KINDS[card]
+        if kind == KING:
+            queen = self.wake_queen(player_index, target)
+            if self.rose_bonus(player_index, queen):
+                self.wake_queen(player_index, bonus)
+        elif kind == JESTER:
+            revealed, chosen_player = self.jester(player_index)
+            if chosen_player is not None:
+                self.wake_queen(chosen_player, target)
+        elif kind == KNIGHT:
+            if target is not None:
+                self.steal_queen(player_index, target)
+        elif kind == POTION:
+            if target is not None:
+                self.put_queen_to_sleep(player_index, target)
+
+        # dragons and wands don't do anything on their own
+
+    def check_winner(self):
+        for player_index, player in enumerate(self.players):
+            if len(player.queens) >= QUEENS_TO_WIN:
+                self.winner = player_index
+                self.game_over = True
+                return
+
+        if not self.sleeping_slots():
+            # all queens are awake, the player with the most queens wins
+            queen_counts = [len(player.queens) for player in self.players]
+            self.winner = queen_counts.index(max(queen_counts))
+            self.game_over = True
+
+    def finalise_turn(self):
+        self.turns += 1
+        self.check_winner()
+        if not self.game_over:
+            self.player_turn += 1
+            self.player_turn %= len(self.players)
+
+    def play(self, card_indexes, target=None, bonus=None):
+        """Play the current player's cards at card_indexes and move on to the next turn.
+
+        target is the sleeping queen slot for a king or jester, or a (player index, queen index) pair for a
+        knight or potion; leaving it out wakes the first sleeping queen or plays the card with no effect.
+        """
+        if self.game_over:
+            raise InvalidMove('The game is over')
+
+        player = self.current_player
+        if not card_indexes or not all(0 <= card_index < len(player.cards) for card_index in card_indexes):
+            raise InvalidMove('Not a valid move: card indexes {}'.format(list(card_indexes)))
+        cards = [player.cards[card_index] for card_index in card_indexes]
+        if len(set(card_indexes)) != len(card_indexes) or not is_valid_play(cards):
+            raise InvalidMove('Not a valid move: {}'.format(card_names(cards)))
+
+        self.history.append(Move(self.player_turn, tuple(card_indexes), tuple(cards), target, bonus))
+        if not is_number_card(cards[0]):
+            self.perform_action(cards[0], target, bonus)
+
+        self.replace_cards(card_indexes)
+        self.finalise_turn()
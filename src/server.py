@@ -0,0 +1,194 @@
+"""Hosts Sleeping Queens tables over TCP with asyncio, the game state on each table is the only real one.
+
+Clients join a table by name and the game starts as soon as the table is full. Each seat is only ever sent
+its own view of the game, see protocol.py, so nobody's client knows the other hands. Moves are checked
+against the rules on the server and a bad one is answered with an error for that client alone.
+
+    python server.py --port 8765 --players 2
+"""
+import argparse
+import asyncio
+import struct
+import protocol
+import rules
+from policies import GreedyPolicy
+
+# connections waiting to be accepted, asyncio's default of 100 drops a burst of players joining at once
+BACKLOG = 1024
+
+
+class Table:
+    """One game and the clients sat at it.
+
+    A client that leaves before the game starts gives up its seat. Once the game has started its seat is played
+    by a bot instead, so the others are never left waiting for a turn that won't come.
+    """
+
+    def __init__(self, name, num_players, seed):
+        self.name = name
+        self.num_players = num_players
+        self.seed = seed
+        self.player_names = []
+        self.writers = []
+        # the view each seat was last sent, updates only carry what has changed since
+        self.views = []
+        self.state = None
+        self.bot = None
+
+    @property
+    def full(self):
+        return len(self.player_names) == self.num_players
+
+    def join(self, name, writer):
+        seat = len(self.player_names)
+        self.player_names.append(name)
+        self.writers.append(writer)
+        self.views.append(protocol.blank_view(self.num_players))
+        if self.full:
+            self.state = rules.GameState(self.player_names, self.seed)
+            self.state.deal()
+            for seat_index, seat_writer in enumerate(self.writers):
+                seat_writer.write(protocol.encode_welcome(seat_index, self.player_names))
+            self.send_updates()
+        return seat
+
+    def seat(self, writer):
+        return self.writers.index(writer)
+
+    def leave(self, writer):
+        seat = self.seat(writer)
+        if self.state is None:
+            del self.player_names[seat]
+            del self.writers[seat]
+            del self.views[seat]
+            return
+        # the seat stays in the game, nothing more is sent to it and a bot makes its moves
+        self.writers[seat] = None
+        if any(self.writers):
+            self.play_departed()
+            self.send_updates()
+
+    def play_departed(self):
+        if self.bot is None:
+            self.bot = GreedyPolicy(rules.stream_rng(self.seed, 'departed'))
+        while not self.state.game_over and self.writers[self.state.player_turn] is None:
+            self.state.play(*self.bot.choose(self.state))
+
+    def play(self, writer, payload):
+        """Play a move from the client writing to writer, returning an error message if it couldn't be played."""
+        if self.state is None:
+            return 'The game has not started'
+        elif self.seat(writer) != self.state.player_turn:
+            return 'It is not your turn'
+        # a move can fail part way through, e.g. on a bad rose bonus slot, so it is tried on a copy first
+        state = self.state.copy()
+        try:
+            state.play(*protocol.decode_play(payload))
+        except (rules.InvalidMove, IndexError, TypeError, ValueError, struct.error) as error:
+            return str(error) or 'Not a valid move'
+        self.state = state
+        if None in self.writers:
+            self.play_departed()
+        self.send_updates()
+        return None
+
+    def send_updates(self):
+        for seat, writer in enumerate(self.writers):
+            view = protocol.encode_view(self.state, seat)
+            delta = protocol.encode_delta(self.views[seat], view)
+            self.views[seat] = view
+            if writer is not None and delta:
+                writer.write(protocol.encode_message(protocol.UPDATE, delta))
+
+    @property
+    def finished(self):
+        if self.state is None:
+            return not self.writers
+        return self.state.game_over or not any(self.writers)
+
+
+class GameServer:
+    """Seats clients at tables by name, a name whose table is already full gets a new table for the next game."""
+
+    def __init__(self, num_players=4, seed=None):
+        self.num_players = num_players
+        self.seed = rules.new_seed() if seed is None else seed
+        self.tables = {}
+        self.games_started = 0
+        self.games_finished = 0
+        self.moves = 0
+
+    def table(self, name):
+        table = self.tables.get(name)
+        if table is None or table.full:
+            # each game on the server is seeded from the server's seed and its own number, as in simulate.py
+            table = self.tables[name] = Table(name, self.num_players, rules.game_seed(self.seed, self.games_started))
+            self.games_started += 1
+        return table
+
+    async def handle_client(self, reader, writer):
+        table = None
+        try:
+            while True:
+                kind, payload = await protocol.read_message(reader)
+                if kind == protocol.JOIN and table is None:
+                    try:
+                        table_name, player_name = protocol.decode_join(payload)
+                    except (IndexError, UnicodeDecodeError, ValueError):
+                        writer.write(protocol.encode_message(protocol.ERROR, b'Not a valid join'))
+                    else:
+                        table = self.table(table_name)
+                        table.join(player_name, writer)
+                elif kind == protocol.PLAY and table is not None:
+                    error = table.play(writer, payload)
+                    if error:
+                        writer.write(protocol.encode_message(protocol.ERROR, error.encode('utf-8')))
+                    else:
+                        self.moves += 1
+                        if table.state.game_over:
+                            self.games_finished += 1
+                else:
+                    writer.write(protocol.encode_message(protocol.ERROR, b'Unexpected message'))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # the client went away, or sent a frame too short to hold its own type
+            pass
+        finally:
+            if table is not None:
+                game_over = table.state is not None and table.state.game_over
+                table.leave(writer)
+                if not game_over and table.state is not None and table.state.game_over:
+                    self.games_finished += 1
+                if self.tables.get(table.name) is table and table.finished:
+                    del self.tables[table.name]
+            writer.close()
+
+    async def serve(self, host, port):
+        return await asyncio.start_server(self.handle_client, host, port, backlog=BACKLOG)
+
+
+async def run_server(host, port, num_players, seed):
+    game_server = GameServer(num_players, seed)
+    server = await game_server.serve(host, port)
+    print('Seed {}'.format(game_server.seed))
+    print('Serving {}-player tables on {}'.format(num_players, ', '.join(
+        '{}:{}'.format(*sock.getsockname()[:2]) for sock in server.sockets)))
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Host Sleeping Queens tables for clients over TCP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--players', type=int, default=4, choices=range(2, 5), help='players at each table')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_server(args.host, args.port, args.players, args.seed))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
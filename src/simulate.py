@@ -0,0 +1,122 @@
+import argparse
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import rules
+import gamelog
+from mcts import MCTSPolicy
+from policies import RandomPolicy, GreedyPolicy
+
+POLICIES = {'random': RandomPolicy, 'greedy': GreedyPolicy, 'mcts': MCTSPolicy}
+# a game still running after this many turns is counted as a draw
+MAX_TURNS = 1000
+
+GameResult = namedtuple('GameResult', ['seed', 'winner', 'turns', 'queens_woken', 'cards_drawn', 'reshuffles'])
+
+
+def play_game(policy_classes, seed, max_turns=MAX_TURNS):
+    """Play one game from its seed, so any game from a run can be played again on its own."""
+    state = rules.GameState(['Player{}'.format(seat) for seat in range(len(policy_classes))], seed)
+    policy_rng = rules.stream_rng(seed, 'policies')
+    policies = [policy_class(rules.fork_rng(policy_rng)) for policy_class in policy_classes]
+    state.deal()
+    try:
+        while not state.game_over and state.turns < max_turns:
+            state.play(*policies[state.player_turn].choose(state))
+    finally:
+        for policy in policies:
+            policy.close()
+
+    return state
+
+
+def game_result(state):
+    return GameResult(state.seed, state.winner, state.turns, state.queens_woken, state.cards_drawn, state.reshuffles)
+
+
+def play_games(seed, first_game, num_games, policy_classes, log=False):
+    """Returns the chunk's results and, if log is set, the binary logs of its games one after another."""
+    results = []
+    logs = []
+    # every game is seeded from the run's seed and its own index, not from whatever the worker played before
+    for game_index in range(first_game, first_game + num_games):
+        state = play_game(policy_classes, rules.game_seed(seed, game_index))
+        results.append(game_result(state))
+        if log:
+            logs.append(gamelog.dumps(state))
+    return results, b''.join(logs)
+
+
+def simulate(num_games, policy_classes, workers=None, chunk_size=1000, seed=0, log_file=None):
+    """Play num_games across a process pool, yielding each GameResult as its chunk of games finishes.
+
+    The results are the same for a given seed however many workers or games per chunk are used. With a
+    log_file every game's binary log is appended to it.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for first_game in range(0, num_games, chunk_size):
+            chunk_games = min(chunk_size, num_games - first_game)
+            futures.append(executor.submit(play_games, seed, first_game, chunk_games, policy_classes,
+                                          log_file is not None))
+
+        for future in as_completed(futures):
+            results, logs = future.result()
+            if log_file is not None:
+                log_file.write(logs)
+            yield from results
+
+
+class Summary:
+    def __init__(self, num_players):
+        self.num_players = num_players
+        self.games = 0
+        self.wins = Counter()
+        self.totals = Counter()
+
+    def add(self, result):
+        self.games += 1
+        self.wins[result.winner] += 1
+        for field in GameResult._fields[2:]:
+            self.totals[field] += getattr(result, field)
+
+    def report(self):
+        lines = ['{} games'.format(self.games)]
+        for seat in range(self.num_players):
+            lines.append('Player{} won {:.1%}'.format(seat, self.wins[seat] / self.games))
+        lines.append('Draws {:.1%}'.format(self.wins[None] / self.games))
+        for field in GameResult._fields[2:]:
+            lines.append('Average {} {:.2f}'.format(field.replace('_', ' '), self.totals[field] / self.games))
+        return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play Sleeping Queens games between bots')
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--policies', nargs='+', default=['random', 'random', 'random', 'random'],
+                        choices=sorted(POLICIES), help='one policy per seat')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, defaults to one per CPU')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='games per task sent to a worker')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--log', default=None, help='file to append the binary log of every game to')
+    args = parser.parse_args()
+
+    seed = rules.new_seed() if args.seed is None else args.seed
+    print('Seed {}'.format(seed))
+    policy_classes = [POLICIES[name] for name in args.policies]
+    summary = Summary(len(policy_classes))
+    log_file = gamelog.open_archive(args.log) if args.log else None
+    start_time = time.perf_counter()
+    for result in simulate(args.games, policy_classes, args.workers, args.chunk_size, seed, log_file):
+        summary.add(result)
+
+    if log_file:
+        log_file.close()
+
+    elapsed = time.perf_counter() - start_time
+    print(summary.report())
+    print('{:.0f} games per second'.format(summary.games / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import random
+import struct
+import gamelog
+import rules
+
+MAGIC = b'SQSS'
+VERSION = 1
+GAME_OVER = 1
+HAS_SEED = 2
+HAS_RNG = 4
+HAS_TURN = 8
+NONE = 255
+# magic, version, flags, number of players, player turn, winner, the four running totals, the sizes of the deck,
+# discard pile and history, and the seed
+HEADER = struct.Struct('<4sBBBBBIIIIBBI16s')
+# a history entry is the player, the same record as a game log and the cards played, padded out to five
+MOVE = struct.Struct('<B{}s5s'.format(gamelog.RECORD.size))
+# the Mersenne Twister's 624 words and its position
+RNG = struct.Struct('<625I')
+# a turn in progress on a Board: the pending choice's kind and player, the selected hand indexes packed as in a
+# game log, how many targets have been chosen and the first of them
+TURN = struct.Struct('<BBHBBB')
+
+
+def dumps(state, with_rng=True, turn=None):
+    """Pack the whole game state into bytes, with no pixels or surfaces in it.
+
+    Leaving out the rng saves 2.5KB when the copy will never draw a card, e.g. inside a search. turn is
+    (choice, selected hand indexes, targets) for a Board that is part way through a turn.
+    """
+    flags = ((GAME_OVER if state.game_over else 0) | (HAS_SEED if state.seed is not None else 0) |
+             (HAS_RNG if with_rng else 0) | (HAS_TURN if turn is not None else 0))
+    winner = NONE if state.winner is None else state.winner
+    seed = (state.seed or 0).to_bytes(16, 'little')
+    parts = [HEADER.pack(MAGIC, VERSION, flags, len(state.players), state.player_turn, winner, state.turns,
+                         state.queens_woken, state.cards_drawn, state.reshuffles, len(state.deck.cards),
+                         len(state.deck.discards), len(state.history), seed),
+             bytes(NONE if queen is None else queen for queen in state.sleeping_queens)]
+    for player in state.players:
+        name = player.name.encode('utf-8')
+        parts.append(bytes([len(name)]) + name + bytes([len(player.cards)]) + bytes(player.cards) +
+                     bytes([len(player.queens)]) + bytes(player.queens))
+    parts.append(bytes(state.deck.cards))
+    parts.append(bytes(state.deck.discards))
+    for move in state.history:
+        parts.append(MOVE.pack(move.player, gamelog.encode_move(move), bytes(move.cards).ljust(5, b'\xff')))
+    if with_rng:
+        parts.append(RNG.pack(*state.rng.getstate()[1]))
+    if turn is not None:
+        choice, card_indexes, targets = turn
+        kind, chooser = choice or (NONE, NONE)
+        target_player, target_queen = gamelog.encode_target(targets[0] if targets else None)
+        parts.append(TURN.pack(kind, chooser, gamelog.pack_indexes(card_indexes), len(targets), target_player,
+                               target_queen))
+    return b''.join(parts)
+
+
+def read(data):
+    """Unpack bytes from dumps() into a GameState and the turn in progress, or None."""
+    (magic, version, flags, num_players, player_turn, winner, turns, queens_woken, cards_drawn, reshuffles,
+     deck_size, discard_size, history_length, seed) = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a version {} snapshot'.format(VERSION))
+
+    offset = HEADER.size
+    num_slots = len(rules.QUEENS)
+    sleeping_queens = [None if queen == NONE else queen for queen in data[offset:offset + num_slots]]
+    offset += num_slots
+    players = []
+    for player_index in range(num_players):
+        name_length = data[offset]
+        player = rules.PlayerState(data[offset + 1:offset + 1 + name_length].decode('utf-8'))
+        offset += 1 + name_length
+        player.cards = list(data[offset + 1:offset + 1 + data[offset]])
+        offset += 1 + data[offset]
+        player.queens = list(data[offset + 1:offset + 1 + data[offset]])
+        offset += 1 + data[offset]
+        players.append(player)
+
+    state = rules.GameState.__new__(rules.GameState)
+    state.players = players
+    deck = data[offset:offset + deck_size]
+    offset += deck_size
+    state.deck = rules.Deck(deck, data[offset:offset + discard_size])
+    offset += discard_size
+    state.sleeping_queens = sleeping_queens
+    state.player_turn = player_turn
+    state.game_over = bool(flags & GAME_OVER)
+    state.winner = None if winner == NONE else winner
+    state.turns = turns
+    state.queens_woken = queens_woken
+    state.cards_drawn = cards_drawn
+    state.reshuffles = reshuffles
+    state.seed = int.from_bytes(seed, 'little') if flags & HAS_SEED else None
+
+    state.history = []
+    for player_index, record, cards in MOVE.iter_unpack(data[offset:offset + history_length * MOVE.size]):
+        card_indexes, target, bonus = gamelog.decode_move(*gamelog.RECORD.unpack(record))
+        state.history.append(rules.Move(player_index, tuple(card_indexes), tuple(cards[:len(card_indexes)]),
+                                        target, bonus))
+    offset += history_length * MOVE.size
+
+    state.rng = random.Random()
+    if flags & HAS_RNG:
+        state.rng.setstate((3, RNG.unpack_from(data, offset), None))
+        offset += RNG.size
+
+    turn = None
+    if flags & HAS_TURN:
+        kind, chooser, packed_indexes, num_targets, target_player, target_queen = TURN.unpack_from(data, offset)
+        turn = (None if kind == NONE else (kind, chooser), gamelog.unpack_indexes(packed_indexes),
+                [gamelog.decode_target(target_player, target_queen)][:num_targets])
+    return state, turn
+
+
+def loads(data):
+    return read(data)[0]
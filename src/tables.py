@@ -0,0 +1,213 @@
+"""Runs thousands of bot-only tables in one process, each a headless Board stepped a turn at a time.
+
+Every board draws to the same off-screen surface, which is never shown, so the tables share one layout
+and one set of card images from the shared AssetCache instead of a window and decoded images each. The
+manager plays one turn of whichever table is due next: tables are stride scheduled, so each is stepped in
+proportion to its priority and tables of equal priority simply take turns round the room.
+
+    python tables.py --tables 2000 --policies random greedy random greedy
+"""
+import argparse
+import gc
+import heapq
+import sys
+import time
+import types
+from collections import deque
+import pygame
+import profiling
+import rules
+from frames import HeadlessTimeline
+from queens import Board, SCREEN_WIDTH, SCREEN_HEIGHT
+from simulate import POLICIES, MAX_TURNS, Summary, game_result
+
+# a table's pass goes up by STRIDE / priority each time it is stepped, and the lowest pass goes next
+STRIDE = 1 << 20
+# how many of the latest turn times the latency percentiles are taken from
+LATENCY_WINDOW = 10000
+# tables walked to work out the memory each one holds
+MEMORY_SAMPLE = 50
+# code and modules are shared by everything, so they are never counted as a table's
+NOT_OWNED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.CodeType)
+
+
+def owned_size(root, shared):
+    """The bytes held by root and everything it refers to, not counting anything whose id is in shared.
+
+    Only the objects themselves are counted, not the pixels of surfaces, which are shared between tables.
+    """
+    seen = set(shared)
+    stack = [root]
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, NOT_OWNED):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return size
+
+
+def reachable_ids(roots):
+    seen = set()
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, NOT_OWNED):
+            continue
+        seen.add(id(obj))
+        stack.extend(gc.get_referents(obj))
+    return seen
+
+
+def surface_bytes(surface):
+    return surface.get_pitch() * surface.get_height()
+
+
+class Table:
+    """One headless board and its place in the schedule."""
+
+    def __init__(self, table_id, board, priority, pass_value):
+        self.table_id = table_id
+        self.board = board
+        self.priority = priority
+        self.pass_value = pass_value
+        self.steps = 0
+        self.busy_time = 0.0
+
+    @property
+    def finished(self):
+        return self.board.game_over or self.board.state.turns >= MAX_TURNS
+
+
+class TableManager:
+    def __init__(self, screen_size=(SCREEN_WIDTH, SCREEN_HEIGHT)):
+        # the same off-screen surface for every board, so they all get the same cached layout. Nothing on it
+        # is ever shown, so it is clipped to nothing and the drawing the boards still do costs next to nothing
+        self.screen = pygame.Surface(screen_size)
+        self.screen.set_clip(pygame.Rect(0, 0, 0, 0))
+        self.tables = {}
+        # (pass, table id) of every table still playing
+        self.queue = []
+        self.next_id = 0
+        self.steps = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.max_latency = 0.0
+        self.results = []
+
+    def add_table(self, policy_classes, seed=None, priority=1):
+        """Seat one bot for each policy class at a new table, returning the Table."""
+        # anything past STRIDE would never move the table's pass on, and it would be stepped forever
+        if not 1 <= priority <= STRIDE:
+            raise ValueError('Table priority must be from 1 to {}, not {}'.format(STRIDE, priority))
+        board = Board(self.screen, ['Bot{}'.format(seat) for seat in range(len(policy_classes))],
+                      timeline=HeadlessTimeline(), rng=seed)
+        # the bots are seeded from the game as simulate.py seeds them
+        policy_rng = rules.stream_rng(board.state.seed, 'policies')
+        board.bots = {seat: policy_class(rules.fork_rng(policy_rng)) for seat, policy_class in enumerate(policy_classes)}
+        # what initialise_all() does apart from drawing the table
+        board.initialise_players()
+        board.deal_initial_cards()
+        board.initialise_queens()
+        board.build_hit_grid()
+
+        # a new table starts level with the table due next, rather than owed every turn it wasn't there for
+        pass_value = self.queue[0][0] if self.queue else 0
+        table = Table(self.next_id, board, priority, pass_value)
+        self.tables[table.table_id] = table
+        heapq.heappush(self.queue, (pass_value, table.table_id))
+        self.next_id += 1
+        return table
+
+    def step(self):
+        """Play one turn of the table that is due, returning that table or None if every game is over.
+
+        A jester can leave the choice of queen to another bot, which is then made on the table's next step.
+        """
+        if not self.queue:
+            return None
+        pass_value, table_id = heapq.heappop(self.queue)
+        table = self.tables[table_id]
+        start_time = time.perf_counter()
+        table.board.play_bots()
+        elapsed = time.perf_counter() - start_time
+
+        table.steps += 1
+        table.busy_time += elapsed
+        self.steps += 1
+        self.latencies.append(elapsed)
+        self.max_latency = max(self.max_latency, elapsed)
+        if table.finished:
+            del self.tables[table_id]
+            self.results.append(game_result(table.board.state))
+        else:
+            table.pass_value = pass_value + STRIDE // table.priority
+            heapq.heappush(self.queue, (table.pass_value, table_id))
+        return table
+
+    def run(self, max_steps=None):
+        while self.queue and (max_steps is None or max_steps > 0):
+            self.step()
+            if max_steps is not None:
+                max_steps -= 1
+
+    def memory(self, sample=MEMORY_SAMPLE):
+        """The average bytes each of a sample of the playing tables holds on its own, and the bytes they share."""
+        tables = list(self.tables.values())[:sample]
+        if not tables:
+            return 0, 0
+        board = tables[0].board
+        shared = [self.screen, board.assets, board.text, board.layout]
+        shared_ids = reachable_ids(shared)
+        surfaces = [self.screen] + list(board.assets.surfaces.values())
+        shared_bytes = sum(owned_size(obj, ()) for obj in shared) + sum(map(surface_bytes, surfaces))
+        table_bytes = sum(owned_size(table, shared_ids) for table in tables) / len(tables)
+        return table_bytes, shared_bytes
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+        metrics = {'tables': len(self.tables), 'finished': len(self.results), 'steps': self.steps,
+                   'max_turn_ms': self.max_latency * 1000}
+        for percent in profiling.PERCENTILES:
+            metrics['p{}_turn_ms'.format(percent)] = profiling.percentile(latencies, percent) * 1000 if latencies else 0
+        return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play many bot-only Sleeping Queens tables in one process')
+    parser.add_argument('--tables', type=int, default=1000)
+    parser.add_argument('--policies', nargs='+', default=['random', 'random', 'random', 'random'],
+                        choices=sorted(POLICIES), help='one policy per seat')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    pygame.init()
+    seed = rules.new_seed() if args.seed is None else args.seed
+    print('Seed {}'.format(seed))
+    policy_classes = [POLICIES[name] for name in args.policies]
+    manager = TableManager()
+    start_time = time.perf_counter()
+    for game_index in range(args.tables):
+        manager.add_table(policy_classes, rules.game_seed(seed, game_index))
+    setup_time = time.perf_counter() - start_time
+    table_bytes, shared_bytes = manager.memory()
+    print('{} tables set up in {:.2f}s, {:.0f} bytes each and {:.0f} KB shared'.format(
+        args.tables, setup_time, table_bytes, shared_bytes / 1024))
+
+    start_time = time.perf_counter()
+    manager.run()
+    elapsed = time.perf_counter() - start_time
+    summary = Summary(len(policy_classes))
+    for result in manager.results:
+        summary.add(result)
+    print(summary.report())
+    metrics = manager.metrics()
+    print('{} turns in {:.2f}s, {:.0f} turns per second'.format(metrics['steps'], elapsed, metrics['steps'] / elapsed))
+    print('Turn time p50 {p50_turn_ms:.3f} ms, p90 {p90_turn_ms:.3f} ms, p99 {p99_turn_ms:.3f} ms, '
+          'max {max_turn_ms:.3f} ms'.format(**metrics))
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
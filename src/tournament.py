@@ -0,0 +1,319 @@
+"""Plays bot policies against each other across every seating and rates them as the results come in.
+
+Entrants are the policies simulate.py knows by name or any Policy subclass given as module:Class, the
+same objects Board plays its bots with. Every table of entrants plays each seat permutation, so nobody is
+helped or hurt by going first. A round robin plays every table of --players entrants each round, a Swiss
+tournament seats entrants next to those rated closest to them after the round before.
+
+Matches are played in worker processes and the results are applied to the ratings in match order, so a
+tournament gives the same ratings from the same seed however many workers play it. The state is saved to
+the checkpoint file as it goes and a tournament started again with the same checkpoint carries on from it:
+
+    python tournament.py random greedy mcts --players 3 --rounds 10 --checkpoint tournament.json
+"""
+import argparse
+import importlib
+import itertools
+import json
+import math
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import rules
+import simulate
+
+CHECKPOINT_VERSION = 1
+FORMATS = ('round-robin', 'swiss')
+ELO_START = 1500
+ELO_K = 32
+# the defaults of TrueSkill, which the Bayesian rating below follows
+MU = 25.0
+SIGMA = MU / 3
+BETA = SIGMA / 2
+# keeps the uncertainty from ever shrinking to nothing
+KAPPA = 0.0001
+# seconds between checkpoints
+CHECKPOINT_INTERVAL = 30
+
+# seats holds the entrant index in each seat, a match's games are numbered from first_game for their seeds
+Match = namedtuple('Match', ['index', 'seats', 'first_game', 'games'])
+
+
+def policy_class(spec):
+    """The Policy class for a name from simulate.POLICIES or a module:Class spec."""
+    if spec in simulate.POLICIES:
+        return simulate.POLICIES[spec]
+    module_name, separator, class_name = spec.partition(':')
+    if not separator:
+        raise ValueError('Unknown policy {}, expected one of {} or module:Class'.format(
+            spec, ', '.join(sorted(simulate.POLICIES))))
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def play_match(specs, seed, first_game, games):
+    """The winning seat of each game of a match, or None for a game that hit simulate.MAX_TURNS."""
+    # the classes are looked up again in the worker, user classes can't always be pickled
+    policy_classes = [policy_class(spec) for spec in specs]
+    return [simulate.play_game(policy_classes, rules.game_seed(seed, game_index)).winner
+            for game_index in range(first_game, first_game + games)]
+
+
+class Ratings:
+    """An Elo rating and a TrueSkill-like mean and uncertainty for each entrant, with their record.
+
+    A game is scored as the winner beating each other player and the others tying, or all tying when
+    nobody won. Elo's K is shared between the pairs so a four player game moves ratings as far as a two
+    player one. The Bayesian rating is Weng and Lin's Bradley-Terry full pair update (JMLR 2011), which
+    handles any number of players and ties in closed form instead of TrueSkill's factor graph.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.elo = [float(ELO_START)] * len(names)
+        self.mu = [MU] * len(names)
+        self.sigma = [SIGMA] * len(names)
+        self.games = [0] * len(names)
+        self.wins = [0] * len(names)
+
+    def add_game(self, seats, winner):
+        """Rate one game between the entrants in seats, winner is the winning seat or None."""
+        ranks = [0 if winner is None or seat == winner else 1 for seat in range(len(seats))]
+        for seat, entrant in enumerate(seats):
+            self.games[entrant] += 1
+            if seat == winner:
+                self.wins[entrant] += 1
+        self.update_elo(seats, ranks)
+        self.update_bayesian(seats, ranks)
+
+    def update_elo(self, seats, ranks):
+        k = ELO_K / (len(seats) - 1)
+        won = min(ranks) != max(ranks)
+        changes = [0.0] * len(seats)
+        for seat, other in itertools.combinations(range(len(seats)), 2):
+            if ranks[seat] == ranks[other] and won:
+                # the losers of a won game aren't compared with each other
+                continue
+            expected = 1 / (1 + 10 ** ((self.elo[seats[other]] - self.elo[seats[seat]]) / 400))
+            score = 0.5 if ranks[seat] == ranks[other] else float(ranks[seat] < ranks[other])
+            changes[seat] += k * (score - expected)
+            changes[other] -= k * (score - expected)
+        for seat, entrant in enumerate(seats):
+            self.elo[entrant] += changes[seat]
+
+    def update_bayesian(self, seats, ranks):
+        mu_changes = []
+        variance_scales = []
+        for seat, entrant in enumerate(seats):
+            omega = 0.0
+            delta = 0.0
+            for other, other_entrant in enumerate(seats):
+                if other == seat:
+                    continue
+                c = math.sqrt(self.sigma[entrant] ** 2 + self.sigma[other_entrant] ** 2 + 2 * BETA ** 2)
+                p = 1 / (1 + math.exp((self.mu[other_entrant] - self.mu[entrant]) / c))
+                score = 0.5 if ranks[seat] == ranks[other] else float(ranks[seat] < ranks[other])
+                variance = self.sigma[entrant] ** 2
+                omega += variance / c * (score - p)
+                delta += self.sigma[entrant] / c * variance / c ** 2 * p * (1 - p)
+            mu_changes.append(omega)
+            variance_scales.append(max(1 - delta, KAPPA))
+        for seat, entrant in enumerate(seats):
+            self.mu[entrant] += mu_changes[seat]
+            self.sigma[entrant] *= math.sqrt(variance_scales[seat])
+
+    def conservative(self, entrant):
+        # the rating an entrant is very likely to be at least as good as
+        return self.mu[entrant] - 3 * self.sigma[entrant]
+
+    def standings(self):
+        return sorted(range(len(self.names)), key=lambda entrant: -self.elo[entrant])
+
+    def report(self):
+        lines = ['{:<24} {:>8} {:>7} {:>7} {:>7} {:>6} {:>7}'.format(
+            'Policy', 'Games', 'Win %', 'Elo', 'Mu', 'Sigma', 'Rating')]
+        for entrant in self.standings():
+            lines.append('{:<24} {:>8} {:>7.1%} {:>7.0f} {:>7.2f} {:>6.2f} {:>7.2f}'.format(
+                self.names[entrant], self.games[entrant], self.wins[entrant] / max(self.games[entrant], 1),
+                self.elo[entrant], self.mu[entrant], self.sigma[entrant], self.conservative(entrant)))
+        return '\n'.join(lines)
+
+    def to_json(self):
+        return {'elo': self.elo, 'mu': self.mu, 'sigma': self.sigma, 'games': self.games, 'wins': self.wins}
+
+    def load_json(self, data):
+        for field in ('elo', 'mu', 'sigma', 'games', 'wins'):
+            setattr(self, field, data[field])
+
+
+class Tournament:
+    """The schedule, the ratings and how far through it a tournament has got, everything a checkpoint holds."""
+
+    def __init__(self, specs, num_players, rounds, games_per_match, tournament_format, seed):
+        if len(set(specs)) != len(specs):
+            raise ValueError('Each policy can only be entered once')
+        if not 2 <= num_players <= min(4, len(specs)):
+            raise ValueError('Tables of {} need between 2 and 4 players and at least as many policies'.format(
+                num_players))
+        self.specs = list(specs)
+        self.num_players = num_players
+        self.rounds = rounds
+        self.games_per_match = games_per_match
+        self.format = tournament_format
+        self.seed = seed
+        self.ratings = Ratings(specs)
+        self.byes = [0] * len(specs)
+        self.round = 0
+        # the matches of the current round and the results of those played, keyed by match index
+        self.matches = []
+        self.results = {}
+        # the first match of the round whose results haven't been added to the ratings yet
+        self.next_result = 0
+        self.next_match = 0
+
+    def config(self):
+        return {'policies': self.specs, 'players': self.num_players, 'rounds': self.rounds,
+                'games_per_match': self.games_per_match, 'format': self.format, 'seed': self.seed}
+
+    @property
+    def finished(self):
+        return self.round >= self.rounds
+
+    def tables(self):
+        """The tables of entrants for the next round."""
+        entrants = range(len(self.specs))
+        if self.format == 'round-robin':
+            return list(itertools.combinations(entrants, self.num_players))
+
+        # Swiss: those who have sat out least often play, then tables are filled down the standings
+        standings = self.ratings.standings()
+        sitting_out = len(standings) % self.num_players
+        if sitting_out:
+            byes = sorted(reversed(standings), key=lambda entrant: self.byes[entrant])[:sitting_out]
+            for entrant in byes:
+                self.byes[entrant] += 1
+            standings = [entrant for entrant in standings if entrant not in byes]
+        return [tuple(standings[start:start + self.num_players])
+                for start in range(0, len(standings), self.num_players)]
+
+    def start_round(self):
+        self.matches = []
+        for table in self.tables():
+            for seats in itertools.permutations(table):
+                self.matches.append(Match(self.next_match, seats, self.next_match * self.games_per_match,
+                                          self.games_per_match))
+                self.next_match += 1
+        self.results = {}
+        self.next_result = 0
+
+    def unplayed(self):
+        return [match for match in self.matches[self.next_result:] if match.index not in self.results]
+
+    def add_result(self, match, winners):
+        """Keep a match's winners and rate every match now complete from the start of the round."""
+        self.results[match.index] = winners
+        while self.next_result < len(self.matches) and self.matches[self.next_result].index in self.results:
+            done = self.matches[self.next_result]
+            for winner in self.results.pop(done.index):
+                self.ratings.add_game(done.seats, winner)
+            self.next_result += 1
+        if self.next_result == len(self.matches):
+            self.round += 1
+            self.matches = []
+
+    def to_json(self):
+        return {'version': CHECKPOINT_VERSION, 'config': self.config(), 'ratings': self.ratings.to_json(),
+                'byes': self.byes, 'round': self.round, 'next_match': self.next_match,
+                'next_result': self.next_result, 'matches': [list(match) for match in self.matches],
+                'results': [[index, winners] for index, winners in self.results.items()]}
+
+    def load_json(self, data):
+        if data['version'] != CHECKPOINT_VERSION:
+            raise ValueError('Not a version {} checkpoint'.format(CHECKPOINT_VERSION))
+        if data['config'] != self.config():
+            raise ValueError('The checkpoint is for a different tournament: {}'.format(data['config']))
+        self.ratings.load_json(data['ratings'])
+        self.byes = data['byes']
+        self.round = data['round']
+        self.next_match = data['next_match']
+        self.next_result = data['next_result']
+        self.matches = [Match(index, tuple(seats), first_game, games)
+                        for index, seats, first_game, games in data['matches']]
+        self.results = {index: winners for index, winners in data['results']}
+
+    def save(self, path):
+        # write to one side and swap it in, so stopping part way through a save never loses the checkpoint
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as checkpoint_file:
+            json.dump(self.to_json(), checkpoint_file)
+        os.replace(temp_path, path)
+
+
+def run(tournament, workers=None, checkpoint_path=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+    """Play the rest of the tournament, saving it to checkpoint_path every so often and at every round's end."""
+    last_save = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while not tournament.finished:
+            if not tournament.matches:
+                tournament.start_round()
+            futures = {executor.submit(play_match, [tournament.specs[entrant] for entrant in match.seats],
+                                       tournament.seed, match.first_game, match.games): match
+                       for match in tournament.unplayed()}
+            for future in as_completed(futures):
+                tournament.add_result(futures[future], future.result())
+                if checkpoint_path and time.perf_counter() - last_save > checkpoint_interval:
+                    tournament.save(checkpoint_path)
+                    last_save = time.perf_counter()
+            if checkpoint_path:
+                tournament.save(checkpoint_path)
+                last_save = time.perf_counter()
+            print('Round {} of {}'.format(tournament.round, tournament.rounds))
+    return tournament
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rate bot policies against each other in a tournament')
+    parser.add_argument('policies', nargs='+',
+                        help='names from {} or module:Class of a Policy subclass'.format(
+                            ', '.join(sorted(simulate.POLICIES))))
+    parser.add_argument('--players', type=int, default=2, choices=range(2, 5), help='players at each table')
+    parser.add_argument('--format', default='round-robin', choices=FORMATS)
+    parser.add_argument('--rounds', type=int, default=1)
+    parser.add_argument('--games', type=int, default=100, help='games played for each seating of each table')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, defaults to one per CPU')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--checkpoint', default=None, help='file to save progress to and resume from')
+    args = parser.parse_args()
+
+    checkpoint = None
+    if args.checkpoint and os.path.isfile(args.checkpoint):
+        with open(args.checkpoint) as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+    # a resumed tournament takes its seed from the checkpoint when none is given
+    seed = args.seed
+    if seed is None:
+        seed = checkpoint['config']['seed'] if checkpoint else rules.new_seed()
+    print('Seed {}'.format(seed))
+
+    try:
+        for spec in args.policies:
+            policy_class(spec)
+        tournament = Tournament(args.policies, args.players, args.rounds, args.games, args.format, seed)
+        if checkpoint:
+            tournament.load_json(checkpoint)
+            if not tournament.finished:
+                print('Resuming at round {} of {}'.format(tournament.round + 1, tournament.rounds))
+    except (ValueError, ImportError, AttributeError) as error:
+        parser.error(str(error))
+
+    start_time = time.perf_counter()
+    games_before = sum(tournament.ratings.games) // args.players
+    run(tournament, args.workers, args.checkpoint)
+    elapsed = time.perf_counter() - start_time
+    games = sum(tournament.ratings.games) // args.players - games_before
+    print(tournament.ratings.report())
+    print('{} games in {:.1f}s, {:.0f} games per second'.format(games, elapsed, games / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+import rules
+from policies import GreedyPolicy
+
+
+def dealt_game(seed=3, num_players=2):
+    state = rules.GameState(['Player{}'.format(seat) for seat in range(num_players)], seed)
+    state.deal()
+    return state
+
+
+def play_moves(state, num_moves, seed=1):
+    policy = GreedyPolicy(rules.stream_rng(seed, 'tests'))
+    for move in range(num_moves):
+        if state.game_over:
+            break
+        state.play(*policy.choose(state))
+    return state
@@ -0,0 +1,84 @@
+import pytest
+import analytics
+import gamelog
+import rules
+import simulate
+from analytics import Event
+from cards import CODES, STRAWBERRY, ROSE
+from policies import RandomPolicy, GreedyPolicy
+
+
+def traced_game(seed=3):
+    state = analytics.TracedState(['Player0', 'Player1', 'Player2'], seed)
+    state.deal()
+    state.players[0].cards[0] = CODES['knight']
+    return state
+
+
+def test_strawberry_queen_shields_a_play_she_stopped():
+    state = traced_game()
+    state.players[2].queens = [STRAWBERRY]
+    state.play([0])
+    assert [event.kind for event in state.take_events()] == [analytics.STRAWBERRY_SHIELD]
+    assert state.players[2].queens == [STRAWBERRY]
+
+
+@pytest.mark.parametrize('holder', [None, 0])
+def test_nothing_shielded_without_the_strawberry_queen_across_the_table(holder):
+    state = traced_game()
+    if holder is not None:
+        state.players[holder].queens = [STRAWBERRY]
+    state.play([0])
+    assert analytics.STRAWBERRY_SHIELD not in [event.kind for event in state.take_events()]
+
+
+def test_nothing_shielded_when_there_was_another_queen_to_take():
+    state = traced_game()
+    state.players[1].queens = [ROSE]
+    state.players[2].queens = [STRAWBERRY]
+    state.players[1].cards = [CODES['1']] * 5
+    state.play([0], (1, 0))
+    assert [event.kind for event in state.take_events()] == [analytics.STEAL]
+    assert state.players[0].queens == [ROSE]
+
+
+def test_counts():
+    events = [
+        Event(analytics.GAME_START, 0, None, 3),
+        Event(analytics.WAKE, 0, 1, STRAWBERRY),
+        Event(analytics.WAKE, 1, 2, ROSE),
+        Event(analytics.ROSE_BONUS, 1, 2, None),
+        Event(analytics.JESTER, 2, 2, 1),
+        Event(analytics.JESTER, 3, 0, None),
+        Event(analytics.STEAL, 4, 0, 2),
+        Event(analytics.DRAGON_BLOCK, 5, 2, 0),
+        Event(analytics.RESHUFFLE, 12, 1, 30),
+        Event(analytics.RESHUFFLE, 25, 1, 30),
+        Event(analytics.GAME_END, 30, None, 2),
+        Event(analytics.GAME_START, 0, None, 3),
+        Event(analytics.GAME_END, 40, None, None),
+    ]
+    stats = analytics.Analytics().run(events)
+    assert stats.events == len(events)
+    assert stats.games[3] == 2 and stats.draws[3] == 1 and stats.turns[3] == 70
+    assert stats.seat_wins == {(3, 2): 1}
+    # the jester played by seat 2 landed on seat 1, two seats on
+    assert stats.jester_seats == {(3, 2): 1, (3, None): 1}
+    assert stats.counts[3, analytics.STEAL] == 1 and stats.counts[3, analytics.DRAGON_BLOCK] == 1
+    assert stats.reshuffle_turns == {(3, 1): 1, (3, 2): 1}
+    assert stats.games_reshuffled[3] == 1 and stats.first_reshuffle_turns[3] == 12
+    assert stats.queen_games == {(3, 'rose'): 1, (3, 'strawberry'): 1}
+    assert stats.queen_wins == {(3, 'rose'): 1, (3, 'strawberry'): 0}
+    report = stats.report()
+    assert report.startswith('3 players: 2 games, 35.0 turns on average, 50.00% drawn')
+    assert 'Knight (dragon)                       2          1     50.00%' in report
+
+
+def test_logged_games_give_the_events_played_live():
+    policy_classes = [GreedyPolicy, RandomPolicy]
+    live = list(analytics.live_events(policy_classes, 8, 3))
+    data = b''.join(gamelog.dumps(simulate.play_game(policy_classes, rules.game_seed(8, game_index)))
+                    for game_index in range(3))
+    logged = [event for log in gamelog.read_logs(data) for event in analytics.replay_events(log)]
+    assert logged == live
+    assert [event.kind for event in live].count(analytics.GAME_END) == 3
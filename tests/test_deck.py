@@ -0,0 +1,52 @@
+import random
+from collections import Counter
+import rules
+from cards import FULL_DECK
+from helpers import dealt_game
+
+
+def test_deal_pops_in_order():
+    deck = rules.Deck(range(10))
+    popped = rules.Deck(range(10))
+    assert deck.deal(4) == [popped.cards.pop() for card in range(4)]
+    assert deck.cards == popped.cards
+    assert deck.deal(0) == []
+    assert len(deck) == 6
+
+
+def test_deal_goes_round_the_table():
+    state = dealt_game(11, 3)
+    deck = rules.Deck()
+    deck.shuffle(random.Random(11))
+    dealt = [deck.cards.pop() for card in range(rules.CARDS_PER_PLAYER * 3)]
+    for player_index, player in enumerate(state.players):
+        assert player.cards == dealt[player_index::3]
+    assert state.deck.cards == deck.cards
+
+
+def test_reshuffle_puts_the_discards_under_what_is_left():
+    deck = rules.Deck([1, 2], [3, 4, 5, 6])
+    deck.reshuffle(random.Random(1))
+    assert deck.cards[-2:] == [1, 2]
+    assert sorted(deck.cards[:-2]) == [3, 4, 5, 6]
+    assert deck.discards == []
+
+
+def test_drawing_past_the_end_reshuffles():
+    state = dealt_game()
+    state.deck.discards.extend(state.deck.cards)
+    state.deck.cards = []
+    cards = Counter([state.draw_card()] + state.deck.cards + state.deck.discards)
+    assert state.reshuffles == 1
+    assert state.deck.discards == []
+    for player in state.players:
+        cards.update(player.cards)
+    assert cards == Counter(FULL_DECK)
+
+
+def test_copy_is_independent():
+    deck = rules.Deck([1, 2], [3])
+    copy = deck.copy()
+    copy.cards.pop()
+    copy.discards.append(4)
+    assert deck.cards == [1, 2] and deck.discards == [3]
@@ -0,0 +1,109 @@
+import pytest
+import endgame
+import rules
+from helpers import dealt_game, play_moves
+
+
+def naive_wins(state, player, turns):
+    """Whether player wins within turns with best play, False if they lose and None if it isn't decided by then."""
+    if state.game_over:
+        return state.winner == player
+    if turns == 0:
+        return None
+    results = []
+    for key, args in endgame.endgame_moves(state):
+        child = state.copy()
+        child.play(*args)
+        results.append(naive_wins(child, player, turns - 1))
+    best, worst = (True, False) if state.player_turn == player else (False, True)
+    if best in results:
+        return best
+    return None if None in results else worst
+
+
+def endgame_positions(seed, queens_left=1):
+    state = dealt_game(seed)
+    while not state.game_over and endgame.queens_left(state) > queens_left:
+        play_moves(state, 1, seed)
+    positions = []
+    while not state.game_over:
+        positions.append(state.copy())
+        play_moves(state, 1, seed)
+    return positions
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3, 4])
+def test_solutions_match_a_full_width_search(seed):
+    solver = endgame.EndgameSolver(time_limit=5)
+    checked = 0
+    for state in endgame_positions(seed):
+        solution = solver.solve(state)
+        if solution.wins is None or solution.turns > 3:
+            continue
+        assert naive_wins(state, state.player_turn, solution.turns) == solution.wins
+        if solution.turns:
+            # and it isn't decided any sooner
+            assert naive_wins(state, state.player_turn, solution.turns - 1) is None
+            child = state.copy()
+            child.play(*solution.move)
+            assert solver.solve(child, state.player_turn).wins == solution.wins
+        checked += 1
+    assert checked
+
+
+def test_finished_game():
+    state = play_moves(dealt_game(5), 1000)
+    assert state.game_over
+    assert endgame.EndgameSolver().solve(state, state.winner).wins
+    assert not endgame.EndgameSolver().solve(state, 1 - state.winner).wins
+
+
+def test_hash_ignores_the_order_of_a_hand():
+    state = dealt_game(6)
+    shuffled = state.copy()
+    shuffled.players[0].cards.reverse()
+    assert endgame.position_hash(shuffled) == endgame.position_hash(state)
+    shuffled.player_turn = 1
+    assert endgame.position_hash(shuffled) != endgame.position_hash(state)
+
+
+def test_depth_preferred_table_keeps_the_deeper_result():
+    table = endgame.TranspositionTable(4, 'depth')
+    table.store(1, 5, endgame.EXACT, 10, None)
+    # the same slot, searched less deeply
+    table.store(5, 2, endgame.EXACT, 20, None)
+    assert table.get(1) == (5, endgame.EXACT, 10, None)
+    assert table.get(5) is None
+    table.store(5, 6, endgame.EXACT, 20, None)
+    assert table.get(5) == (6, endgame.EXACT, 20, None)
+    assert table.get(1) is None
+    assert table.stats()['replaced'] == 1
+
+
+def test_lru_table_drops_the_least_recently_used():
+    table = endgame.TranspositionTable(2, 'lru')
+    table.store(1, 1, endgame.EXACT, 0, None)
+    table.store(2, 1, endgame.EXACT, 0, None)
+    table.get(1)
+    table.store(3, 1, endgame.EXACT, 0, None)
+    assert table.get(2) is None
+    assert table.get(1) is not None and table.get(3) is not None
+    assert len(table) == 2
+
+
+@pytest.mark.parametrize('max_entries, replacement', [(0, 'depth'), (-1, 'lru'), (8, 'fifo')])
+def test_table_arguments_are_checked(max_entries, replacement):
+    with pytest.raises(ValueError):
+        endgame.TranspositionTable(max_entries, replacement)
+
+
+def test_given_table_is_used_even_when_empty():
+    table = endgame.TranspositionTable(16, 'lru')
+    assert endgame.EndgameSolver(table).table is table
+
+
+def test_queens_left():
+    state = dealt_game(7)
+    assert endgame.queens_left(state) == rules.QUEENS_TO_WIN
+    state.players[1].queens = list(range(rules.QUEENS_TO_WIN - 1))
+    assert endgame.queens_left(state) == 1
@@ -0,0 +1,95 @@
+import gamelog
+from helpers import dealt_game, play_moves
+
+
+def test_dumps_round_trip():
+    state = play_moves(dealt_game(5), 30)
+    logs = list(gamelog.read_logs(gamelog.dumps(state)))
+    assert len(logs) == 1
+    assert logs[0].seed == 5
+    assert logs[0].player_names == ['Player0', 'Player1']
+    assert logs[0].complete
+    replayed = gamelog.Replayer(logs[0]).final_state()
+    assert replayed.history == state.history
+    assert replayed.players[0].cards == state.players[0].cards
+
+
+def test_unterminated_log_is_read_to_its_last_record():
+    state = play_moves(dealt_game(5), 10)
+    # a log cut off by a crash, with half a record at the end
+    data = gamelog.dumps(state)[:-len(gamelog.END_OF_LOG)]
+    data += gamelog.RECORD.pack(1, 2, 3, 4)[:2]
+    log = next(gamelog.read_logs(data))
+    assert not log.complete
+    assert len(log) == 10
+    assert gamelog.Replayer(log).final_state().history == state.history
+
+
+class KeepOpen:
+    """A file to write to whose contents can still be read once it has been closed."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_quit_game_does_not_corrupt_the_next_log():
+    archive = KeepOpen()
+    quit_game = play_moves(dealt_game(5), 7)
+    writer = gamelog.GameLogWriter(archive, quit_game)
+    writer.write_moves(quit_game)
+    writer.close()
+    finished_game = play_moves(dealt_game(6), 1000)
+    writer = gamelog.GameLogWriter(archive, finished_game)
+    writer.write_moves(finished_game)
+    writer.close()
+
+    logs = list(gamelog.read_logs(bytes(archive.data)))
+    assert [(log.seed, len(log)) for log in logs] == [(5, 7), (6, len(finished_game.history))]
+    assert gamelog.Replayer(logs[1]).final_state().game_over
+
+
+def test_replayer_seeks_back_and_forth():
+    state = play_moves(dealt_game(8), 60)
+    log = next(gamelog.read_logs(gamelog.dumps(state)))
+    replayer = gamelog.Replayer(log, snapshot_interval=4)
+    assert replayer.seek(len(log)).history == state.history
+    assert replayer.seek(9).history == state.history[:9]
+
+
+def test_open_archive_closes_a_killed_game(tmp_path):
+    path = str(tmp_path / 'games.sqlog')
+    killed_game = play_moves(dealt_game(5), 7)
+    with open(path, 'wb') as log_file:
+        writer = gamelog.GameLogWriter(log_file, killed_game)
+        writer.write_moves(killed_game)
+        # killed part way through writing a record
+        log_file.write(gamelog.RECORD.pack(1, 2, 3, 4)[:3])
+
+    next_game = play_moves(dealt_game(6), 1000)
+    writer = gamelog.GameLogWriter(gamelog.open_archive(path), next_game)
+    writer.write_moves(next_game)
+    writer.close()
+
+    with open(path, 'rb') as log_file:
+        logs = list(gamelog.read_logs(log_file.read()))
+    assert [(log.seed, len(log), log.complete) for log in logs] == [(5, 7, True), (6, len(next_game.history), True)]
+
+
+def test_open_archive_drops_a_half_written_header(tmp_path):
+    path = str(tmp_path / 'games.sqlog')
+    state = play_moves(dealt_game(5), 7)
+    with open(path, 'wb') as log_file:
+        log_file.write(gamelog.dumps(state))
+        log_file.write(gamelog.encode_header(6, ['Player0', 'Player1'])[:10])
+    gamelog.open_archive(path).close()
+    with open(path, 'rb') as log_file:
+        assert log_file.read() == gamelog.dumps(state)
@@ -0,0 +1,67 @@
+import random
+from collections import Counter
+import pytest
+import mcts
+import rules
+from policies import GreedyPolicy
+from helpers import dealt_game, play_moves
+
+
+def test_determinize_only_deals_out_what_the_observer_cant_see():
+    state = play_moves(dealt_game(21, 3), 12)
+    game = mcts.determinize(state, 1, random.Random(1))
+    assert game.players[1].cards == state.players[1].cards
+    assert [player.queens for player in game.players] == [player.queens for player in state.players]
+    assert game.deck.discards == state.deck.discards
+    assert [len(player.cards) for player in game.players] == [len(player.cards) for player in state.players]
+    assert sorted(slot for slot, queen in enumerate(game.sleeping_queens) if queen is not None) == \
+        state.sleeping_slots()
+
+    def hidden(game):
+        return Counter(game.deck.cards + game.players[0].cards + game.players[2].cards)
+    assert hidden(game) == hidden(state)
+    assert game.history == []
+    assert len(state.history) == 12
+
+
+def test_tree_is_picked_up_from_the_moves_played_since():
+    state = dealt_game(22)
+    policy = mcts.MCTSPolicy(random.Random(2), time_limit=None, iterations=200)
+    state.play(*policy.choose(state))
+    root = policy.root
+    state.play(*GreedyPolicy(random.Random(3)).choose(state))
+    first, second = state.history
+    expected = root.children[mcts.move_key(first.cards, first.target)].children[
+        mcts.move_key(second.cards, second.target)]
+    node = policy.reuse_tree(state)
+    assert node is expected
+    assert node.visits > 0
+    assert node.parent is None
+
+
+def test_budget_is_required():
+    with pytest.raises(ValueError):
+        mcts.MCTSPolicy(time_limit=0)
+    with pytest.raises(ValueError):
+        mcts.search(mcts.Node(), dealt_game(), 0, random.Random(1), None, None)
+
+
+def test_rollout_plays_on_late_in_a_game():
+    state = dealt_game(25)
+    state.turns = 10 * mcts.ROLLOUT_TURNS
+    mcts.rollout(state, GreedyPolicy(random.Random(1)))
+    assert state.game_over or state.turns == 11 * mcts.ROLLOUT_TURNS
+
+
+def test_choose_is_a_legal_move():
+    state = play_moves(dealt_game(26, 4), 9)
+    card_indexes, target, bonus = mcts.MCTSPolicy(random.Random(4), time_limit=None, iterations=100).choose(state)
+    state.play(card_indexes, target, bonus)
+    assert len(state.history) == 10
+
+
+def test_choose_is_reproducible_with_iterations():
+    state = play_moves(dealt_game(27), 5)
+    choices = [mcts.MCTSPolicy(random.Random(5), time_limit=None, iterations=100).choose(state) for run in range(2)]
+    assert choices[0] == choices[1]
+    assert rules.is_valid_play([state.current_player.cards[index] for index in choices[0][0]])
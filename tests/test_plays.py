@@ -0,0 +1,39 @@
+import itertools
+import pytest
+import rules
+from cards import CODES, VALUES
+
+
+def brute_force_plays(cards):
+    plays = set()
+    for size in range(1, len(cards) + 1):
+        for card_indexes in itertools.combinations(range(len(cards)), size):
+            if rules.is_valid_play([cards[card_index] for card_index in card_indexes]):
+                plays.add(card_indexes)
+    return plays
+
+
+@pytest.mark.parametrize('hand', [
+    ['2', '3', '5', '5', '10'],
+    ['1', '1', '2', 'king-hat', 'knight'],
+    ['4', '4', '4', '8', 'jester'],
+    ['dragon', 'wand', 'potion', 'king-hat', 'jester'],
+    ['7'],
+])
+def test_legal_plays_are_every_valid_play(hand):
+    cards = [CODES[name] for name in hand]
+    plays = rules.legal_plays(cards)
+    assert set(plays) == brute_force_plays(cards)
+    assert len(set(plays)) == len(plays)
+    assert list(plays) == sorted(plays, key=lambda card_indexes: (len(card_indexes), card_indexes))
+
+
+def test_legal_plays_are_shared_by_hands_with_the_same_values():
+    cards = [CODES['3'], CODES['king-hat'], CODES['6'], CODES['3'], CODES['knight']]
+    plays = rules.legal_plays(cards)
+    assert rules.legal_plays(list(cards)) is plays
+    # a different action card with no number value makes the same plays
+    other = [CODES['3'], CODES['dragon'], CODES['6'], CODES['3'], CODES['wand']]
+    assert [VALUES[card] for card in other] == [VALUES[card] for card in cards]
+    assert rules.legal_plays(other) is plays
+    assert rules.legal_plays([CODES['3'], CODES['king-hat'], CODES['6'], CODES['4'], CODES['knight']]) is not plays
@@ -0,0 +1,42 @@
+import pytest
+import gamelog
+import protocol
+from helpers import dealt_game, play_moves
+
+
+def test_delta_brings_a_view_up_to_date():
+    state = dealt_game(4, 3)
+    for seat in range(3):
+        client_view = protocol.blank_view(3)
+        server_view = protocol.blank_view(3)
+        for move in range(20):
+            view = protocol.encode_view(state, seat)
+            protocol.apply_delta(client_view, protocol.encode_delta(server_view, view))
+            server_view = view
+            assert client_view == view
+            play_moves(state, 1)
+
+
+def test_unchanged_view_has_empty_delta():
+    view = protocol.encode_view(dealt_game(), 0)
+    assert protocol.encode_delta(view, bytearray(view)) == b''
+
+
+def test_view_hides_other_hands():
+    state = dealt_game()
+    view = protocol.encode_view(state, 0)
+    assert list(view[protocol.VIEW_HAND:protocol.VIEW_SLOTS]) == state.players[0].cards
+    state.players[1].cards = state.deck.cards[:len(state.players[1].cards)]
+    assert protocol.encode_view(state, 0) == view
+
+
+def test_play_round_trip():
+    message = protocol.encode_play([0, 4], (1, 2))
+    payload = message[protocol.FRAME.size:]
+    assert protocol.decode_play(payload) == ([0, 4], (1, 2), None)
+
+
+@pytest.mark.parametrize('packed_indexes', [0, 5 << 3, 1 | (2 << 6)])
+def test_decode_play_rejects_empty_or_skipped_fields(packed_indexes):
+    with pytest.raises(ValueError):
+        protocol.decode_play(gamelog.RECORD.pack(packed_indexes, gamelog.NONE, gamelog.NONE, gamelog.NONE))
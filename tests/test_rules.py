@@ -0,0 +1,92 @@
+import pytest
+import rules
+from cards import CODES, ROSE, STRAWBERRY
+from helpers import dealt_game, play_moves
+
+
+@pytest.mark.parametrize('card_indexes', [[], [-1], [0, -5], [5], [0, 0]])
+def test_play_rejects_bad_card_indexes(card_indexes):
+    state = dealt_game()
+    before = state.copy()
+    with pytest.raises(rules.InvalidMove):
+        state.play(card_indexes)
+    assert state.players[0].cards == before.players[0].cards
+    assert state.deck.cards == before.deck.cards
+    assert state.history == []
+
+
+def test_play_rejects_invalid_number_play():
+    state = dealt_game()
+    state.players[0].cards[:3] = [CODES['2'], CODES['3'], CODES['9']]
+    with pytest.raises(rules.InvalidMove):
+        state.play([0, 1, 2])
+
+
+def test_play_accepts_equation():
+    state = dealt_game()
+    state.players[0].cards[:3] = [CODES['2'], CODES['3'], CODES['5']]
+    discards = len(state.deck.discards)
+    state.play([0, 1, 2])
+    assert len(state.deck.discards) == discards + 3
+    assert state.player_turn == 1
+    assert len(state.history) == 1
+
+
+def test_play_after_game_over():
+    state = dealt_game()
+    state.game_over = True
+    with pytest.raises(rules.InvalidMove):
+        state.play([0])
+
+
+def knight_game():
+    state = dealt_game()
+    state.players[0].cards[0] = CODES['knight']
+    state.players[1].queens = [STRAWBERRY + 1]
+    return state
+
+
+@pytest.mark.parametrize('target', [(-1, 0), (2, 0), (0, 0), (1, 1), (1, -1)])
+def test_knight_rejects_bad_targets(target):
+    state = knight_game()
+    with pytest.raises(rules.InvalidMove):
+        state.play([0], target)
+
+
+def test_strawberry_queen_cannot_be_taken():
+    state = knight_game()
+    state.players[1].queens = [STRAWBERRY]
+    with pytest.raises(rules.InvalidMove):
+        state.play([0], (1, 0))
+
+
+def test_knight_takes_queen():
+    state = knight_game()
+    state.players[1].cards = [CODES['1']] * 5
+    state.play([0], (1, 0))
+    assert state.players[0].queens == [STRAWBERRY + 1]
+    assert state.players[1].queens == []
+
+
+def test_same_seed_plays_the_same_game():
+    first = play_moves(dealt_game(7), 200)
+    second = play_moves(dealt_game(7), 200)
+    assert first.history == second.history
+    assert first.winner == second.winner
+
+
+@pytest.mark.parametrize('slot', [-1, -16, 16, 255])
+def test_king_rejects_bad_slots(slot):
+    state = dealt_game()
+    state.players[0].cards[0] = CODES['king-cookie']
+    with pytest.raises(rules.InvalidMove):
+        state.play([0], slot)
+
+
+def test_king_wakes_the_chosen_queen():
+    state = dealt_game()
+    state.players[0].cards[0] = CODES['king-cookie']
+    queen = state.sleeping_queens[3]
+    state.play([0], 3, 4 if queen == ROSE else None)
+    assert state.players[0].queens[0] == queen
+    assert state.sleeping_queens[3] is None
@@ -0,0 +1,104 @@
+import asyncio
+import gamelog
+import protocol
+import rules
+from policies import GreedyPolicy
+from server import GameServer, Table
+
+
+class Writer:
+    """Stands in for a client's stream, keeping what the server sends it."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+
+def full_table(num_players=2, seed=3):
+    table = Table('test', num_players, seed)
+    writers = [Writer() for seat in range(num_players)]
+    for seat, writer in enumerate(writers):
+        table.join('Player{}'.format(seat), writer)
+    return table, writers
+
+
+def play_payload(card_indexes, target=None, bonus=None):
+    return protocol.encode_play(card_indexes, target, bonus)[protocol.FRAME.size:]
+
+
+def test_play_before_the_game_starts():
+    table = Table('test', 2, 3)
+    writer = Writer()
+    table.join('Player0', writer)
+    assert table.play(writer, play_payload([0])) == 'The game has not started'
+
+
+def test_play_out_of_turn():
+    table, writers = full_table()
+    assert table.play(writers[1], play_payload([0])) == 'It is not your turn'
+
+
+def test_crafted_plays_are_refused_and_change_nothing():
+    table, writers = full_table()
+    state = table.state
+    aliased = gamelog.RECORD.pack(5 << 3, gamelog.NONE, gamelog.NONE, gamelog.NONE)
+    for payload in (aliased, play_payload([5]), play_payload([0, 0]), b'\x01'):
+        assert table.play(writers[0], payload)
+    assert table.state is state
+    assert state.history == []
+
+
+def test_a_valid_play_is_sent_to_every_seat():
+    table, writers = full_table()
+    sent = [len(writer.data) for writer in writers]
+    assert table.play(writers[0], play_payload(*GreedyPolicy(rules.stream_rng(1, 'tests')).choose(table.state))) is None
+    assert len(table.state.history) == 1
+    assert all(len(writer.data) > before for writer, before in zip(writers, sent))
+
+
+def test_leaving_before_the_start_frees_the_seat():
+    first, second, third = Writer(), Writer(), Writer()
+    table = Table('test', 3, 3)
+    table.join('first', first)
+    table.join('second', second)
+    table.leave(first)
+    assert table.player_names == ['second']
+    table.join('third', third)
+    assert table.state is None
+    table.leave(second)
+    table.leave(third)
+    assert table.finished
+
+
+def test_departed_seat_is_played_by_a_bot():
+    table, writers = full_table(3)
+    table.leave(writers[1])
+    policy = GreedyPolicy(rules.stream_rng(2, 'tests'))
+    for turn in range(500):
+        if table.state.game_over:
+            break
+        assert table.state.player_turn != 1
+        assert table.play(writers[table.state.player_turn], play_payload(*policy.choose(table.state))) is None
+    assert table.state.game_over
+
+
+async def send_join(payload):
+    game_server = GameServer(2, 1)
+    server = await game_server.serve('127.0.0.1', 0)
+    reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+    writer.write(protocol.encode_message(protocol.JOIN, payload))
+    kind, reply = await protocol.read_message(reader)
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return kind, reply, game_server.tables
+
+
+def test_malformed_join_is_answered_with_an_error():
+    kind, reply, tables = asyncio.run(send_join(b'\x05ab'))
+    assert kind == protocol.ERROR
+    assert tables == {}
+    kind, reply, tables = asyncio.run(send_join(b'\x02\xff\xfe\x01a'))
+    assert kind == protocol.ERROR
@@ -0,0 +1,44 @@
+import rules
+import simulate
+from policies import RandomPolicy, GreedyPolicy
+
+POLICY_CLASSES = [RandomPolicy, GreedyPolicy]
+
+
+def test_a_game_plays_again_from_its_seed():
+    first = simulate.play_game(POLICY_CLASSES, rules.game_seed(4, 2))
+    second = simulate.play_game(POLICY_CLASSES, rules.game_seed(4, 2))
+    assert first.history == second.history
+    assert simulate.game_result(first) == simulate.game_result(second)
+    assert simulate.game_result(first).seed == rules.game_seed(4, 2)
+
+
+def test_chunks_play_the_same_games():
+    whole, whole_logs = simulate.play_games(7, 0, 6, POLICY_CLASSES, log=True)
+    first, first_logs = simulate.play_games(7, 0, 2, POLICY_CLASSES, log=True)
+    rest, rest_logs = simulate.play_games(7, 2, 4, POLICY_CLASSES, log=True)
+    assert whole == first + rest
+    assert whole_logs == first_logs + rest_logs
+
+
+def test_results_do_not_depend_on_workers():
+    one = sorted(simulate.simulate(8, POLICY_CLASSES, workers=1, chunk_size=8, seed=3))
+    two = sorted(simulate.simulate(8, POLICY_CLASSES, workers=2, chunk_size=3, seed=3))
+    assert one == two
+    assert len({result.seed for result in one}) == 8
+
+
+def test_max_turns_ends_a_game_as_a_draw():
+    state = simulate.play_game(POLICY_CLASSES, 5, max_turns=3)
+    assert state.turns == 3 and state.winner is None
+
+
+def test_summary():
+    summary = simulate.Summary(2)
+    summary.add(simulate.GameResult(1, 0, 10, 5, 20, 0))
+    summary.add(simulate.GameResult(2, None, 30, 3, 40, 2))
+    assert summary.wins == {0: 1, None: 1}
+    report = summary.report()
+    assert '2 games' in report
+    assert 'Player0 won 50.0%' in report and 'Player1 won 0.0%' in report and 'Draws 50.0%' in report
+    assert 'Average turns 20.00' in report and 'Average reshuffles 1.00' in report
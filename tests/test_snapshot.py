@@ -0,0 +1,33 @@
+import snapshot
+from helpers import dealt_game, play_moves
+
+
+def assert_same_game(restored, state):
+    for attribute in ('player_turn', 'game_over', 'winner', 'turns', 'queens_woken', 'cards_drawn', 'reshuffles',
+                      'history', 'seed', 'sleeping_queens'):
+        assert getattr(restored, attribute) == getattr(state, attribute), attribute
+    assert [player.name for player in restored.players] == [player.name for player in state.players]
+    assert [player.cards for player in restored.players] == [player.cards for player in state.players]
+    assert [player.queens for player in restored.players] == [player.queens for player in state.players]
+    assert restored.deck.cards == state.deck.cards
+    assert restored.deck.discards == state.deck.discards
+
+
+def test_restore_carries_on_the_same_game():
+    state = play_moves(dealt_game(11, 3), 40)
+    restored = snapshot.loads(snapshot.dumps(state))
+    assert_same_game(restored, state)
+    # the generator comes back too, so the rest of the game, reshuffles and all, plays out the same
+    assert_same_game(play_moves(restored, 300, seed=2), play_moves(state, 300, seed=2))
+
+
+def test_restore_without_rng():
+    state = play_moves(dealt_game(12), 20)
+    assert_same_game(snapshot.loads(snapshot.dumps(state, with_rng=False)), state)
+
+
+def test_turn_in_progress():
+    state = play_moves(dealt_game(13), 5)
+    restored, turn = snapshot.read(snapshot.dumps(state, turn=(None, [0, 2], [(1, 0)])))
+    assert_same_game(restored, state)
+    assert turn == (None, [0, 2], [(1, 0)])
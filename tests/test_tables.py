@@ -0,0 +1,22 @@
+import pytest
+
+pygame = pytest.importorskip('pygame')
+import tables
+from policies import RandomPolicy
+
+
+@pytest.mark.parametrize('priority', [0, -1, tables.STRIDE + 1])
+def test_add_table_rejects_bad_priorities(priority):
+    manager = tables.TableManager()
+    with pytest.raises(ValueError):
+        manager.add_table([RandomPolicy, RandomPolicy], 1, priority)
+    assert not manager.tables
+
+
+def test_higher_priority_tables_are_stepped_more():
+    manager = tables.TableManager()
+    low = manager.add_table([RandomPolicy, RandomPolicy], 1, 1)
+    high = manager.add_table([RandomPolicy, RandomPolicy], 2, 3)
+    for step in range(8):
+        manager.step()
+    assert high.steps == 6 and low.steps == 2
@@ -0,0 +1,93 @@
+import json
+import math
+import pytest
+import tournament
+
+
+def test_elo_two_players():
+    ratings = tournament.Ratings(['a', 'b'])
+    ratings.add_game((0, 1), 1)
+    assert ratings.elo == [tournament.ELO_START - 16, tournament.ELO_START + 16]
+    assert ratings.games == [1, 1] and ratings.wins == [0, 1]
+
+
+def test_elo_shares_k_between_the_pairs():
+    ratings = tournament.Ratings(['a', 'b', 'c'])
+    ratings.add_game((2, 0, 1), 0)
+    # entrant 2 in seat 0 beat two players, the two losers aren't compared with each other
+    assert ratings.elo == pytest.approx([tournament.ELO_START - 8, tournament.ELO_START - 8,
+                                         tournament.ELO_START + 16])
+    assert ratings.wins == [0, 0, 1]
+
+
+def test_draw_between_equals_leaves_the_means():
+    ratings = tournament.Ratings(['a', 'b'])
+    ratings.add_game((0, 1), None)
+    assert ratings.elo == [tournament.ELO_START] * 2
+    assert ratings.mu == [tournament.MU] * 2
+    assert ratings.sigma[0] < tournament.SIGMA
+    assert ratings.wins == [0, 0]
+
+
+def test_weng_lin_update():
+    ratings = tournament.Ratings(['a', 'b'])
+    ratings.add_game((0, 1), 0)
+    c = math.sqrt(2 * tournament.SIGMA ** 2 + 2 * tournament.BETA ** 2)
+    mu_change = tournament.SIGMA ** 2 / c * 0.5
+    delta = tournament.SIGMA / c * tournament.SIGMA ** 2 / c ** 2 * 0.25
+    assert ratings.mu == pytest.approx([tournament.MU + mu_change, tournament.MU - mu_change])
+    assert ratings.sigma == pytest.approx([tournament.SIGMA * math.sqrt(1 - delta)] * 2)
+    assert ratings.conservative(0) > ratings.conservative(1)
+
+
+def test_ratings_follow_the_results():
+    ratings = tournament.Ratings(['a', 'b'])
+    for game in range(20):
+        ratings.add_game((0, 1) if game % 2 else (1, 0), game % 2)
+    # entrant 1 won every game from either seat
+    assert ratings.standings() == [1, 0]
+    assert ratings.mu[1] > ratings.mu[0]
+    assert max(ratings.sigma) < tournament.SIGMA
+
+
+def play(tournament_state, stop_after=None):
+    """Play matches in the process, newest first so results arrive out of order, until stop_after are added."""
+    added = 0
+    while not tournament_state.finished:
+        if not tournament_state.matches:
+            tournament_state.start_round()
+        for match in reversed(tournament_state.unplayed()):
+            if added == stop_after:
+                return tournament_state
+            tournament_state.add_result(match, tournament.play_match(
+                [tournament_state.specs[entrant] for entrant in match.seats], tournament_state.seed,
+                match.first_game, match.games))
+            added += 1
+    return tournament_state
+
+
+def new_tournament(tournament_format='round-robin'):
+    return tournament.Tournament(['random', 'greedy', 'policies:RandomPolicy'], 2, 2, 2, tournament_format, 5)
+
+
+@pytest.mark.parametrize('tournament_format', tournament.FORMATS)
+def test_checkpoint_carries_on_where_it_stopped(tmp_path, tournament_format):
+    whole = play(new_tournament(tournament_format))
+    assert whole.finished
+
+    stopped = play(new_tournament(tournament_format), stop_after=7)
+    path = str(tmp_path / 'tournament.json')
+    stopped.save(path)
+    resumed = new_tournament(tournament_format)
+    with open(path) as checkpoint_file:
+        resumed.load_json(json.load(checkpoint_file))
+    assert resumed.to_json() == stopped.to_json()
+    play(resumed)
+    assert resumed.ratings.to_json() == whole.ratings.to_json()
+    assert resumed.to_json() == whole.to_json()
+
+
+def test_checkpoint_of_another_tournament_is_refused():
+    other = tournament.Tournament(['random', 'greedy'], 2, 3, 2, 'round-robin', 5)
+    with pytest.raises(ValueError):
+        new_tournament().load_json(other.to_json())